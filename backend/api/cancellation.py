@@ -0,0 +1,60 @@
+import asyncio
+from typing import Any, Awaitable, Optional
+from fastapi import Request
+
+
+class RequestCancelled(Exception):
+    """Raised when a request is given up: its client disconnected or its deadline passed."""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Request cancelled: {reason}")
+        ## "deadline" or "disconnect"
+        self.reason = reason
+
+
+class RequestWatch:
+    """
+    Watches one request while it waits for its answer: `run` gives up the awaited
+    work (cancelling it) as soon as the client disconnects or the deadline passes.
+    Starlette does not notice a client leaving while a handler awaits, so one task
+    per request listens to the connection for its end.
+    """
+
+    def __init__(self, request: Request, deadline: Optional[float]):
+        self.request = request
+        ## event loop time after which the request is given up, None for no deadline
+        self.deadline = deadline
+        self._watcher: Optional[asyncio.Task] = None
+
+    def remaining(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(self.deadline - asyncio.get_running_loop().time(), 0.0)
+
+    async def run(self, awaitable: Awaitable[Any]) -> Any:
+        """Returns the result of `awaitable`, raises RequestCancelled after cancelling it."""
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch_disconnect())
+        task = asyncio.ensure_future(awaitable)
+        try:
+            done, _ = await asyncio.wait({task, self._watcher}, timeout=self.remaining(),
+                                         return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        if task in done:
+            return task.result()
+        task.cancel()
+        ## let the work unwind (release its slot, close the LLM stream) before answering
+        await asyncio.wait({task})
+        raise RequestCancelled("disconnect" if self._watcher in done else "deadline")
+
+    async def _watch_disconnect(self):
+        ## the body is already read: the next message of the connection is its end
+        ## (Request.is_disconnected can not see it through the http middlewares, it never waits)
+        while (await self.request.receive())["type"] != "http.disconnect":
+            pass
+
+    def close(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
@@ -0,0 +1,77 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class QueueFullError(Exception):
+    """Raised when a request can not get a slot: the wait queue is full or the wait timed out."""
+
+
+class ConcurrencyLimiter:
+    """
+    Bounds the number of requests running at the same time and the number of requests waiting.
+    Requests beyond the queue size are rejected immediately instead of piling up.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        ## background work waiting for a slot, not counted in the queue of the requests
+        self.waiting_background = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def acquire(self, reject: bool = True) -> None:
+        """
+        Waits for a free slot, raises QueueFullError when the request must be rejected.
+        With reject=False the wait is neither bounded nor timed out, for background work
+        (batch questions) that takes its turn for a slot instead of being dropped, and
+        that does not fill the queue of the requests.
+        """
+        if not reject:
+            self.waiting_background += 1
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self.waiting_background -= 1
+            self.in_flight += 1
+            return
+
+        ## waiting also counts requests about to take a free slot, so the check holds before any await
+        if self.in_flight + self.waiting >= self.max_concurrent + self.max_queue:
+            self.rejected += 1
+            raise QueueFullError("Too many requests waiting")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise QueueFullError("Timed out waiting for a free slot")
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self, reject: bool = True):
+        await self.acquire(reject)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "waiting_background": self.waiting_background,
+            "rejected": self.rejected,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+        }
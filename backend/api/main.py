@@ -1,12 +1,34 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 from backend.src.models import ResearchResponse
-from backend.src.parser import ResearchResponseParser
-from backend.src.rag import create_rag_chain, load_documents, split_documents, create_vectorstore
-from langchain.agents import create_tool_calling_agent, AgentExecutor
-from backend.src.prompt import promptResponse
+from backend.src.parser import ResearchResponseParser, ResearchResponseStreamParser
+from backend.src.entities import is_english, normalize, to_contacts
+from backend.src.config import MAX_CONCURRENT_CHATS, MAX_CHAT_QUEUE, CHAT_QUEUE_TIMEOUT, CHAT_RETRY_AFTER
+from backend.src.config import CACHE_ENABLED, CACHE_THRESHOLD, CACHE_TTL, CACHE_MAX_ENTRIES
+from backend.src.config import CHAT_MODE, COALESCE_ENABLED, ENTITY_LOOKUP_ENABLED, TRACE_HEADER
+from backend.src.config import CHAT_DEADLINE, DEADLINE_HEADER
+from backend.src.config import BATCH_CONCURRENCY, BATCH_MAX_QUESTIONS
+from backend.src.batch import answer_many, batch_inputs
+from backend.src.sources import SourceCollector, fill_sources
+from backend.src.embeddings import BatchingEmbeddings, CachedEmbeddings
+from backend.src.cache import SemanticCache
+from backend.src.sessions import create_session_store
+from backend.src.metrics import (
+    CHAT_CANCELLED, CHAT_FALLBACKS, CHAT_REQUESTS, REGISTRY, Gauge, MetricsCallbackHandler, end_trace, observe_stage, server_timing, start_trace, timed,
+)
+from backend.api.cancellation import RequestCancelled, RequestWatch
+from backend.api.limiter import ConcurrencyLimiter, QueueFullError
+from backend.api.singleflight import SingleFlight
+from backend.api.runtime import RagRuntime, ReloadManager, build_runtime
 import logging
+import contextlib
+import hashlib
+import json
+import asyncio
+import time
 logging.basicConfig(level=logging.INFO)
 app = FastAPI(title="RAG Chatbot API", version="1.0.0")
 
@@ -21,93 +43,571 @@ app.add_middleware(
 
 class ChatMessage(BaseModel):
     message: str
+    # "direct" : une seule génération, "agent" : agent + tool RAG ; par défaut TSARAIA_CHAT_MODE
+    mode: Optional[Literal["direct", "agent"]] = None
+    # identifiant de conversation choisi par le client : l'historique est gardé côté serveur
+    session_id: Optional[str] = Field(None, max_length=128)
+
+
+class BatchChatRequest(BaseModel):
+    questions: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_QUESTIONS)
+    # générations en parallèle pour ce batch, au plus TSARAIA_BATCH_CONCURRENCY
+    concurrency: Optional[int] = Field(None, ge=1)
+    # true : une ligne NDJSON par question dès qu'elle est prête, au lieu des résultats dans l'ordre des questions
+    stream: bool = False
+
+
+class BatchResult(BaseModel):
+    index: int
+    question: str
+    response: Optional[ResearchResponse] = None
+    error: Optional[str] = None
+
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchResult]
+    succeeded: int
+    failed: int
+
 
+# Runtime RAG courant : remplacé en une seule affectation à chaque reload,
+# les requêtes en cours gardent la référence qu'elles ont prise au début
+_runtime: Optional[RagRuntime] = None
+_chat_limiter = ConcurrencyLimiter(MAX_CONCURRENT_CHATS, MAX_CHAT_QUEUE, CHAT_QUEUE_TIMEOUT)
+_answer_cache = SemanticCache(CACHE_THRESHOLD, CACHE_TTL, CACHE_MAX_ENTRIES)
+_sessions = create_session_store()
+_flights = SingleFlight()
 
-_vectorstore = None
-_agent = None
-_agent_executor = None
 
+def _swap_runtime(runtime):
+    global _runtime
+    _runtime = runtime
+    # Les réponses en cache ne sont plus valables avec un nouvel index
+    _answer_cache.reset(runtime.vectorstore.embeddings, runtime.version)
+    logging.info(f"RAG runtime swapped, index version {runtime.version}")
 
-def initialize_rag_system():
+_reload_manager = ReloadManager(on_ready=_swap_runtime)
+
+REGISTRY.register(Gauge("tsaraia_chat_in_flight", "Chat requests running the LLM", lambda: _chat_limiter.in_flight))
+REGISTRY.register(Gauge("tsaraia_chat_waiting", "Chat requests waiting for a slot", lambda: _chat_limiter.waiting))
+REGISTRY.register(Gauge("tsaraia_cache_entries", "Answers in the semantic cache", lambda: _answer_cache.stats()["entries"]))
+REGISTRY.register(Gauge("tsaraia_index_version", "Version of the index being served", lambda: _runtime.version if _runtime is not None else 0))
+REGISTRY.register(Gauge("tsaraia_chat_flights", "Distinct chat executions running, identical requests share one", lambda: _flights.in_flight))
+REGISTRY.register(Gauge("tsaraia_sessions", "Conversation sessions kept on the server", lambda: _sessions.stats()["sessions"]))
+
+
+def initialize_rag_system(rebuild=False):
     """Initialise le système RAG une seule fois au démarrage"""
-    global _vectorstore, _agent,_agent_executor
-    
     try:
         logging.info("initializing System rag...")
-        
-        # Charger et traiter les documents
-        docs = load_documents()
-        chunks = split_documents(docs)
-        _vectorstore = create_vectorstore(chunks)
-        
-        # Créer le chain RAG et l'agent
-        tool, llm = create_rag_chain(_vectorstore)
-        
-        # Créer l'agent avec le bon prompt
-        _agent = create_tool_calling_agent(llm=llm,tools=[tool],prompt=promptResponse)
-        
-        _agent_executor = AgentExecutor(agent=_agent,tools=[tool],verbose=False,handle_parsing_errors=False)
-        
+        # Ouvrir l'index pré-construit, ou le reconstruire s'il est absent ou périmé
+        _swap_runtime(build_runtime(rebuild))
         logging.info("Init System RAG Success")
         
     except Exception as e:
         logging.error(f"Error in init System RAG: {str(e)}")
         raise e
 
+def _get_runtime():
+    runtime = _runtime
+    if runtime is None:
+        raise HTTPException(status_code=500, detail="System RAG not initialized")
+    return runtime
+
 # Initialiser le système au démarrage de l'app
 @app.on_event("startup")
 async def startup_event():
     initialize_rag_system()
 
+@app.middleware("http")
+async def trace_stages(request: Request, call_next):
+    """Avec l'en-tête de trace, renvoie la durée de chaque étape de la requête dans Server-Timing"""
+    if not request.headers.get(TRACE_HEADER):
+        return await call_next(request)
+    token = start_trace()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        trace = end_trace(token)
+    # les réponses en streaming envoient leurs en-têtes avant la génération : seules les étapes déjà faites y figurent
+    trace.append(("total", time.perf_counter() - start))
+    response.headers["Server-Timing"] = server_timing(trace)
+    return response
+
 @app.get("/")
 async def root():
     return {"message": "API RAG Chat is running"}
 
 @app.post("/chat", response_model=ResearchResponse)
-async def chat_endpoint(chat_message: ChatMessage):
+async def chat_endpoint(chat_message: ChatMessage, request: Request):
+    watch = _watch(request)
     try:
-        global _agent
+        runtime = _get_runtime()
         
-        if _agent_executor is None:
-            raise HTTPException(status_code=500, detail="System RAG not initialized")
+        lookup = _entity_lookup(runtime, chat_message.message)
+        if lookup is not None:
+            CHAT_REQUESTS.inc(endpoint="chat", outcome="entity_lookup")
+            _remember(chat_message, lookup.summary)
+            return lookup
         
-        raw_response = _agent_executor.invoke({
-            "input": chat_message.message,  
-            "chat_history": []
-        })
-        print("Raaw response : ",raw_response)
-        # Parser la réponse
-        raw_response = raw_response.get("output", None)
-        if isinstance(raw_response, str):
-            parsed_response = ResearchResponseParser.parse(text=raw_response)
-        elif isinstance(raw_response, dict):
-            parsed_response = raw_response
-        else:
-            raise ValueError("Unexpected response format from agent")
-        output = ResearchResponse(
-            topic=parsed_response["topic"],
-            summary=parsed_response["summary"],
-            sources=parsed_response["sources"],
-            tools_used=parsed_response["tools_used"],
-            entities=parsed_response.get("entities", [])
+        history = _history(chat_message)
+        cached, question_vector = await _cache_lookup(chat_message.message, chat_message.mode, history)
+        if cached is not None:
+            CHAT_REQUESTS.inc(endpoint="chat", outcome="cache_hit")
+            _remember(chat_message, cached["summary"])
+            return ResearchResponse(**cached)
+        
+        # Les requêtes identiques arrivées pendant l'exécution attendent son résultat au lieu de relancer le LLM
+        flight, leader = _flights.join(
+            _flight_key(runtime, "chat", chat_message, history),
+            lambda: _answer(runtime, chat_message.message, chat_message.mode, history, question_vector),
         )
-        print("output : ",output)
+        # abandonnée si le client part ou si la deadline passe : la génération est annulée si personne d'autre l'attend
+        output = (await watch.run(flight.result())).model_copy(deep=True)
+        _remember(chat_message, output.summary)
+        CHAT_REQUESTS.inc(endpoint="chat", outcome="llm" if leader else "coalesced")
         return output
+    except RequestCancelled as e:
+        logging.warning(f"Chat request cancelled: {e.reason}")
+        CHAT_CANCELLED.inc(endpoint="chat", reason=e.reason)
+        if e.reason == "deadline":
+            CHAT_REQUESTS.inc(endpoint="chat", outcome="timeout")
+            raise HTTPException(status_code=504, detail="Request timed out before the answer was ready")
+        CHAT_REQUESTS.inc(endpoint="chat", outcome="disconnected")
+        # personne ne lira cette réponse (499 : client closed request)
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except QueueFullError as e:
+        logging.warning(f"Chat request rejected: {str(e)}")
+        CHAT_REQUESTS.inc(endpoint="chat", outcome="rejected")
+        raise HTTPException(status_code=503, detail="Server busy, please retry later", headers={"Retry-After": str(CHAT_RETRY_AFTER)})
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error in chat endpoint: {str(e)}")
+        CHAT_REQUESTS.inc(endpoint="chat", outcome="error")
         raise HTTPException(status_code=500, detail=f"Error in treating request: {str(e)}")
+    finally:
+        watch.close()
+
+def _watch(request):
+    """
+    Surveille la requête : deadline TSARAIA_CHAT_DEADLINE, que l'en-tête de deadline
+    peut raccourcir, et déconnexion du client
+    """
+    seconds = CHAT_DEADLINE if CHAT_DEADLINE > 0 else None
+    header = request.headers.get(DEADLINE_HEADER)
+    if header:
+        try:
+            requested = float(header)
+        except ValueError:
+            requested = 0
+        if requested <= 0:
+            raise HTTPException(status_code=400, detail=f"Invalid {DEADLINE_HEADER} header, expected seconds")
+        seconds = requested if seconds is None else min(seconds, requested)
+    deadline = None if seconds is None else asyncio.get_running_loop().time() + seconds
+    return RequestWatch(request, deadline)
+
+async def _answer(runtime, message, mode, history, question_vector):
+    """Exécution de /chat partagée par les requêtes identiques : attend un slot, appelle la chaîne, parse"""
+    # La chaîne tourne en async : la boucle d'événements reste libre pendant l'appel au LLM
+    queued_at = time.perf_counter()
+    async with _chat_limiter.slot():
+        observe_stage("queue_wait", time.perf_counter() - queued_at)
+        with timed("chain"):
+            raw_response, sources = await _invoke_chain(runtime, {
+                "input": message,
+                "chat_history": history
+            }, mode)
+    with timed("parse"):
+        output = _build_response(raw_response.get("output", None), sources.documents, sources.tools)
+    _cache_store(runtime, message, mode, output, question_vector)
+    yield output
+
+def _flight_key(runtime, endpoint, chat_message, history):
+    """
+    Deux requêtes sont identiques avec la même question normalisée, le même mode,
+    le même historique de conversation et le même index
+    """
+    if not COALESCE_ENABLED:
+        return object()
+    context = hashlib.sha256(json.dumps(
+        [(message.type, message.content) for message in history], ensure_ascii=False
+    ).encode("utf-8")).hexdigest() if history else ""
+    return (endpoint, runtime.version, chat_message.mode or CHAT_MODE, normalize(chat_message.message), context)
+
+## sujets donnés par le parser à une réponse sans JSON lisible
+UNPARSED_TOPICS = ("Unknown Topic", "Parsing Error")
+
+def _select_chain(runtime, mode):
+    """Retourne la chaîne du mode demandé (direct par défaut, agent en secours)"""
+    if (mode or CHAT_MODE) == "direct" and runtime.direct_chain is not None:
+        return runtime.direct_chain
+    return runtime.agent_executor
+
+def _metrics_config(*handlers):
+    # un handler par requête : il suit les runs (LLM, retriever, tools) de cette requête
+    return {"callbacks": [MetricsCallbackHandler(), *handlers]}
+
+async def _invoke_chain(runtime, inputs, mode):
+    """
+    Retourne la sortie de la chaîne et ce qu'elle a récupéré (documents, tools).
+    Seule une réponse illisible du mode direct est redemandée à l'agent : une erreur
+    (LLM indisponible, recherche) remonte telle quelle, sans doubler les appels au LLM
+    """
+    chain = _select_chain(runtime, mode)
+    sources = SourceCollector()
+    raw_response = await chain.ainvoke(inputs, config=_metrics_config(sources))
+    if chain is not runtime.direct_chain:
+        return raw_response, sources
+    parsed_response = ResearchResponseParser.parse(raw_response.get("output") or "")
+    if parsed_response["topic"] not in UNPARSED_TOPICS:
+        return {"output": parsed_response}, sources
+    logging.warning("Direct mode answer could not be parsed, falling back to the agent")
+    CHAT_FALLBACKS.inc()
+    sources = SourceCollector()
+    return await runtime.agent_executor.ainvoke(inputs, config=_metrics_config(sources)), sources
+
+def _build_response(raw_response, documents=None, tools=()):
+    """
+    Parse la sortie de l'agent et la valide en ResearchResponse ; avec les documents
+    donnés au modèle, les sources et les tools viennent de la recherche et non du texte généré
+    """
+    if isinstance(raw_response, str):
+        parsed_response = ResearchResponseParser.parse(text=raw_response)
+    elif isinstance(raw_response, dict):
+        parsed_response = raw_response
+    else:
+        raise ValueError("Unexpected response format from agent")
+    if documents is not None:
+        parsed_response = fill_sources(dict(parsed_response), documents, tools)
+    return ResearchResponse(
+        topic=parsed_response["topic"],
+        summary=parsed_response["summary"],
+        sources=parsed_response["sources"],
+        tools_used=parsed_response["tools_used"],
+        entities=parsed_response.get("entities", []),
+        source_documents=parsed_response.get("source_documents", [])
+    )
+
+def _entity_lookup(runtime, message):
+    """Répond aux demandes de coordonnées directement depuis l'index des entités, sans LLM"""
+    if not ENTITY_LOOKUP_ENABLED:
+        return None
+    with timed("entity_lookup"):
+        records = runtime.entity_index.match_question(message)
+    if not records:
+        return None
+    english = is_english(message)
+    lines = []
+    for record in records:
+        contact = record["contact"]
+        details = [
+            (("phone" if english else "téléphone"), contact.get("phone")),
+            ("email", contact.get("email")),
+            (("address" if english else "adresse"), contact.get("address")),
+            (("website" if english else "site web"), contact.get("website")),
+        ]
+        city = f" ({record['city']})" if record.get("city") else ""
+        lines.append(f"- {contact['name']}{city} : " + ", ".join(f"{label} {value}" for label, value in details if value))
+    header = "Here are the contact details found:" if english else "Voici les coordonnées trouvées :"
+    names = ", ".join(dict.fromkeys(record["contact"]["name"] for record in records))
+    return ResearchResponse(
+        topic=(f"Contact details: {names}" if english else f"Coordonnées : {names}"),
+        summary="\n".join([header] + lines),
+        sources=list(dict.fromkeys(record["source"] for record in records)),
+        tools_used=["Entity_Index"],
+        entities=to_contacts(records)
+    )
+
+async def _cache_lookup(message, mode, history=None):
+    """
+    Cherche une réponse en cache, l'embedding de la question tourne hors de la boucle d'événements.
+    Chaque mode a ses réponses : l'agent et la chaîne directe ne répondent pas de la même façon
+    """
+    # une question de suivi dépend de la conversation : sa réponse n'est ni lue ni mise en cache
+    if not CACHE_ENABLED or history:
+        return None, None
+    try:
+        with timed("cache_lookup"):
+            return await asyncio.to_thread(_answer_cache.lookup, message, mode or CHAT_MODE)
+    except Exception as e:
+        logging.warning(f"Answer cache lookup failed: {str(e)}")
+        return None, None
+
+def _cache_store(runtime, message, mode, output, question_vector):
+    # les réponses qui n'ont pas pu être parsées ne sont pas réutilisées
+    if CACHE_ENABLED and question_vector is not None and output.topic not in UNPARSED_TOPICS:
+        _answer_cache.store(message, output.model_dump(), question_vector, version=runtime.version,
+                            namespace=mode or CHAT_MODE)
+
+def _history(chat_message):
+    """Historique de la session (résumé + derniers échanges), vide sans session_id"""
+    if not chat_message.session_id:
+        return []
+    return _sessions.history(chat_message.session_id)
+
+def _remember(chat_message, answer):
+    if chat_message.session_id:
+        _sessions.add_turn(chat_message.session_id, chat_message.message, answer)
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _static_stream(response):
+    """Flux SSE d'une réponse déjà connue (cache, index des entités)"""
+    async def stream():
+        yield _sse("token", {"text": response["summary"]})
+        yield _sse("response", response)
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(chat_message: ChatMessage, request: Request):
+    """
+    Server-Sent-Events version of /chat.
+    Sends `token` events with the summary text as the model generates it,
+    then one `response` event with the validated ResearchResponse (or an `error` event,
+    with `"reason": "timeout"` when the deadline passed first).
+    """
+    watch = _watch(request)
+    runtime = _get_runtime()
+
+    lookup = _entity_lookup(runtime, chat_message.message)
+    if lookup is not None:
+        CHAT_REQUESTS.inc(endpoint="chat_stream", outcome="entity_lookup")
+        _remember(chat_message, lookup.summary)
+        return _static_stream(lookup.model_dump())
+    history = _history(chat_message)
+    cached, question_vector = await _cache_lookup(chat_message.message, chat_message.mode, history)
+    if cached is not None:
+        CHAT_REQUESTS.inc(endpoint="chat_stream", outcome="cache_hit")
+        _remember(chat_message, cached["summary"])
+        return _static_stream(cached)
+
+    key = _flight_key(runtime, "chat_stream", chat_message, history)
+    flight = _flights.get(key)
+    leader = False
+    if flight is None:
+        try:
+            with timed("queue_wait"):
+                await _chat_limiter.acquire()
+        except QueueFullError as e:
+            logging.warning(f"Chat stream request rejected: {str(e)}")
+            CHAT_REQUESTS.inc(endpoint="chat_stream", outcome="rejected")
+            raise HTTPException(status_code=503, detail="Server busy, please retry later", headers={"Retry-After": str(CHAT_RETRY_AFTER)})
+        # la même question a pu démarrer pendant l'attente du slot
+        flight = _flights.get(key)
+        if flight is not None:
+            _chat_limiter.release()
+        else:
+            flight = _flights.start(key, lambda: _stream_answer(
+                runtime, chat_message.message, chat_message.mode, history, question_vector))
+            leader = True
+
+    async def event_stream():
+        # les requêtes identiques reçoivent tous les événements de l'exécution, depuis le premier token
+        events = flight.subscribe()
+        try:
+            while (item := await watch.run(anext(events, None))) is not None:
+                event, data = item
+                if event == "response":
+                    _remember(chat_message, data["summary"])
+                    CHAT_REQUESTS.inc(endpoint="chat_stream", outcome="llm" if leader else "coalesced")
+                yield _sse(event, data)
+        except RequestCancelled as e:
+            logging.warning(f"Chat stream request cancelled: {e.reason}")
+            CHAT_CANCELLED.inc(endpoint="chat_stream", reason=e.reason)
+            CHAT_REQUESTS.inc(endpoint="chat_stream", outcome="timeout" if e.reason == "deadline" else "disconnected")
+            if e.reason == "deadline":
+                yield _sse("error", {"detail": "Request timed out before the answer was ready", "reason": "timeout"})
+        finally:
+            # un abonnement encore en attente d'un événement est fermé par l'annulation de cette attente
+            if not events.ag_running:
+                await events.aclose()
+            watch.close()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+async def _stream_answer(runtime, message, mode, history, question_vector):
+    """
+    Exécution de /chat/stream partagée par les requêtes identiques, le slot du limiteur
+    est déjà pris : produit les événements (token, response ou error) à envoyer
+    """
+    try:
+        sources = SourceCollector()
+        # un parser incrémental par génération du LLM : seule la réponse finale contient le JSON
+        stream_parsers = {}
+        tool_runs = set()
+        final_output = None
+        started_at = time.perf_counter()
+        first_token = True
+        async for event in _select_chain(runtime, mode).astream_events(
+            {"input": message, "chat_history": history},
+            config=_metrics_config(sources),
+            version="v2",
+        ):
+            kind = event["event"]
+            if kind == "on_tool_start":
+                tool_runs.add(event["run_id"])
+            elif kind == "on_chat_model_stream":
+                # les tokens générés à l'intérieur du tool RAG ne sont pas la réponse finale
+                if tool_runs.intersection(event.get("parent_ids", [])):
+                    continue
+                content = event["data"]["chunk"].content
+                if not isinstance(content, str) or not content:
+                    continue
+                stream_parser = stream_parsers.setdefault(event["run_id"], ResearchResponseStreamParser())
+                delta = stream_parser.feed(content)
+                if delta:
+                    if first_token:
+                        observe_stage("first_token", time.perf_counter() - started_at)
+                        first_token = False
+                    yield "token", {"text": delta}
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                final_output = event["data"].get("output", {}).get("output")
+        observe_stage("chain", time.perf_counter() - started_at)
+        with timed("parse"):
+            output = _build_response(final_output, sources.documents, sources.tools)
+        _cache_store(runtime, message, mode, output, question_vector)
+        yield "response", output.model_dump()
+    except Exception as e:
+        logging.error(f"Error in chat stream endpoint: {str(e)}")
+        CHAT_REQUESTS.inc(endpoint="chat_stream", outcome="error")
+        yield "error", {"detail": f"Error in treating request: {str(e)}"}
+    finally:
+        _chat_limiter.release()
+
+@app.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch_endpoint(batch: BatchChatRequest, request: Request):
+    """
+    Answers a list of questions in direct mode, without conversation history.
+    The questions are embedded in one pass and searched together, then the answers
+    are generated `concurrency` at a time. A failed question gets an `error` instead
+    of a `response`, the others are still answered. Results come in the order of the
+    questions, or with `"stream": true` as NDJSON lines (one BatchResult each) as they complete.
+    """
+    runtime = _get_runtime()
+    # une deadline de chat n'a pas de sens pour un batch : seule la déconnexion du client l'arrête
+    watch = RequestWatch(request, None)
+    concurrency = min(batch.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)
+
+    looked_up, pending = [], []
+    for index, question in enumerate(batch.questions):
+        lookup = _entity_lookup(runtime, question)
+        if lookup is not None:
+            CHAT_REQUESTS.inc(endpoint="chat_batch", outcome="entity_lookup")
+            looked_up.append(BatchResult(index=index, question=question, response=lookup))
+        else:
+            pending.append(index)
+    try:
+        with timed("batch_retrieval"):
+            inputs = await asyncio.to_thread(
+                batch_inputs, runtime.vectorstore, [batch.questions[index] for index in pending], runtime.router)
+    except Exception as e:
+        logging.error(f"Error in chat batch retrieval: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error in treating request: {str(e)}")
+
+    async def completed():
+        for result in looked_up:
+            yield result
+        # chaque génération prend un slot du limiteur de /chat : un gros batch ne dépasse pas MAX_CONCURRENT_CHATS
+        # et attend son tour au lieu d'être rejeté
+        answers = answer_many(runtime.answer_chain, inputs, concurrency, _metrics_config(),
+                              slot=lambda: _chat_limiter.slot(reject=False))
+        async with contextlib.aclosing(answers) as answers:
+            async for position, raw_response, error in answers:
+                index = pending[position]
+                yield _batch_result(index, batch.questions[index], raw_response, error, inputs[position]["documents"])
+
+    if batch.stream:
+        async def lines():
+            results = completed()
+            try:
+                while (result := await watch.run(anext(results, None))) is not None:
+                    yield result.model_dump_json() + "\n"
+            except RequestCancelled as e:
+                logging.warning(f"Chat batch cancelled: {e.reason}")
+                CHAT_CANCELLED.inc(endpoint="chat_batch", reason=e.reason)
+            finally:
+                if not results.ag_running:
+                    await results.aclose()
+                watch.close()
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    async def collect():
+        return sorted([result async for result in completed()], key=lambda result: result.index)
+    try:
+        results = await watch.run(collect())
+    except RequestCancelled as e:
+        logging.warning(f"Chat batch cancelled: {e.reason}")
+        CHAT_CANCELLED.inc(endpoint="chat_batch", reason=e.reason)
+        raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        watch.close()
+    failed = sum(result.error is not None for result in results)
+    return BatchChatResponse(results=results, succeeded=len(results) - failed, failed=failed)
+
+def _batch_result(index, question, raw_response, error, documents):
+    if error is None:
+        try:
+            response = _build_response(raw_response.get("output", None), documents)
+        except Exception as e:
+            error = e
+    if error is not None:
+        logging.error(f"Error in chat batch question {index}: {str(error)}")
+        CHAT_REQUESTS.inc(endpoint="chat_batch", outcome="error")
+        return BatchResult(index=index, question=question, error=f"Error in treating request: {str(error)}")
+    CHAT_REQUESTS.inc(endpoint="chat_batch", outcome="llm")
+    return BatchResult(index=index, question=question, response=response)
+
+def _embedding_stats(runtime):
+    ## the chunk cache wraps the query batcher, which wraps the model
+    embeddings = runtime.vectorstore.embeddings if runtime is not None else None
+    stats = {}
+    while embeddings is not None:
+        if isinstance(embeddings, CachedEmbeddings):
+            stats["cache"] = embeddings.stats()
+        elif isinstance(embeddings, BatchingEmbeddings):
+            stats.update(embeddings.stats())
+        embeddings = getattr(embeddings, "inner", None)
+    return stats or None
 
 @app.get("/health")
 async def health_check():
-    global _agent
-    status = "healthy" if _agent is not None else "unhealthy"
-    return {"status": status, "message": "Service is running" if status == "healthy" else "Service not initialized"}
+    runtime = _runtime
+    status = "healthy" if runtime is not None else "unhealthy"
+    return {
+        "status": status,
+        "message": "Service is running" if status == "healthy" else "Service not initialized",
+        "index_version": runtime.version if runtime is not None else None,
+        "chat": _chat_limiter.stats(),
+        "cache": _answer_cache.stats(),
+        "coalescing": _flights.stats(),
+        "sessions": _sessions.stats(),
+        "embeddings": _embedding_stats(runtime),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métriques au format texte Prometheus (latence par étape, tokens, appels de tools, erreurs de parsing)"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
-@app.post("/reload")
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Oublie l'historique d'une conversation"""
+    if not _sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Unknown session")
+    return {"session_id": session_id, "deleted": True}
+
+@app.post("/reload", status_code=202)
 async def reload_rag_system():
-    try:
-        initialize_rag_system()
-        return {"message": "System RAG reloaded successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error in reloading: {str(e)}")
+    """Lance la reconstruction de l'index en arrière-plan ; le service reste disponible pendant le build"""
+    job = _reload_manager.start()
+    return {"message": "System RAG reload started", **job.to_dict()}
 
+@app.get("/reload/{job_id}")
+async def reload_status(job_id: str):
+    job = _reload_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown reload job")
+    return job.to_dict()
@@ -0,0 +1,143 @@
+import asyncio
+import gc
+import logging
+import time
+import uuid
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+from langchain.agents import create_tool_calling_agent, AgentExecutor
+from backend.src.entities import EntityIndex
+from backend.src.index import build_index, current_index_path, load_index, load_entity_index, load_router, prune_versions
+from backend.src.prompt import promptResponse
+from backend.src.rag import DATA_DIR, DB_PATH, create_answer_chain, create_rag_chain, create_direct_chain
+from backend.src.routing import QueryRouter
+
+
+@dataclass(frozen=True)
+class RagRuntime:
+    """
+    Everything a chat request needs, built together and never modified.
+    A reload builds a new runtime and swaps the reference in one assignment:
+    requests that started with the old runtime keep using it until they end.
+    """
+    vectorstore: Any
+    agent_executor: Any
+    direct_chain: Any
+    entity_index: EntityIndex
+    ingest_stats: Dict[str, Any]
+    router: Optional[QueryRouter] = None
+    # generation of the direct chain without its retrieval, for the batch endpoint
+    answer_chain: Any = None
+    # version directory the vector store was opened from
+    index_path: Optional[str] = None
+
+    @property
+    def version(self) -> Optional[int]:
+        return self.ingest_stats.get("version")
+
+
+def build_runtime(rebuild: bool = False, index_root: str = DB_PATH, data_dir: str = DATA_DIR) -> RagRuntime:
+    """
+    Opens the prebuilt index (or builds a new version of it when `rebuild` is set
+    or the index is stale) and creates the agent and the direct chain on top of it.
+    The old versions are then pruned, except the ones a runtime still in use was opened from.
+    """
+    if rebuild:
+        vectorstore, ingest_stats = build_index(index_root, data_dir)
+    else:
+        vectorstore, ingest_stats = load_index(index_root, data_dir)
+
+    router = load_router(index_root)
+    tool, llm = create_rag_chain(vectorstore, router)
+    agent = create_tool_calling_agent(llm=llm, tools=[tool], prompt=promptResponse)
+    agent_executor = AgentExecutor(agent=agent, tools=[tool], verbose=False, handle_parsing_errors=False)
+
+    runtime = RagRuntime(
+        vectorstore=vectorstore,
+        agent_executor=agent_executor,
+        direct_chain=create_direct_chain(vectorstore, llm, router),
+        entity_index=load_entity_index(index_root),
+        ingest_stats=ingest_stats,
+        router=router,
+        answer_chain=create_answer_chain(llm),
+        index_path=current_index_path(index_root),
+    )
+    _live_runtimes[id(runtime)] = runtime
+    # a runtime replaced by a reload stays alive until the requests that started with it end;
+    # the ones only kept by reference cycles are collected first so their versions can go
+    gc.collect()
+    prune_versions(index_root, in_use=[live.index_path for live in list(_live_runtimes.values())])
+    return runtime
+
+
+## every runtime still referenced, by the API or by requests running on an older index
+_live_runtimes: "weakref.WeakValueDictionary[int, RagRuntime]" = weakref.WeakValueDictionary()
+
+
+@dataclass
+class ReloadJob:
+    id: str
+    status: str = "pending"
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    ingestion: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "ingestion": self.ingestion,
+            "error": self.error,
+        }
+
+
+class ReloadManager:
+    """
+    Runs index rebuilds in the background, one at a time.
+    Starting a reload while one is running returns the running job.
+    When a build succeeds, `on_ready` receives the new runtime to swap it in.
+    """
+
+    def __init__(self, on_ready: Callable[[RagRuntime], None], max_jobs: int = 20):
+        self.on_ready = on_ready
+        self.max_jobs = max_jobs
+        self.jobs: Dict[str, ReloadJob] = {}
+        self._current: Optional[ReloadJob] = None
+        self._task = None
+
+    def start(self) -> ReloadJob:
+        if self._current is not None and self._current.status in ("pending", "running"):
+            return self._current
+        job = ReloadJob(id=uuid.uuid4().hex)
+        self.jobs[job.id] = job
+        while len(self.jobs) > self.max_jobs:
+            del self.jobs[next(iter(self.jobs))]
+        self._current = job
+        # keep a reference, the event loop only keeps weak references to tasks
+        self._task = asyncio.create_task(self._run(job))
+        return job
+
+    def get(self, job_id: str) -> Optional[ReloadJob]:
+        return self.jobs.get(job_id)
+
+    async def _run(self, job: ReloadJob) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            # the build parses, embeds and writes files: keep it off the event loop
+            runtime = await asyncio.to_thread(build_runtime, True)
+            self.on_ready(runtime)
+            job.ingestion = runtime.ingest_stats
+            job.status = "succeeded"
+        except Exception as e:
+            logging.error(f"Error in reloading: {str(e)}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
@@ -0,0 +1,118 @@
+import asyncio
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class Flight:
+    """
+    One shared execution: the events its producer yields are kept so a request
+    joining late still receives all of them, in order. The execution is cancelled
+    when its last subscriber leaves before the end: nobody would read its result.
+    """
+
+    def __init__(self):
+        self.events: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def _publish(self, event: Any) -> None:
+        self.events.append(event)
+        self._notify()
+
+    def _finish(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        """Yields every event of the execution, then raises its error if it failed."""
+        position = 0
+        self.subscribers += 1
+        try:
+            while True:
+                changed = self._changed
+                while position < len(self.events):
+                    yield self.events[position]
+                    position += 1
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await changed.wait()
+        finally:
+            self.subscribers -= 1
+            if not self.done and not self.subscribers and self.task is not None:
+                self.task.cancel()
+
+    async def result(self) -> Any:
+        """The last event of the execution, for producers yielding a single result."""
+        last = None
+        async for event in self.subscribe():
+            last = event
+        return last
+
+
+class SingleFlight:
+    """
+    Coalesces identical requests running at the same time: the first request for a key
+    starts the producer in its own task, the requests arriving with the same key
+    while it runs subscribe to it instead of doing the work again.
+    A key is forgotten as soon as its execution ends, so nothing is served after
+    that (the answer cache is the place for reuse over time).
+    """
+
+    def __init__(self):
+        self.started = 0
+        self.merged = 0
+        self.cancelled = 0
+        self._flights: Dict[Hashable, Flight] = {}
+
+    def get(self, key: Hashable) -> Optional[Flight]:
+        """The running execution of `key`, counted as merged, or None."""
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.merged += 1
+        return flight
+
+    def start(self, key: Hashable, producer: Callable[[], AsyncIterator[Any]]) -> Flight:
+        """Runs `producer()` as the shared execution of `key` (which must not be running)."""
+        flight = Flight()
+        self._flights[key] = flight
+        self.started += 1
+        flight.task = asyncio.create_task(self._run(key, flight, producer))
+        return flight
+
+    def join(self, key: Hashable, producer: Callable[[], AsyncIterator[Any]]) -> Tuple[Flight, bool]:
+        """Returns the execution of `key`, started if needed, and whether this request started it."""
+        flight = self.get(key)
+        if flight is not None:
+            return flight, False
+        return self.start(key, producer), True
+
+    async def _run(self, key, flight, producer):
+        try:
+            async for event in producer():
+                flight._publish(event)
+        except asyncio.CancelledError as e:
+            self.cancelled += 1
+            flight._finish(e)
+        except BaseException as e:
+            flight._finish(e)
+        else:
+            flight._finish()
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def stats(self) -> dict:
+        return {"in_flight": self.in_flight, "started": self.started, "merged": self.merged, "cancelled": self.cancelled}
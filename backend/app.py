@@ -1,11 +1,16 @@
 import streamlit as st
 from dotenv import load_dotenv
 from langchain.agents import create_tool_calling_agent, AgentExecutor
-from src.prompt import prompt, parser
-from src.rag import create_rag_chain, load_documents, split_documents, create_vectorstore
+from src.prompt import promptResponse, parser
+from src.rag import create_rag_chain
+from src.index import load_index, index_info
+from src.sessions import create_session_store
+from src.models import ResearchResponse
+from src.sources import SourceCollector, fill_sources
 import os
 from sentence_transformers import SentenceTransformer
 import time
+import uuid
 from datetime import datetime
 
 # Configuration de la page
@@ -98,16 +103,15 @@ def initialize_rag_system():
     """Initialise le système RAG avec cache Streamlit"""
     with st.spinner("🔄 Initialisation du système RAG..."):
         try:
-            docs = load_documents()
-            chunks = split_documents(docs)
-            db = create_vectorstore(chunks)
+            db, _ = load_index()
+            info = index_info()
             tool, llm = create_rag_chain(db)
             
             # Configuration de l'agent
-            agent = create_tool_calling_agent(llm, tools=[], prompt=prompt)
+            agent = create_tool_calling_agent(llm, tools=[tool], prompt=promptResponse)
             agent_executor = AgentExecutor(agent=agent, tools=[tool], verbose=False)
             
-            return agent_executor, len(docs), len(chunks)
+            return agent_executor, info["documents"], info["chunks"]
         except Exception as e:
             st.error(f"Erreur lors de l'initialisation: {str(e)}")
             return None, 0, 0
@@ -117,16 +121,28 @@ def get_rag_system():
     """Cache le système RAG pour éviter de le recharger à chaque interaction"""
     return initialize_rag_system()
 
-def process_query(agent_executor, query):
+@st.cache_resource
+def get_session_store():
+    """Historique des conversations, partagé par les sessions Streamlit du processus"""
+    return create_session_store()
+
+def process_query(agent_executor, query, session_id=None):
     """Traite une requête avec l'agent RAG"""
+    sessions = get_session_store()
     try:
         with st.spinner("🧠 Traitement de votre question..."):
             start_time = time.time()
-            raw_response = agent_executor.invoke({"query": query, "chat_history": []})
+            history = sessions.history(session_id) if session_id else []
+            sources = SourceCollector()
+            raw_response = agent_executor.invoke({"input": query, "chat_history": history}, config={"callbacks": [sources]})
             processing_time = time.time() - start_time
             
         try:
             structured_response = parser.parse(raw_response.get("output", ""))
+            # les sources viennent des documents récupérés, pas du texte généré
+            structured_response = ResearchResponse(**fill_sources(structured_response.model_dump(), sources.documents, sources.tools))
+            if session_id:
+                sessions.add_turn(session_id, query, structured_response.summary)
             return structured_response, processing_time, True
         except Exception as parse_error:
             st.warning("⚠️ Erreur de parsing, retour de la réponse brute")
@@ -177,6 +193,7 @@ def main():
         # Bouton pour effacer l'historique
         if st.button("🗑️ Effacer l'historique", type="secondary"):
             st.session_state.chat_history = []
+            get_session_store().delete(st.session_state.get("session_id", ""))
             st.rerun()
 
     # Vérification de l'initialisation
@@ -187,6 +204,8 @@ def main():
     # Initialisation de l'historique de chat
     if 'chat_history' not in st.session_state:
         st.session_state.chat_history = []
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
 
     # Interface principale de chat
     st.header("💬 Interface de Chat")
@@ -218,7 +237,8 @@ def main():
             # Traitement de la requête
             response, processing_time, parse_success = process_query(
                 st.session_state.agent_executor, 
-                user_question
+                user_question,
+                st.session_state.session_id
             )
             
             if response:
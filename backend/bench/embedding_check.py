@@ -0,0 +1,144 @@
+"""
+Agreement and speed check of the ONNX embedding backend against the reference model.
+
+Embeds the same chunks and questions with the sentence-transformers model
+(HuggingFaceEmbeddings, torch) and with its ONNX Runtime export, in fp32 and
+int8, and reports for each variant
+  - agreement: cosine similarity between its vectors and the reference vectors
+    (mean / min / 1st percentile) and the overlap of the top-k chunks retrieved
+    for each question, i.e. how much switching backend would change retrieval
+  - speed: documents per second for embed_documents, query latency percentiles
+    for embed_query, and the speedup of both over the reference
+
+The chunks come from the data folder when it exists, otherwise from the
+synthetic agency records of the benchmark suite. Needs the local MiniLM model,
+torch (reference and first export) and the onnx package for the int8 variant.
+
+Usage (from the repository root):
+    python -m backend.bench.embedding_check [--variants fp32,int8] [--limit 2000] [--output check.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+from langchain_huggingface import HuggingFaceEmbeddings
+from backend.bench.suite import questions, summarize, synthetic_documents
+from backend.src.config import EMBED_ONNX_THREADS
+from backend.src.onnx_embeddings import OnnxEmbeddings
+from backend.src.rag import DATA_DIR, EMBEDDING_MODEL, load_documents, split_documents
+
+VARIANTS = ("fp32", "int8")
+
+
+def corpus_texts(limit, seed):
+    if os.path.isdir(DATA_DIR) and os.listdir(DATA_DIR):
+        source, docs = DATA_DIR, load_documents(DATA_DIR)
+    else:
+        source, docs = "synthetic", synthetic_documents(limit, seed)
+    return source, [chunk.page_content for chunk in split_documents(docs)[:limit]]
+
+
+def measure(model, texts, query_texts):
+    started = time.perf_counter()
+    vectors = np.asarray(model.embed_documents(texts), dtype=np.float32)
+    documents_seconds = time.perf_counter() - started
+    latencies, query_vectors = [], []
+    for text in query_texts:
+        started = time.perf_counter()
+        query_vectors.append(model.embed_query(text))
+        latencies.append(time.perf_counter() - started)
+    return vectors, np.asarray(query_vectors, dtype=np.float32), documents_seconds, latencies
+
+
+def top_k(query_vectors, vectors, k):
+    scores = query_vectors @ vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def agreement(reference, candidate):
+    # both models normalize their vectors: the dot product is the cosine
+    cosines = np.sum(reference * candidate, axis=1)
+    return {
+        "cosine_mean": float(cosines.mean()),
+        "cosine_min": float(cosines.min()),
+        "cosine_p1": float(np.percentile(cosines, 1)),
+    }
+
+
+def overlap(reference_top, candidate_top):
+    """Mean share of the reference top-k chunks also retrieved by the candidate."""
+    return float(np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(reference_top, candidate_top)]))
+
+
+def speed(documents, documents_seconds, latencies, reference=None):
+    result = {
+        "documents_per_s": documents / documents_seconds,
+        "query": summarize(latencies),
+    }
+    if reference is not None:
+        result["documents_speedup"] = result["documents_per_s"] / reference["documents_per_s"]
+        result["query_p50_speedup"] = reference["query"]["p50_ms"] / result["query"]["p50_ms"]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="comma separated ONNX variants to check")
+    parser.add_argument("--limit", type=int, default=2000, help="maximum number of chunks embedded")
+    parser.add_argument("--queries", type=int, default=100, help="questions embedded one by one")
+    parser.add_argument("--top-k", type=int, default=5, help="chunks compared per question")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file instead of stdout")
+    args = parser.parse_args()
+
+    variants = [name for name in args.variants.split(",") if name]
+    unknown = set(variants) - set(VARIANTS)
+    if unknown:
+        parser.error(f"unknown variants: {', '.join(sorted(unknown))}")
+
+    with contextlib.redirect_stdout(sys.stderr):
+        source, texts = corpus_texts(args.limit, args.seed)
+        query_texts = questions(args.queries, args.seed)
+        reference_model = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL, cache_folder="./backend/models")
+        # the first calls pay for lazy initialisations, keep them out of the timings
+        reference_model.embed_documents(texts[:8])
+        vectors, query_vectors, seconds, latencies = measure(reference_model, texts, query_texts)
+        reference_top = top_k(query_vectors, vectors, args.top_k)
+        results = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "model": EMBEDDING_MODEL,
+                "source": source,
+                "chunks": len(texts),
+                "args": {key: value for key, value in vars(args).items() if key != "output"},
+            },
+            "reference": speed(len(texts), seconds, latencies),
+        }
+        for variant in variants:
+            model = OnnxEmbeddings(EMBEDDING_MODEL, quantize=variant == "int8", threads=EMBED_ONNX_THREADS or None)
+            model.embed_documents(texts[:8])
+            candidate, candidate_queries, seconds, latencies = measure(model, texts, query_texts)
+            results[variant] = {
+                "documents": agreement(vectors, candidate),
+                "queries": agreement(query_vectors, candidate_queries),
+                "top_k_overlap": overlap(reference_top, top_k(candidate_queries, candidate, args.top_k)),
+                **speed(len(texts), seconds, latencies, results["reference"]),
+            }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Results written to {args.output}")
+    else:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Local stand-in for the Ollama HTTP API, so the chat path can be benchmarked
+without a GPU, a model or the network.
+
+It answers /api/tags (model validation) and /api/chat, streamed or not, with a
+canned answer JSON (topic, summary, entities) built from the question. Latency is injected
+before the first token and between tokens. When the request carries tools and
+no tool result yet, the first answer is a call of the first tool, so the agent
+mode goes through its full tool round trip.
+
+Usage (from the repository root):
+    python -m backend.bench.fake_ollama [--port 11434] [--first-token-ms 50] [--token-ms 5]
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODEL = "mistral:7b"
+
+
+def canned_answer(question: str) -> str:
+    topic = " ".join(question.split()[:6]) or "Tourism"
+    return json.dumps({
+        "topic": topic,
+        "summary": f"Here is what I found about {question.strip()}: several agencies and guides "
+                   "can help you plan the trip, see the sources for their contact details.",
+        "entities": [],
+    }, ensure_ascii=False)
+
+
+def _tokens(text: str):
+    """Splits a text in small pieces, roughly the size of LLM tokens."""
+    return re.findall(r"\s*\S{1,4}", text)
+
+
+class FakeOllamaServer:
+    """Threaded fake Ollama server, usable as a context manager."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, first_token_ms: float = 50, token_ms: float = 5):
+        self.first_token = first_token_ms / 1000.0
+        self.token = token_ms / 1000.0
+        self.requests = 0
+        ## streamed answers whose client closed the connection before the end
+        self.aborted = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reply(self, body: dict) -> dict:
+        """Builds the assistant message answering a /api/chat request."""
+        messages = body.get("messages", [])
+        question = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        tools = body.get("tools") or []
+        if tools and not any(m.get("role") == "tool" for m in messages):
+            name = tools[0].get("function", {}).get("name", "tool")
+            return {"role": "assistant", "content": "",
+                    "tool_calls": [{"function": {"name": name, "arguments": {"__arg1": question}}}]}
+        return {"role": "assistant", "content": canned_answer(question)}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, payload, status=200):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json({"models": [{"name": MODEL, "model": MODEL, "size": 0, "digest": "fake"}]})
+                elif self.path == "/api/version":
+                    self._send_json({"version": "0.0.0-fake"})
+                else:
+                    self._send_json({"error": "not found"}, status=404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if self.path != "/api/chat":
+                    self._send_json({"error": "not found"}, status=404)
+                    return
+                server.requests += 1
+                message = server.reply(body)
+                prompt_tokens = sum(len(_tokens(m.get("content") or "")) for m in body.get("messages", []))
+                done = {
+                    "model": body.get("model", MODEL),
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "done": True,
+                    "done_reason": "stop",
+                    "prompt_eval_count": prompt_tokens,
+                }
+                time.sleep(server.first_token)
+                pieces = _tokens(message["content"])
+                done["eval_count"] = max(len(pieces), 1)
+
+                if not body.get("stream", True):
+                    time.sleep(server.token * len(pieces))
+                    self._send_json(dict(done, message=message))
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    if message.get("tool_calls"):
+                        self._write_chunk(dict(done, done=False, message=message))
+                    for i, piece in enumerate(pieces):
+                        if i:
+                            time.sleep(server.token)
+                        self._write_chunk({"model": done["model"], "created_at": done["created_at"], "done": False,
+                                           "message": {"role": "assistant", "content": piece}})
+                    self._write_chunk(dict(done, message={"role": "assistant", "content": ""}))
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client cancelled the generation, as Ollama would stop generating
+                    server.aborted += 1
+                    self.close_connection = True
+
+            def _write_chunk(self, payload):
+                data = (json.dumps(payload) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--first-token-ms", type=float, default=50)
+    parser.add_argument("--token-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.host, args.port, args.first_token_ms, args.token_ms)
+    print(f"Fake Ollama listening on {server.base_url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
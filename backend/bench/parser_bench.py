@@ -0,0 +1,81 @@
+"""
+Microbenchmark of ResearchResponseParser over captured agent outputs.
+
+Compares the current single pass scanner with the previous regex based
+extraction, on throughput and on the number of outputs that end up as an
+"Unknown Topic" response.
+
+Usage (from the repository root):
+    python -m backend.bench.parser_bench [--repeat 200] [--output results.json]
+"""
+import argparse
+import json
+import os
+import re
+import time
+from backend.src.parser import ResearchResponseParser
+
+CORPUS = os.path.join(os.path.dirname(__file__), "corpus", "agent_outputs.jsonl")
+
+
+def load_corpus(path=CORPUS):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["output"] for line in f if line.strip()]
+
+
+def legacy_parse(text):
+    """The regex extraction used before the scanner, kept as the baseline."""
+    json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', text, re.DOTALL)
+    if not json_match:
+        json_match = re.search(r'(\{.*\})', text, re.DOTALL)
+    data = {"summary": text}
+    if json_match:
+        try:
+            data = json.loads(json_match.group(1).strip())
+        except json.JSONDecodeError:
+            data = {"summary": text[json_match.end():].strip() or text}
+    return ResearchResponseParser._validate_structure(data)
+
+
+def current_parse(text):
+    return ResearchResponseParser.parse(text)
+
+
+def run(parse, corpus, repeat):
+    failures = sum(1 for text in corpus if parse(text)["topic"] in ("Unknown Topic", "Parsing Error"))
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in corpus:
+            parse(text)
+    elapsed = time.perf_counter() - start
+    size = sum(len(text) for text in corpus) * repeat
+    return {
+        "outputs": len(corpus),
+        "failures": failures,
+        "us_per_output": elapsed / (repeat * len(corpus)) * 1e6,
+        "mchars_per_s": size / elapsed / 1e6,
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--repeat", type=int, default=200)
+    arg_parser.add_argument("--corpus", default=CORPUS)
+    arg_parser.add_argument("--output", help="write the results as JSON to this file")
+    args = arg_parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    results = {
+        "legacy_regex": run(legacy_parse, corpus, args.repeat),
+        "scanner": run(current_parse, corpus, args.repeat),
+    }
+    for name, result in results.items():
+        print(f"{name:>13}: {result['failures']}/{result['outputs']} unparsed, "
+              f"{result['us_per_output']:.1f} us/output, {result['mchars_per_s']:.2f} Mchars/s")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""
+Offline benchmark suite of the RAG pipeline.
+
+Runs without network, model or Ollama: the embeddings are the deterministic
+hashing backend and the LLM is the fake Ollama server of `fake_ollama`.
+Measures
+  - ingestion: load_documents -> split_documents -> create_vectorstore throughput
+    on a synthetic corpus, the incremental re-ingestion of the same corpus and
+    the streaming pipeline used by the index build (ingest_directory)
+  - retrieval: latency of the retriever used by the chains at several corpus sizes
+  - vectorstore: Chroma against the memory-mapped store, query latency and the
+    memory of a fresh process opening each of them, at the same corpus sizes
+  - parser: ResearchResponseParser throughput over the captured agent outputs
+  - chat: /chat p50 / p95 / p99 latency under N concurrent clients
+and writes the results as JSON so runs can be compared.
+
+The defaults below can be overridden from the environment, e.g. the real
+MiniLM model with TSARAIA_EMBEDDING_BACKEND=huggingface.
+
+Usage (from the repository root):
+    python -m backend.bench.suite [--only ingestion,retrieval,vectorstore,parser,chat] [--output results.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from urllib.parse import urlparse
+import numpy as np
+
+os.environ.setdefault("TSARAIA_EMBEDDING_BACKEND", "hashing")
+os.environ.setdefault("TSARAIA_OLLAMA_BASE_URL", "http://127.0.0.1:11435")
+# every question must reach the chain
+os.environ.setdefault("TSARAIA_CACHE_ENABLED", "false")
+# runs must not warm each other up, the embedding cache is measured on its own
+os.environ.setdefault("TSARAIA_EMBED_CACHE", "false")
+
+from langchain_core.documents import Document
+from backend.bench.fake_ollama import FakeOllamaServer
+from backend.bench.parser_bench import load_corpus, current_parse, run as run_parser
+from backend.src.config import EMBEDDING_BACKEND, OLLAMA_BASE_URL
+from backend.src.config import EMBED_CACHE_DTYPE, INGEST_WORKERS
+from backend.src.embeddings import CachedEmbeddings, EmbeddingCache
+from backend.src.metrics import CHAT_FALLBACKS
+from backend.src.rag import INGEST_BATCH_SIZE, create_vectorstore, get_embeddings, ingest_directory, load_documents, split_documents
+from backend.src.rag import open_vectorstore, sync_vectorstore
+
+BENCHMARKS = ("ingestion", "retrieval", "vectorstore", "parser", "chat")
+VECTORSTORES = ("chroma", "mmap")
+
+CITIES = ("Rabat", "Casablanca", "Marrakech", "Fès", "Tanger", "Agadir", "Essaouira", "Ouarzazate", "Chefchaouen", "Meknès")
+ACTIVITIES = ("circuits dans le désert", "randonnées dans l'Atlas", "visites des médinas", "excursions en 4x4",
+              "séjours balnéaires", "circuits culturels", "treks à dos de chameau", "visites des souks")
+SYLLABLES = ("ka", "ra", "ma", "sa", "ta", "zi", "lo", "nu", "fa", "da", "mi", "ro", "ya", "bi", "ne", "ho")
+RECIPE = ("Le tajine de poulet aux citrons confits se prépare avec des olives, du gingembre, du safran et de la "
+          "coriandre fraîche. La cuisson lente dans le plat en terre permet aux épices de parfumer la viande. ")
+
+
+def _name(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def synthetic_rows(count, seed=0):
+    """Agency records shaped like the rows of the agency exports."""
+    rng = random.Random(seed)
+    for i in range(count):
+        city = rng.choice(CITIES)
+        name = f"{_name(rng)} {rng.choice(('Voyages', 'Travel', 'Tours', 'Évasion'))}"
+        yield {
+            "Nom": name,
+            "Ville": city,
+            "Adresse": f"{rng.randint(1, 300)} avenue {_name(rng)}, {city}",
+            "Téléphone": f"+212 5{rng.randint(10, 39)} {rng.randint(100000, 999999)}",
+            "Email": f"contact{i}@{name.split()[0].lower()}.ma",
+            "Activité": rng.choice(ACTIVITIES),
+        }
+
+
+def synthetic_documents(count, seed=0):
+    """The same records as Documents, as CSVLoader would load them."""
+    return [
+        Document(
+            page_content="\n".join(f"{column}: {value}" for column, value in row.items()),
+            metadata={"source": "synthetic/agences.csv", "row": i},
+        )
+        for i, row in enumerate(synthetic_rows(count, seed))
+    ]
+
+
+def write_corpus(data_dir, rows, seed=0):
+    """Writes an agency export, a guide export and a prose recipe document into `data_dir`."""
+    os.makedirs(data_dir, exist_ok=True)
+    for file_name, count, file_seed in (("agences.csv", rows, seed), ("guides.csv", max(rows // 4, 1), seed + 1)):
+        records = list(synthetic_rows(count, file_seed))
+        with open(os.path.join(data_dir, file_name), "w", encoding="utf-8") as f:
+            f.write(",".join(records[0]) + "\n")
+            for record in records:
+                f.write(",".join(f'"{value}"' for value in record.values()) + "\n")
+    # minimal docx: Docx2txtLoader only reads word/document.xml
+    paragraphs = "".join(f"<w:p><w:r><w:t>{RECIPE * 3}</w:t></w:r></w:p>" for _ in range(max(rows // 20, 5)))
+    with zipfile.ZipFile(os.path.join(data_dir, "recettes.doc"), "w") as docx:
+        docx.writestr("word/document.xml",
+                      '<?xml version="1.0" encoding="UTF-8"?><w:document xmlns:w="http://schemas.openxmlformats.org/'
+                      f'wordprocessingml/2006/main"><w:body>{paragraphs}</w:body></w:document>')
+
+
+def questions(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        f"Quelles agences à {rng.choice(CITIES)} proposent des {rng.choice(ACTIVITIES)} ? (#{i})"
+        for i in range(count)
+    ]
+
+
+def summarize(latencies):
+    """Latency percentiles in milliseconds."""
+    values = np.asarray(latencies) * 1000
+    if not len(values):
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+def bench_ingestion(workdir, rows, seed):
+    data_dir = os.path.join(workdir, "ingestion", "data")
+    db_path = os.path.join(workdir, "ingestion", "db")
+    write_corpus(data_dir, rows, seed)
+
+    start = time.perf_counter()
+    docs = load_documents(data_dir)
+    loaded = time.perf_counter()
+    chunks = split_documents(docs)
+    split = time.perf_counter()
+    _, stats = create_vectorstore(chunks, db_path=db_path)
+    stored = time.perf_counter()
+    _, rerun_stats = create_vectorstore(chunks, db_path=db_path)
+    rerun = time.perf_counter()
+    embedding_cache = bench_embedding_cache(workdir, [chunk.page_content for chunk in chunks])
+    del docs, chunks
+    streaming_start = time.perf_counter()
+    _, streaming_stats = ingest_directory(data_dir, os.path.join(workdir, "ingestion", "streaming"))
+    streaming = time.perf_counter()
+
+    return {
+        "documents": streaming_stats["documents"],
+        "chunks": stats["added"] + stats["skipped"],
+        "load_s": loaded - start,
+        "split_s": split - loaded,
+        "vectorstore_s": stored - split,
+        "total_s": stored - start,
+        "documents_per_s": streaming_stats["documents"] / (stored - start),
+        "chunks_per_s": (stats["added"] + stats["skipped"]) / (stored - split),
+        "ingestion": stats,
+        "incremental_s": rerun - stored,
+        "incremental": rerun_stats,
+        "streaming_s": streaming - streaming_start,
+        "streaming_documents_per_s": streaming_stats["documents"] / (streaming - streaming_start),
+        "streaming_workers": INGEST_WORKERS,
+        "chunks_by_type": streaming_stats["chunks_by_type"],
+        "embedding_cache": embedding_cache,
+    }
+
+
+def bench_embedding_cache(workdir, texts):
+    """Embeds the chunks with an empty on-disk cache, then again with the cache filled by the first pass."""
+    embeddings = CachedEmbeddings(get_embeddings(), EmbeddingCache(os.path.join(workdir, "embedding_cache"), "bench",
+                                                                    EMBED_CACHE_DTYPE))
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        for i in range(0, len(texts), INGEST_BATCH_SIZE):
+            embeddings.embed_documents(texts[i:i + INGEST_BATCH_SIZE])
+        timings.append(time.perf_counter() - start)
+    return dict(embeddings.stats(), cold_s=timings[0], warm_s=timings[1])
+
+
+def bench_retrieval(workdir, sizes, query_count, seed):
+    results = []
+    for size in sizes:
+        start = time.perf_counter()
+        db, _ = create_vectorstore(synthetic_documents(size, seed), db_path=os.path.join(workdir, "retrieval", str(size)))
+        build_s = time.perf_counter() - start
+        # plain vector search of the 5 nearest chunks, without the routing and context budget of get_retriever
+        retriever = db.as_retriever(search_kwargs={"k": 5})
+        queries = questions(query_count, seed)
+        for query in queries[:5]:
+            retriever.invoke(query)
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            retriever.invoke(query)
+            latencies.append(time.perf_counter() - start)
+        results.append(dict(summarize(latencies), corpus_size=size, build_s=build_s))
+    return results
+
+
+def bench_vectorstore(workdir, sizes, query_count, seed):
+    """Builds both stores from the same chunks, then opens and queries each one in a fresh process."""
+    results = []
+    queries = questions(query_count, seed)
+    context = get_context("spawn")
+    for size in sizes:
+        chunks = split_documents(synthetic_documents(size, seed))
+        for backend in VECTORSTORES:
+            db_path = os.path.join(workdir, "vectorstore", backend, str(size))
+            os.makedirs(db_path)
+            start = time.perf_counter()
+            sync_vectorstore(open_vectorstore(db_path, backend), [chunks], db_path)
+            build_s = time.perf_counter() - start
+            # a new process per store: nothing is loaded or mapped yet, as in a starting API worker
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                probe = pool.submit(_probe_vectorstore, backend, db_path, queries).result()
+            results.append(dict(probe, vectorstore=backend, corpus_size=size, build_s=build_s))
+    return results
+
+
+def _probe_vectorstore(backend, db_path, queries):
+    before = _memory()
+    start = time.perf_counter()
+    retriever = open_vectorstore(db_path, backend).as_retriever(search_kwargs={"k": 5})
+    # Chroma loads its index on the first query: count it in the opening time
+    retriever.invoke(queries[0])
+    open_s = time.perf_counter() - start
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        retriever.invoke(query)
+        latencies.append(time.perf_counter() - start)
+    after = _memory()
+    return dict(summarize(latencies), open_s=open_s, memory_mb={key: after[key] - before[key] for key in after})
+
+
+def _memory():
+    """
+    Resident memory of the process in MB. Anonymous pages are private to the process,
+    file pages (mapped files) are shared through the page cache with the other processes.
+    """
+    if not os.path.exists("/proc/self/status"):
+        return {}
+    fields = {"VmRSS": "rss", "RssAnon": "anon", "RssFile": "file"}
+    memory = {}
+    with open("/proc/self/status", "r", encoding="utf-8") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in fields:
+                memory[fields[key]] = int(value.split()[0]) / 1024
+    return memory
+
+
+def bench_parser(repeat):
+    corpus = load_corpus()
+    return run_parser(current_parse, corpus, repeat)
+
+
+def bench_chat(workdir, rows, clients_levels, requests_per_client, mode, first_token_ms, token_ms, seed):
+    import httpx
+    from backend.api import main as api
+    from backend.api.runtime import build_runtime
+    logging.getLogger().setLevel(logging.WARNING)
+
+    url = urlparse(OLLAMA_BASE_URL)
+    data_dir = os.path.join(workdir, "chat", "data")
+    write_corpus(data_dir, rows, seed)
+    with FakeOllamaServer(url.hostname, url.port, first_token_ms, token_ms) as ollama:
+        api._swap_runtime(build_runtime(rebuild=True, index_root=os.path.join(workdir, "chat", "db"), data_dir=data_dir))
+
+        async def client(http, prompts, latencies, statuses):
+            for prompt in prompts:
+                start = time.perf_counter()
+                response = await http.post("/chat", json={"message": prompt, "mode": mode})
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def run_level(clients):
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+                prompts = questions(clients * requests_per_client, seed + clients)
+                latencies, statuses = [], {}
+                start = time.perf_counter()
+                await asyncio.gather(*(
+                    client(http, prompts[i::clients], latencies, statuses) for i in range(clients)
+                ))
+                elapsed = time.perf_counter() - start
+            return dict(summarize(latencies), clients=clients, requests=len(prompts),
+                        requests_per_s=len(prompts) / elapsed, status_codes=statuses)
+
+        async def run_levels():
+            # one event loop for every level: the async clients of the runtime are bound to the loop they first ran in
+            return [await run_level(clients) for clients in clients_levels]
+
+        fallbacks_before = CHAT_FALLBACKS.value()
+        runs = asyncio.run(run_levels())
+        llm_requests = ollama.requests
+        fallbacks = CHAT_FALLBACKS.value() - fallbacks_before
+        if mode == "direct" and fallbacks:
+            # answered by the agent, the latencies would not be the ones of the direct mode
+            raise RuntimeError(f"{fallbacks:g} direct /chat answers fell back to the agent")
+
+    return {
+        "mode": mode,
+        "first_token_ms": first_token_ms,
+        "token_ms": token_ms,
+        "llm_requests": llm_requests,
+        "limiter": api._chat_limiter.stats(),
+        "runs": runs,
+    }
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(",") if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help="comma separated benchmarks to run")
+    parser.add_argument("--rows", type=int, default=5000, help="agency rows of the synthetic ingestion corpus")
+    parser.add_argument("--sizes", type=_int_list, default=[1000, 5000, 20000], help="retrieval and vector store corpus sizes")
+    parser.add_argument("--queries", type=int, default=200, help="retrieval queries per corpus size")
+    parser.add_argument("--parser-repeat", type=int, default=200)
+    parser.add_argument("--clients", type=_int_list, default=[1, 4, 16], help="concurrent /chat clients")
+    parser.add_argument("--requests", type=int, default=10, help="/chat requests per client")
+    parser.add_argument("--chat-rows", type=int, default=2000, help="agency rows of the /chat corpus")
+    parser.add_argument("--mode", choices=["direct", "agent"], default="direct")
+    parser.add_argument("--first-token-ms", type=float, default=50)
+    parser.add_argument("--token-ms", type=float, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file instead of stdout")
+    args = parser.parse_args()
+
+    selected = [name for name in args.only.split(",") if name]
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "embedding_backend": EMBEDDING_BACKEND,
+            "args": {key: value for key, value in vars(args).items() if key != "output"},
+        },
+    }
+    with tempfile.TemporaryDirectory(prefix="tsaraia-bench-") as workdir, contextlib.redirect_stdout(sys.stderr):
+        # the pipeline prints progress: keep stdout for the results
+        if "ingestion" in selected:
+            results["ingestion"] = bench_ingestion(workdir, args.rows, args.seed)
+        if "retrieval" in selected:
+            results["retrieval"] = bench_retrieval(workdir, args.sizes, args.queries, args.seed)
+        if "vectorstore" in selected:
+            results["vectorstore"] = bench_vectorstore(workdir, args.sizes, args.queries, args.seed)
+        if "parser" in selected:
+            results["parser"] = bench_parser(args.parser_repeat)
+        if "chat" in selected:
+            results["chat"] = bench_chat(workdir, args.chat_rows, args.clients, args.requests, args.mode,
+                                         args.first_token_ms, args.token_ms, args.seed)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Results written to {args.output}")
+    else:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+Builds the vector index offline so the API and the Streamlit app can start from it
+without parsing the data folder.
+
+Usage (from the repository root):
+    python -m backend.build_index
+"""
+import logging
+from backend.src.index import build_index, index_info, prune_versions
+
+logging.basicConfig(level=logging.INFO)
+
+
+def print_progress(every: float = 2.0):
+    """Progress callback printing the ingestion rates at most every `every` seconds."""
+    last = [0.0]
+
+    def callback(state):
+        if state["elapsed"] - last[0] < every and state["files"] < state["total_files"]:
+            return
+        last[0] = state["elapsed"]
+        print(f"{state['files']}/{state['total_files']} files, {state['rows']} rows, {state['chunks']} chunks "
+              f"({state['rows_per_s']:.0f} rows/s, {state['chunks_per_s']:.0f} chunks/s)")
+    return callback
+
+
+if __name__ == "__main__":
+    _, stats = build_index(progress=print_progress())
+    prune_versions()
+    print(f"Index version {stats['version']} built: {stats['added']} added, {stats['skipped']} skipped, {stats['deleted']} deleted")
+    print(index_info())
@@ -1,35 +1,103 @@
 from dotenv import load_dotenv
 from langchain.agents import create_tool_calling_agent, AgentExecutor
-from src.prompt import prompt,parser
-from src.rag import create_rag_chain, load_documents, split_documents, create_vectorstore
+from src.prompt import promptResponse,parser
+from src.rag import create_answer_chain, create_rag_chain
+from src.index import load_index, load_router
+from src.batch import answer_many, batch_inputs
+from src.config import BATCH_CONCURRENCY
+from src.models import ResearchResponse
+from src.sources import SourceCollector, fill_sources
+from src.sessions import create_session_store
+import argparse
+import asyncio
+import json
 import os
+import sys
+import uuid
 from sentence_transformers import SentenceTransformer
 
 load_dotenv()
 
-def main(query:str):
-    docs = load_documents()
-    chunks = split_documents(docs)
-    db = create_vectorstore(chunks)
+sessions = create_session_store()
+
+def main(query:str, session_id=None):
+    db, _ = load_index()
     tool,llm = create_rag_chain(db)
     
-    agent = create_tool_calling_agent(llm,tools=[],prompt=prompt)
+    agent = create_tool_calling_agent(llm,tools=[tool],prompt=promptResponse)
     agent_executor = AgentExecutor(agent=agent, tools=[tool], verbose=True)
-    raw_response = agent_executor.invoke({"query": query, "chat_history": []})
+    history = sessions.history(session_id) if session_id else []
+    sources = SourceCollector()
+    raw_response = agent_executor.invoke({"input": query, "chat_history": history}, config={"callbacks": [sources]})
     print(raw_response)
     try:
-        structured_response = parser.parse(raw_response.get("output",""))
+        structured_response = _with_sources(parser.parse(raw_response.get("output","")), sources.documents, sources.tools)
+        if session_id:
+            sessions.add_turn(session_id, query, structured_response.summary)
         return structured_response
     except Exception as e:
         print("$"*100)
         print(f"Error parsing response: {e}")
 
+def _with_sources(response, documents, tools=()):
+    """Les sources et les tools viennent des documents récupérés, pas du texte généré"""
+    return ResearchResponse(**fill_sources(response.model_dump(), documents, tools))
+
+def run_batch(questions, out, concurrency=BATCH_CONCURRENCY):
+    """
+    Répond à une liste de questions comme /chat/batch : une seule passe d'embedding,
+    les recherches groupées, puis `concurrency` générations à la fois.
+    Écrit une ligne JSON par question dès qu'elle est prête (index, question, response ou error).
+    """
+    db, _ = load_index()
+    _, llm = create_rag_chain(db)
+    chain = create_answer_chain(llm)
+    inputs = batch_inputs(db, questions, load_router())
+
+    async def run():
+        failed = 0
+        async for index, raw_response, error in answer_many(chain, inputs, concurrency):
+            record = {"index": index, "question": questions[index]}
+            try:
+                if error is not None:
+                    raise error
+                response = parser.parse(raw_response.get("output", ""))
+                record["response"] = _with_sources(response, inputs[index]["documents"]).model_dump()
+            except Exception as e:
+                record["error"] = str(e)
+                failed += 1
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+        return failed
+    return asyncio.run(run())
+
  
 if __name__ == "__main__":
+   arg_parser = argparse.ArgumentParser(description="Tsara.IA en ligne de commande : conversation, ou un batch de questions avec --batch")
+   arg_parser.add_argument("--batch", help="fichier de questions, une par ligne (- pour l'entrée standard)")
+   arg_parser.add_argument("--output", help="fichier NDJSON des réponses du batch (sortie standard par défaut)")
+   arg_parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="générations en parallèle")
+   args = arg_parser.parse_args()
+   if args.batch:
+       if args.batch == "-":
+           questions = [line.strip() for line in sys.stdin if line.strip()]
+       else:
+           with open(args.batch, encoding="utf-8") as source:
+               questions = [line.strip() for line in source if line.strip()]
+       if args.output:
+           with open(args.output, "w", encoding="utf-8") as out:
+               failed = run_batch(questions, out, args.concurrency)
+       else:
+           failed = run_batch(questions, sys.stdout, args.concurrency)
+       print(f"{len(questions) - failed}/{len(questions)} questions answered", file=sys.stderr)
+       sys.exit(1 if failed else 0)
+
+   # une conversation par lancement : les questions suivantes voient l'historique
+   session_id = uuid.uuid4().hex
    while True:
        user_input = input("Quelle question avez vous ? (tapez (q, quiet, exit) pour quitter) ")
        if user_input.lower() in ["quit","q","exit"]:
            break
        
-       response = main(user_input)
+       response = main(user_input, session_id)
        print("La réponse d'Agent : ", response)
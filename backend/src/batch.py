@@ -0,0 +1,101 @@
+import asyncio
+import contextlib
+import json
+from typing import Any, AsyncContextManager, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+from langchain_core.documents import Document
+from .config import RETRIEVAL_K, ROUTED_K, ROUTING_ENABLED
+from .metrics import RETRIEVAL_ROUTES, timed
+from .rag import get_context_budgeter
+from .embeddings import embed_queries
+from .routing import QueryRouter, relevance_score_fn, route_label, search_with_scores, top_up
+from .vectorstore import MmapVectorStore
+
+
+def search_by_vectors(db, vectors: Sequence[List[float]], k: int,
+                      filter: Optional[Dict[str, Any]] = None) -> List[List[Document]]:
+    """
+    The `k` nearest chunks of every vector, scored like `search_with_scores`: in one
+    matrix product with the mmap store, one search per vector with Chroma (its
+    LangChain API has no batched search).
+    """
+    if not isinstance(db, MmapVectorStore):
+        return [search_with_scores(db, vector, k, filter) for vector in vectors]
+    if not vectors:
+        return []
+    relevance = relevance_score_fn(db)
+    found = db.similarity_search_with_score_by_vectors(vectors, k, filter=filter)
+    for pairs in found:
+        for doc, score in pairs:
+            doc.metadata["score"] = relevance(score)
+    return [[doc for doc, _ in pairs] for pairs in found]
+
+
+def retrieve_many(db, questions: Sequence[str], router: Optional[QueryRouter] = None) -> List[List[Document]]:
+    """
+    Retrieves the chunks of many questions as the retriever of `get_retriever` does
+    for one (routing, fallback, context budget), with one embedding pass for all
+    the questions and one vector search per metadata filter they route to.
+    """
+    with timed("batch_embed"):
+        vectors = embed_queries(db.embeddings, list(questions))
+    filters = [router.route(question) if router is not None and ROUTING_ENABLED else None for question in questions]
+    groups: Dict[str, List[int]] = {}
+    for i, filter in enumerate(filters):
+        groups.setdefault(json.dumps(filter, sort_keys=True), []).append(i)
+
+    results: List[List[Document]] = [[] for _ in questions]
+    short = []
+    with timed("batch_search"):
+        for indexes in groups.values():
+            filter = filters[indexes[0]]
+            found = search_by_vectors(db, [vectors[i] for i in indexes], RETRIEVAL_K if filter is None else ROUTED_K, filter)
+            for i, docs in zip(indexes, found):
+                results[i] = docs
+                if filter is not None and len(docs) < ROUTED_K:
+                    short.append(i)
+                else:
+                    RETRIEVAL_ROUTES.inc(route=route_label(filter))
+        ## the filter left too few chunks: the best chunks of the whole collection fill the gap
+        for i, docs in zip(short, search_by_vectors(db, [vectors[i] for i in short], RETRIEVAL_K)):
+            RETRIEVAL_ROUTES.inc(route="fallback")
+            results[i] = top_up(results[i], docs, ROUTED_K)
+
+    budgeter = get_context_budgeter()
+    if budgeter is not None:
+        results = [list(budgeter.compress_documents(docs, question)) for docs, question in zip(results, questions)]
+    return results
+
+
+def batch_inputs(db, questions: Sequence[str], router: Optional[QueryRouter] = None) -> List[Dict[str, Any]]:
+    """Inputs of the answer chain (`create_answer_chain`) for every question, retrieved documents included."""
+    return [
+        {"input": question, "chat_history": [], "documents": docs}
+        for question, docs in zip(questions, retrieve_many(db, questions, router))
+    ]
+
+
+async def answer_many(chain, inputs: Sequence[Dict[str, Any]], concurrency: int,
+                      config: Optional[Dict[str, Any]] = None,
+                      slot: Optional[Callable[[], AsyncContextManager]] = None) -> AsyncIterator[Tuple[int, Any, Optional[Exception]]]:
+    """
+    Runs `chain` on every input, `concurrency` at a time, and yields (index, output, error)
+    as they complete; a failed input does not stop the others. Each generation also
+    holds a `slot()` when given (the LLM capacity shared with the other requests).
+    Closing the iterator cancels the generations still running.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(i):
+        async with semaphore, (slot() if slot is not None else contextlib.nullcontext()):
+            try:
+                return i, await chain.ainvoke(inputs[i], config=config), None
+            except Exception as e:
+                return i, None, e
+
+    tasks = [asyncio.create_task(run(i)) for i in range(len(inputs))]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
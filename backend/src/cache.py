@@ -0,0 +1,123 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+
+def normalize_question(question: str) -> str:
+    """Lowercases and collapses the whitespace of a question."""
+    return re.sub(r"\s+", " ", question).strip().lower()
+
+
+class SemanticCache:
+    """
+    Answer cache keyed by the meaning of the question.
+    A question is embedded with the retrieval embeddings and the stored answer
+    of the most similar past question is returned when the cosine similarity
+    is above the threshold. Entries expire after `ttl` seconds, the least
+    recently used ones are evicted beyond `max_entries`, and the whole cache is
+    dropped when the index version changes. Answers produced differently for the
+    same question (the chat modes) are kept apart with a `namespace`.
+    """
+
+    def __init__(self, threshold: float, ttl: float, max_entries: int):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.embeddings = None
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._matrix = None
+        self._keys: List[Tuple[str, str]] = []
+        self._namespaces = None
+        self._lock = threading.Lock()
+
+    def reset(self, embeddings, version=None) -> None:
+        """Drops every entry; called at startup and after each reload of the index."""
+        with self._lock:
+            self.embeddings = embeddings
+            self.version = version
+            self._entries.clear()
+            self._matrix = None
+
+    def lookup(self, question: str, namespace: str = "") -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]:
+        """
+        Looks for the answer of a similar question, among the answers stored in the same namespace.
+
+        Returns:
+            (response, vector): the cached response (None on a miss) and the
+                                question vector to give back to `store`
+        """
+        text = normalize_question(question)
+        key = (namespace, text)
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["response"], entry["vector"]
+
+        vector = self._embed(text)
+        with self._lock:
+            if self._entries:
+                if self._matrix is None:
+                    self._keys = list(self._entries)
+                    self._matrix = np.stack([self._entries[k]["vector"] for k in self._keys])
+                    self._namespaces = np.array([k[0] for k in self._keys])
+                scores = np.where(self._namespaces == namespace, self._matrix @ vector, -np.inf)
+                best = int(np.argmax(scores))
+                best_key = self._keys[best]
+                if scores[best] >= self.threshold and best_key in self._entries:
+                    self._entries.move_to_end(best_key)
+                    self.hits += 1
+                    return self._entries[best_key]["response"], vector
+            self.misses += 1
+            return None, vector
+
+    def store(self, question: str, response: Dict[str, Any], vector: Optional[np.ndarray] = None, version=None,
+              namespace: str = "") -> None:
+        """Stores an answer; answers computed on another index version than the current one are dropped."""
+        if version is not None and version != self.version:
+            return
+        text = normalize_question(question)
+        key = (namespace, text)
+        if vector is None:
+            vector = self._embed(text)
+        with self._lock:
+            self._entries[key] = {"response": response, "vector": vector, "created_at": time.monotonic()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "version": self.version,
+        }
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if now - entry["created_at"] > self.ttl]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self.evictions += len(expired)
+            self._matrix = None
@@ -0,0 +1,107 @@
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+## serving settings, every value can be overridden from the environment or the .env file
+
+## maximum number of chat requests running the agent / LLM at the same time
+MAX_CONCURRENT_CHATS = int(os.getenv("TSARAIA_MAX_CONCURRENT_CHATS", "2"))
+## maximum number of chat requests waiting for a slot, beyond that requests are rejected with 503
+MAX_CHAT_QUEUE = int(os.getenv("TSARAIA_MAX_CHAT_QUEUE", "8"))
+## maximum time (seconds) a request waits in the queue before being rejected
+CHAT_QUEUE_TIMEOUT = float(os.getenv("TSARAIA_CHAT_QUEUE_TIMEOUT", "30"))
+## value of the Retry-After header sent with rejected requests (seconds)
+CHAT_RETRY_AFTER = int(os.getenv("TSARAIA_CHAT_RETRY_AFTER", "5"))
+
+## maximum time (seconds) a chat request may take, queue included, before its LLM generation is cancelled (0: none)
+CHAT_DEADLINE = float(os.getenv("TSARAIA_CHAT_DEADLINE", "120"))
+## request header asking for a shorter deadline (seconds) for one request
+DEADLINE_HEADER = os.getenv("TSARAIA_DEADLINE_HEADER", "X-Request-Timeout")
+
+## semantic answer cache: answers of questions whose embedding is close enough to a past question are reused
+CACHE_ENABLED = os.getenv("TSARAIA_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+## minimum cosine similarity between two questions to reuse an answer
+CACHE_THRESHOLD = float(os.getenv("TSARAIA_CACHE_THRESHOLD", "0.92"))
+## time (seconds) an answer stays in the cache
+CACHE_TTL = float(os.getenv("TSARAIA_CACHE_TTL", "3600"))
+## maximum number of cached answers, the least recently used ones are evicted first
+CACHE_MAX_ENTRIES = int(os.getenv("TSARAIA_CACHE_MAX_ENTRIES", "1000"))
+
+## conversation sessions: "memory" (this process only) or "sqlite" (a local file shared by the workers)
+SESSION_BACKEND = os.getenv("TSARAIA_SESSION_STORE", "memory")
+## file of the sqlite session store
+SESSION_DB_PATH = os.getenv("TSARAIA_SESSION_DB_PATH", "./backend/cache/sessions.sqlite3")
+## maximum number of sessions kept, the least recently used ones are evicted first
+SESSION_MAX = int(os.getenv("TSARAIA_SESSION_MAX", "1000"))
+## time (seconds) a session is kept without any new message
+SESSION_TTL = float(os.getenv("TSARAIA_SESSION_TTL", "86400"))
+## (estimated) tokens of history given to the LLM: the recent turns verbatim and a summary of the older ones
+HISTORY_MAX_TOKENS = int(os.getenv("TSARAIA_HISTORY_MAX_TOKENS", "600"))
+
+## identical questions arriving while the same question is being answered share its execution
+COALESCE_ENABLED = os.getenv("TSARAIA_COALESCE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+## /chat/batch: generations running at the same time for one batch, and the largest batch accepted
+BATCH_CONCURRENCY = int(os.getenv("TSARAIA_BATCH_CONCURRENCY", "2"))
+BATCH_MAX_QUESTIONS = int(os.getenv("TSARAIA_BATCH_MAX_QUESTIONS", "1000"))
+
+## url of the Ollama server serving the chat model
+OLLAMA_BASE_URL = os.getenv("TSARAIA_OLLAMA_BASE_URL", "http://localhost:11434")
+
+## default answering mode: "direct" retrieves and answers in one LLM call,
+## "agent" goes through the tool calling agent (two LLM calls or more)
+CHAT_MODE = os.getenv("TSARAIA_CHAT_MODE", "direct")
+
+## number of processes parsing the source files during ingestion (1 parses them in the calling process)
+INGEST_WORKERS = int(os.getenv("TSARAIA_INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+## embedding backend: "huggingface" (the local MiniLM model), "onnx" (the same model run by ONNX Runtime,
+## faster on CPU) or "hashing", deterministic hashed bag of words vectors that need no model, used by the offline benchmarks
+EMBEDDING_BACKEND = os.getenv("TSARAIA_EMBEDDING_BACKEND", "huggingface")
+## with the "onnx" backend, run the int8 quantized model (smaller and faster, vectors slightly different)
+EMBED_ONNX_INT8 = os.getenv("TSARAIA_EMBED_ONNX_INT8", "false").lower() in ("1", "true", "yes")
+## threads used by ONNX Runtime for one forward pass (0 lets it decide)
+EMBED_ONNX_THREADS = int(os.getenv("TSARAIA_EMBED_ONNX_THREADS", "0"))
+
+## vector store of the index: "chroma" or "mmap", the in-process flat index over memory-mapped files
+## (see vectorstore.py) whose pages are shared by every worker process serving the same index
+VECTORSTORE_BACKEND = os.getenv("TSARAIA_VECTORSTORE", "chroma")
+
+## chunks retrieved per question
+RETRIEVAL_K = int(os.getenv("TSARAIA_RETRIEVAL_K", "5"))
+## metadata routing: a question about one kind of source (recipes, agencies...) or one city only searches those chunks
+ROUTING_ENABLED = os.getenv("TSARAIA_ROUTING", "true").lower() in ("1", "true", "yes")
+## chunks retrieved when the router chose a filter, fewer are needed among the more relevant candidates
+ROUTED_K = int(os.getenv("TSARAIA_ROUTED_K", "3"))
+
+## context budget: the retrieved chunks are deduplicated, their overlaps and repeated lines removed,
+## and the context cut to this many (estimated) tokens before the prompt is sent to the LLM
+CONTEXT_BUDGET_ENABLED = os.getenv("TSARAIA_CONTEXT_BUDGET", "true").lower() in ("1", "true", "yes")
+CONTEXT_MAX_TOKENS = int(os.getenv("TSARAIA_CONTEXT_MAX_TOKENS", "1024"))
+## share of the word trigrams of a chunk found in a more relevant chunk above which it is dropped as a near duplicate
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("TSARAIA_CONTEXT_DUPLICATE_THRESHOLD", "0.8"))
+
+## near duplicate chunks (same record exported by several providers...) are stored once, at ingestion
+DEDUP_ENABLED = os.getenv("TSARAIA_DEDUP", "true").lower() in ("1", "true", "yes")
+## estimated Jaccard similarity of the word trigrams of two chunks above which they are duplicates
+DEDUP_THRESHOLD = float(os.getenv("TSARAIA_DEDUP_THRESHOLD", "0.8"))
+
+## micro-batching of query embeddings: queries arriving within the window are embedded in one forward pass
+EMBED_BATCHING = os.getenv("TSARAIA_EMBED_BATCHING", "true").lower() in ("1", "true", "yes")
+## maximum number of queries embedded together
+EMBED_BATCH_MAX_SIZE = int(os.getenv("TSARAIA_EMBED_BATCH_MAX_SIZE", "32"))
+## time (milliseconds) the first query of a batch waits for others
+EMBED_BATCH_WINDOW_MS = float(os.getenv("TSARAIA_EMBED_BATCH_WINDOW_MS", "5"))
+
+## answer contact lookups ("téléphone de l'agence X") from the structured entity index, without the LLM
+ENTITY_LOOKUP_ENABLED = os.getenv("TSARAIA_ENTITY_LOOKUP", "true").lower() in ("1", "true", "yes")
+
+## request header turning on per request tracing: the stage timings are sent back in a Server-Timing header
+TRACE_HEADER = os.getenv("TSARAIA_TRACE_HEADER", "X-Tsaraia-Trace")
+
+## persistent cache of the chunk embeddings, keyed by embedding model and text: a rebuild only embeds new texts
+EMBED_CACHE_ENABLED = os.getenv("TSARAIA_EMBED_CACHE", "true").lower() in ("1", "true", "yes")
+## folder of the cache, one sub folder per embedding model
+EMBED_CACHE_PATH = os.getenv("TSARAIA_EMBED_CACHE_PATH", "./backend/cache/embeddings")
+## storage type of the cached vectors: "float16" halves the size, "float32" keeps the exact vectors
+EMBED_CACHE_DTYPE = os.getenv("TSARAIA_EMBED_CACHE_DTYPE", "float16")
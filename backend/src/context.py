@@ -0,0 +1,99 @@
+import logging
+import re
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+from .metrics import CONTEXT_TOKENS
+
+## average characters per token of the chat model on our (mostly French) data, used to estimate prompt sizes
+CHARS_PER_TOKEN = 4
+## separator the chains put between two chunks
+SEPARATOR = "\n\n"
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _shingles(text: str, size: int = 3) -> Set[Tuple[str, ...]]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _overlap(before: str, after: str, min_chars: int) -> int:
+    """Length of the longest end of `before` that starts `after` (the chunk overlap of the splitter)."""
+    for size in range(min(len(before), len(after)), min_chars - 1, -1):
+        if before.endswith(after[:size]):
+            return size
+    return 0
+
+
+class ContextBudgeter(BaseDocumentCompressor):
+    """
+    Assembles the retrieved chunks into the context the LLM prefills, most relevant first:
+      - drops chunks whose word shingles are mostly contained in a chunk already kept
+      - cuts the text a chunk shares with a kept chunk of the same file (splitter overlap)
+      - drops the lines a kept chunk of the same csv row already has (the columns
+        repeated at the top of every piece of a long row)
+      - stops at `max_tokens`, the last chunk being cut on a line boundary
+    The tokens retrieved, sent and saved are recorded for every request.
+    """
+
+    max_tokens: int = 1024
+    duplicate_threshold: float = 0.8
+    min_overlap_chars: int = 20
+    min_tail_tokens: int = 32
+
+    def compress_documents(self, documents: Sequence[Document], query: str,
+                           callbacks: Optional[Callbacks] = None) -> Sequence[Document]:
+        retrieved = estimate_tokens(SEPARATOR.join(doc.page_content for doc in documents))
+        kept: List[Tuple[Document, str, Set[Tuple[str, ...]]]] = []
+        row_lines: Dict[Tuple[str, object], Set[str]] = {}
+        used = 0
+        for doc in documents:
+            text = doc.page_content.strip()
+            shingles = _shingles(text)
+            if any(shingles and len(shingles & other) >= self.duplicate_threshold * len(shingles)
+                   for _, _, other in kept):
+                continue
+
+            source = doc.metadata.get("source")
+            for other, other_text, _ in kept:
+                if other.metadata.get("source") != source:
+                    continue
+                text = text[_overlap(other_text, text, self.min_overlap_chars):]
+                cut = _overlap(text, other_text, self.min_overlap_chars)
+                if cut:
+                    text = text[:-cut]
+            if "row" in doc.metadata:
+                seen = row_lines.setdefault((source, doc.metadata["row"]), set())
+                lines = [line for line in text.split("\n") if line.strip() not in seen]
+                seen.update(line.strip() for line in lines if line.strip())
+                text = "\n".join(lines)
+            text = text.strip()
+            if not text:
+                continue
+
+            separator = SEPARATOR if kept else ""
+            cost = estimate_tokens(separator + text)
+            if used + cost > self.max_tokens:
+                remaining = self.max_tokens - used
+                if remaining >= self.min_tail_tokens:
+                    tail = text[:remaining * CHARS_PER_TOKEN - len(separator)]
+                    tail = tail[:tail.rfind("\n")] if "\n" in tail else tail
+                    if tail.strip():
+                        kept.append((doc, tail.strip(), shingles))
+                break
+            kept.append((doc, text, shingles))
+            used += cost
+
+        compressed = [Document(page_content=text, metadata=doc.metadata, id=doc.id) for doc, text, _ in kept]
+        sent = estimate_tokens(SEPARATOR.join(doc.page_content for doc in compressed))
+        CONTEXT_TOKENS.observe(retrieved, kind="retrieved")
+        CONTEXT_TOKENS.observe(sent, kind="sent")
+        CONTEXT_TOKENS.observe(retrieved - sent, kind="saved")
+        logging.info(f"Context: {len(compressed)}/{len(documents)} chunks, ~{sent} tokens sent, "
+                     f"~{retrieved - sent} saved")
+        return compressed
@@ -0,0 +1,108 @@
+import hashlib
+import re
+from typing import Dict, List, Optional
+import numpy as np
+from .entities import normalize
+
+## 2^61 - 1, the modulus of the permutation hashes
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64(0xFFFFFFFF)
+
+
+def dedup_text(doc) -> str:
+    """
+    Text compared between chunks: only the values of csv rows, so the same record
+    exported by two providers with different column names still matches.
+    """
+    if not doc.metadata.get("source", "").endswith(".csv"):
+        return doc.page_content
+    return "\n".join(line.partition(": ")[2] or line for line in doc.page_content.splitlines())
+
+
+def duplicate_ref(doc) -> str:
+    """Where a duplicate chunk comes from: its file, and its row for csv files."""
+    source = doc.metadata.get("source", "")
+    row = doc.metadata.get("row")
+    return source if row is None else f"{source}#{row}"
+
+
+def canonical_rank(doc, chunk_id: str) -> tuple:
+    """
+    Order of the chunks of a near-duplicate group, the smallest one is canonical: by file,
+    row and chunk id, so the choice does not depend on the order the files were read in.
+    """
+    row = doc.metadata.get("row")
+    return doc.metadata.get("source", ""), row if isinstance(row, int) else -1, chunk_id
+
+
+class NearDuplicateIndex:
+    """
+    MinHash / LSH index of the chunks seen so far during an ingestion.
+    Each chunk gets a signature of `num_perm` min hashes over its word trigrams; the
+    signature is cut into `bands` bands and chunks sharing a band are candidates,
+    kept as duplicates when their estimated Jaccard similarity reaches `threshold`.
+    With 64 hashes in 8 bands, pairs above ~0.8 are found with high probability.
+    Only the signatures of canonical chunks are kept (256 bytes each).
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 8, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(bands)]
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        ## punctuation dropped: "Rabat." and "Rabat" are the same word
+        words = re.findall(r"[a-z0-9]+", normalize(text))
+        if not words:
+            return None
+        shingles = {" ".join(words[i:i + 3]) for i in range(max(len(words) - 2, 1))}
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+             for shingle in shingles),
+            dtype=np.uint64, count=len(shingles),
+        )
+        # (a * h + b) mod p for every permutation (rows) and shingle (columns), wrapping like any 64 bit hash
+        permuted = ((np.outer(self._a, hashes) + self._b[:, None]) % MERSENNE_PRIME) & MAX_HASH
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def check(self, key: str, text: str) -> Optional[str]:
+        """
+        Returns the key of the canonical chunk `text` duplicates, or None after
+        registering `text` as a new canonical chunk under `key`.
+        """
+        signature = self.signature(text)
+        if signature is None:
+            return None
+        bands = [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+        candidates = []
+        for buckets, band in zip(self._buckets, bands):
+            for candidate in buckets.get(band, ()):
+                if candidate not in candidates:
+                    candidates.append(candidate)
+        for candidate in candidates:
+            if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                return candidate
+
+        self._signatures[key] = signature
+        for buckets, band in zip(self._buckets, bands):
+            buckets.setdefault(band, []).append(key)
+        return None
+
+    def replace(self, old: str, new: str) -> None:
+        """Registers the canonical chunk `old` under the key `new`, which now stands for its group."""
+        signature = self._signatures.pop(old)
+        self._signatures[new] = signature
+        for buckets, band in zip(self._buckets, (signature[band * self.rows:(band + 1) * self.rows].tobytes()
+                                                 for band in range(self.bands))):
+            keys = buckets[band]
+            keys[keys.index(old)] = new
@@ -0,0 +1,268 @@
+import fcntl
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from .metrics import timed
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Wraps an embedding model so that queries arriving at the same time are
+    embedded together. Each `embed_query` call waits in a queue; a worker
+    thread takes the first waiting query, collects the ones arriving within
+    `window_ms` (up to `max_batch_size`) and runs one batched forward pass.
+    `embed_documents` is already batched and goes straight to the model.
+    """
+
+    def __init__(self, inner: Embeddings, max_batch_size: int = 32, window_ms: float = 5.0):
+        self.inner = inner
+        self.max_batch_size = max_batch_size
+        self.window = window_ms / 1000.0
+        self.batches = 0
+        self.queries = 0
+        self.max_seen_batch = 0
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        future: Future = Future()
+        self._ensure_worker()
+        with timed("embed_query"):
+            self._queue.put((text, future))
+            return future.result()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queries": self.queries,
+            "batches": self.batches,
+            "avg_batch_size": self.queries / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_seen_batch,
+            "queued": self._queue.qsize(),
+        }
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                vectors = self.inner.embed_documents(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+            self.batches += 1
+            self.queries += len(batch)
+            self.max_seen_batch = max(self.max_seen_batch, len(batch))
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic embeddings that need no model: the words and the word bigrams
+    of a text are hashed into a fixed size vector, which is then L2 normalized.
+    Texts sharing words get close vectors, which is enough to exercise the
+    retrieval path in benchmarks without downloading or running MiniLM.
+    """
+
+    def __init__(self, size: int = 384):
+        self.size = size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def _embed(self, text: str) -> List[float]:
+        words = re.findall(r"\w+", text.lower())
+        vector = np.zeros(self.size, dtype=np.float32)
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.size] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+
+def normalize_text(text: str) -> str:
+    """Text normalization applied before hashing, so whitespace only changes still hit the cache."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+class EmbeddingCache:
+    """
+    Content addressed, on disk store of embedding vectors of one model.
+    Vectors are appended to a raw float16/float32 file read through a memory map,
+    and the sha256 of each normalized text is appended to a key file at the same
+    row. Both files are append only: several processes can share the cache,
+    writes are serialized with a file lock and each process picks up the rows
+    written by the others on its next miss.
+    """
+
+    def __init__(self, root: str, model_id: str, dtype: str = "float16"):
+        self.model_id = model_id
+        self.dtype = np.dtype(dtype)
+        self.path = os.path.join(root, hashlib.sha256(model_id.encode("utf-8")).hexdigest()[:16])
+        os.makedirs(self.path, exist_ok=True)
+        self._vectors_file = os.path.join(self.path, f"vectors.{self.dtype.name}")
+        self._keys_file = os.path.join(self.path, "keys.txt")
+        self._lock_file = os.path.join(self.path, "lock")
+        self.dim: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self._rows: Dict[str, int] = {}
+        self._keys_offset = 0
+        self._key_count = 0
+        self._matrix = None
+        self._lock = threading.Lock()
+
+        if not os.path.exists(os.path.join(self.path, "meta.json")):
+            self._write_meta()
+        self._refresh()
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        """Returns the stored vector of every key, None for the missing ones."""
+        with self._lock:
+            if any(key not in self._rows for key in keys):
+                self._refresh()
+            vectors = []
+            for key in keys:
+                row = self._rows.get(key)
+                vectors.append(None if row is None else np.asarray(self._matrix[row], dtype=np.float32))
+            found = sum(vector is not None for vector in vectors)
+            self.hits += found
+            self.misses += len(keys) - found
+            return vectors
+
+    def put_many(self, keys: List[str], vectors: List[List[float]]) -> None:
+        if not keys:
+            return
+        array = np.asarray(vectors, dtype=self.dtype)
+        with self._lock, open(self._lock_file, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                if self.dim is None:
+                    self.dim = array.shape[1]
+                    self._write_meta()
+                new = [(key, vector) for key, vector in zip(keys, array) if key not in self._rows]
+                new = list({key: vector for key, vector in new}.items())
+                if not new:
+                    return
+                # vectors first: a key is only visible once its vector is on disk
+                with open(self._vectors_file, "ab") as f:
+                    f.write(np.stack([vector for _, vector in new]).tobytes())
+                with open(self._keys_file, "a", encoding="ascii") as f:
+                    f.write("".join(f"{key}\n" for key, _ in new))
+                self._refresh()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._rows),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes": os.path.getsize(self._vectors_file) if os.path.exists(self._vectors_file) else 0,
+            "dtype": self.dtype.name,
+        }
+
+    def _write_meta(self) -> None:
+        with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_id, "dim": self.dim, "dtype": self.dtype.name}, f)
+
+    def _refresh(self) -> None:
+        """Reads the keys appended since the last call and maps the vectors file again."""
+        if self.dim is None:
+            # another process may have written the first vectors
+            with open(os.path.join(self.path, "meta.json"), "r", encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+        if self.dim is None or not os.path.exists(self._keys_file):
+            return
+        with open(self._keys_file, "r", encoding="ascii") as f:
+            f.seek(self._keys_offset)
+            data = f.read()
+        rows = os.path.getsize(self._vectors_file) // (self.dim * self.dtype.itemsize)
+        # a key line still being written by another process is read next time
+        for line in data.splitlines(keepends=True):
+            if not line.endswith("\n") or self._key_count >= rows:
+                break
+            self._rows.setdefault(line.strip(), self._key_count)
+            self._key_count += 1
+            self._keys_offset += len(line)
+        if rows:
+            self._matrix = np.memmap(self._vectors_file, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model with an `EmbeddingCache`: `embed_documents` only
+    computes the texts never seen with this model, so rebuilding the index after
+    a chunking or config change re-embeds the changed chunks only.
+    Queries are not cached, they go straight to the model.
+    """
+
+    def __init__(self, inner: Embeddings, cache: EmbeddingCache):
+        self.inner = inner
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self.cache.key(text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            computed = self.inner.embed_documents([texts[i] for i in missing])
+            self.cache.put_many([keys[i] for i in missing], computed)
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+        return [vector.tolist() if isinstance(vector, np.ndarray) else list(vector) for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.inner.embed_query(text)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """Embeds many queries in one batched pass, without writing them to the chunk cache."""
+    while isinstance(embeddings, CachedEmbeddings):
+        embeddings = embeddings.inner
+    return embeddings.embed_documents(texts)
@@ -0,0 +1,282 @@
+import bisect
+import json
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+from .models import EntityContact
+
+ENTITIES_FILE = "entities.json"
+
+## csv column names (normalized) mapped to the EntityContact fields
+COLUMN_ALIASES = {
+    "name": ("name", "nom", "raison sociale", "denomination", "nom de l agence", "nom agence", "agence",
+             "nom de l etablissement", "etablissement", "nom du guide", "guide", "hotel", "restaurant", "titre"),
+    "address": ("address", "adresse", "adresse postale", "localisation"),
+    "phone": ("phone", "telephone", "tel", "fixe", "gsm", "mobile", "portable", "numero de telephone", "contact"),
+    "email": ("email", "e mail", "mail", "courriel", "adresse email", "adresse mail"),
+    "website": ("website", "site", "site web", "site internet", "url", "web"),
+    "city": ("city", "ville", "localite", "commune", "province", "region", "delegation"),
+    "type": ("type", "categorie", "category", "activite", "classement"),
+}
+
+## entity type guessed from the name of the source file
+SOURCE_TYPES = (
+    ("agence", "agency"), ("agency", "agency"), ("voyage", "agency"),
+    ("hotel", "hotel"), ("hebergement", "hotel"), ("riad", "hotel"),
+    ("restaurant", "restaurant"), ("guide", "guide"),
+    ("recette", "recipe"), ("recipe", "recipe"), ("cuisine", "recipe"),
+)
+
+## words of a question (normalized) pointing at one kind of source
+KIND_KEYWORDS = {
+    "agency": {"agence", "agences", "voyage", "voyages", "circuit", "circuits", "excursion", "excursions",
+               "sejour", "sejours", "tour", "tours", "agency", "agencies", "trip", "trips"},
+    "hotel": {"hotel", "hotels", "riad", "riads", "hebergement", "hebergements", "dormir", "chambre",
+              "chambres", "auberge", "auberges"},
+    "restaurant": {"restaurant", "restaurants", "manger", "diner", "dejeuner"},
+    "guide": {"guide", "guides", "accompagnateur", "accompagnateurs"},
+    "recipe": {"recette", "recettes", "recipe", "recipes", "plat", "plats", "cuisine", "cuisiner", "tajine",
+               "tagine", "couscous", "pastilla", "harira", "ingredient", "ingredients", "preparer", "preparation"},
+}
+
+## words of a question that ask for contact details, French, English and both
+LOOKUP_WORDS_FR = {"telephone", "tel", "numero", "courriel", "adresse", "contacter", "coordonnees", "site", "joindre"}
+LOOKUP_WORDS_EN = {"phone", "number", "address", "website"}
+LOOKUP_WORDS = LOOKUP_WORDS_FR | LOOKUP_WORDS_EN | {"email", "mail", "contact"}
+## other words removed from a question before matching entity names
+STOP_WORDS_FR = {
+    "de", "du", "des", "la", "le", "les", "l", "d", "a", "au", "aux", "en", "et", "est", "quel", "quelle",
+    "quels", "quelles", "donne", "donnez", "moi", "svp", "stp", "pour", "un", "une",
+}
+STOP_WORDS_EN = {"the", "of", "for", "what", "is", "give", "me", "please"}
+STOP_WORDS = LOOKUP_WORDS | STOP_WORDS_FR | STOP_WORDS_EN | {"web", "internet"}
+
+
+def normalize(text: str) -> str:
+    """Lowercases, removes accents and punctuation, collapses whitespace."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char)).lower()
+    return re.sub(r"\s+", " ", re.sub(r"[^a-z0-9@.]+", " ", text)).strip()
+
+
+def is_english(question: str) -> bool:
+    """Whether a question is rather English than French, from its lookup and stop words."""
+    words = set(normalize(question).split())
+    return len(words & (LOOKUP_WORDS_EN | STOP_WORDS_EN)) > len(words & (LOOKUP_WORDS_FR | STOP_WORDS_FR))
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def source_type(source: str) -> Optional[str]:
+    name = normalize(os.path.basename(source))
+    for keyword, entity_type in SOURCE_TYPES:
+        if keyword in name:
+            return entity_type
+    return None
+
+
+def _parse_row(text: str) -> Dict[str, str]:
+    """Reads the "column: value" lines produced by CSVLoader."""
+    row = {}
+    for line in text.splitlines():
+        column, sep, value = line.partition(":")
+        if sep and value.strip():
+            row[normalize(column)] = value.strip()
+    return row
+
+
+def _map_columns(row: Dict[str, str]) -> Dict[str, str]:
+    fields = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if row.get(alias):
+                fields[field] = row[alias]
+                break
+    return fields
+
+
+class EntityIndex:
+    """
+    In-memory index of the contact records of the CSV sources.
+    Built at ingestion time from the rows loaded by CSVLoader, it answers
+    exact, prefix and fuzzy (trigram) name lookups, filtered by city and type,
+    without going through the vector DB or the LLM.
+    """
+
+    def __init__(self, records: Optional[List[Dict[str, Any]]] = None):
+        self.records: List[Dict[str, Any]] = []
+        self._by_name: Dict[str, List[int]] = defaultdict(list)
+        self._sorted_names: Optional[List[str]] = []
+        self._by_trigram: Dict[str, List[int]] = defaultdict(list)
+        self._trigram_counts: List[int] = []
+        self.cities: set = set()
+        for record in records or []:
+            self._add(record)
+        self._sorted_names = sorted(self._by_name)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @classmethod
+    def from_documents(cls, docs) -> "EntityIndex":
+        """Builds the index from the row documents of the CSV sources (before splitting)."""
+        index = cls()
+        index.add_documents(docs)
+        return index
+
+    def add_documents(self, docs) -> None:
+        """Adds the records of a batch of row documents, so the index can be built while streaming."""
+        for doc in docs:
+            source = doc.metadata.get("source", "")
+            if not source.endswith(".csv"):
+                continue
+            fields = _map_columns(_parse_row(doc.page_content))
+            if not fields.get("name") or not any(fields.get(key) for key in ("phone", "email", "address", "website")):
+                continue
+            self._add({
+                "contact": {
+                    "name": fields["name"],
+                    "address": fields.get("address"),
+                    "phone": fields.get("phone"),
+                    "email": fields.get("email"),
+                    "website": fields.get("website"),
+                    "type": fields.get("type") or source_type(source),
+                },
+                "city": fields.get("city"),
+                "kind": source_type(source),
+                "source": source,
+                "row": doc.metadata.get("row"),
+            })
+        # sorted again on the next prefix search only, not after every batch
+        self._sorted_names = None
+
+    @classmethod
+    def load(cls, index_path: str) -> "EntityIndex":
+        path = os.path.join(index_path, ENTITIES_FILE)
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def save(self, index_path: str) -> None:
+        with open(os.path.join(index_path, ENTITIES_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.records, f, ensure_ascii=False)
+
+    def search(self, name: str, city: Optional[str] = None, entity_type: Optional[str] = None,
+               mode: str = "fuzzy", limit: int = 5, min_score: float = 0.6) -> List[Dict[str, Any]]:
+        """
+        Finds records by name.
+
+        Args:
+            name (str): Name (or part of the name) of the entity
+            city (Optional[str]): Keep only the records of this city
+            entity_type (Optional[str]): Keep only the records of this type (agency, hotel...)
+            mode (str): "exact", "prefix" or "fuzzy" (exact and prefix matches come first)
+            limit (int): Maximum number of records returned
+            min_score (float): Minimum trigram similarity of the fuzzy matches
+
+        Returns:
+            List[Dict[str, Any]]: Matching records, best first
+        """
+        key = normalize(name)
+        if not key:
+            return []
+        ids = list(self._by_name.get(key, []))
+        if self._sorted_names is None:
+            self._sorted_names = sorted(self._by_name)
+        if mode in ("prefix", "fuzzy"):
+            position = bisect.bisect_left(self._sorted_names, key)
+            while position < len(self._sorted_names) and self._sorted_names[position].startswith(key):
+                ids.extend(i for i in self._by_name[self._sorted_names[position]] if i not in ids)
+                position += 1
+        if mode == "fuzzy":
+            scores = self._similar(key)
+            ids.extend(i for i, score in scores if score >= min_score and i not in ids)
+        return [record for record in (self.records[i] for i in ids) if self._keep(record, city, entity_type)][:limit]
+
+    def match_question(self, question: str, limit: int = 5, min_score: float = 0.8) -> List[Dict[str, Any]]:
+        """
+        Answers lookup style questions ("téléphone de l'agence X à Rabat").
+        Returns the records whose name is found word for word in the question, of the kind
+        the question names if any. Without a kind, the question must be made of the name only
+        ("numéro de X"). Returns an empty list otherwise, so that the LLM answers.
+        """
+        text = normalize(question)
+        normalized = text
+        if not LOOKUP_WORDS.intersection(normalized.split()):
+            return []
+        city = next((city for city in self.cities if f" {city} " in f" {normalized} "), None)
+        if city:
+            normalized = f" {normalized} ".replace(f" {city} ", " ")
+        words = set(normalized.split())
+        query = " ".join(word for word in normalized.split() if word not in STOP_WORDS)
+        if not query:
+            return []
+        kinds = [kind for kind, keywords in KIND_KEYWORDS.items() if words & keywords]
+        matches = []
+        # every record sharing a trigram is a candidate: a short name scores low on similarity with a long question
+        for i, count in self._shared_trigrams(query).items():
+            # share of the name found in the question
+            containment = count / self._trigram_counts[i]
+            if containment < min_score:
+                continue
+            record = self.records[i]
+            name = normalize(record["contact"]["name"])
+            # whole words only: "atlas" matches "l'atlas", not trigrams spread over "la tlas"
+            if f" {name} " not in f" {text} ":
+                continue
+            if kinds:
+                if not any(self._keep(record, city, kind) for kind in kinds):
+                    continue
+            elif set(query.split()) - set(name.split()):
+                # no kind named: other words than the name make it a question for the LLM
+                continue
+            matches.append((containment, self._trigram_counts[i], record))
+        matches.sort(key=lambda match: (match[0], match[1]), reverse=True)
+        return [record for _, _, record in matches[:limit]]
+
+    def _add(self, record: Dict[str, Any]) -> None:
+        index = len(self.records)
+        self.records.append(record)
+        name = normalize(record["contact"]["name"])
+        self._by_name[name].append(index)
+        trigrams = _trigrams(name)
+        self._trigram_counts.append(len(trigrams))
+        for trigram in trigrams:
+            self._by_trigram[trigram].append(index)
+        if record.get("city"):
+            self.cities.add(normalize(record["city"]))
+
+    def _shared_trigrams(self, key: str) -> Dict[int, int]:
+        """Number of trigrams of the key in the name of every record sharing at least one."""
+        shared: Dict[int, int] = defaultdict(int)
+        for trigram in _trigrams(key):
+            for i in self._by_trigram.get(trigram, ()):
+                shared[i] += 1
+        return shared
+
+    def _similar(self, key: str, top: int = 20) -> List[tuple]:
+        """Dice similarity on trigrams, computed only for records sharing a trigram with the key."""
+        key_size = len(_trigrams(key))
+        scores = []
+        for i, count in self._shared_trigrams(key).items():
+            scores.append((i, 2 * count / (key_size + self._trigram_counts[i])))
+        scores.sort(key=lambda item: item[1], reverse=True)
+        return scores[:top]
+
+    @staticmethod
+    def _keep(record: Dict[str, Any], city: Optional[str], entity_type: Optional[str]) -> bool:
+        if city and normalize(record.get("city") or "") != normalize(city):
+            return False
+        if entity_type and entity_type != record.get("kind") and normalize(entity_type) not in normalize(record["contact"].get("type") or ""):
+            return False
+        return True
+
+
+def to_contacts(records: List[Dict[str, Any]]) -> List[EntityContact]:
+    return [EntityContact(**record["contact"]) for record in records]
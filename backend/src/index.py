@@ -0,0 +1,201 @@
+import os
+import shutil
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from .manifest import hash_file, load_manifest, save_manifest
+from .entities import EntityIndex
+from .routing import QueryRouter
+from .config import DEDUP_ENABLED, DEDUP_THRESHOLD, VECTORSTORE_BACKEND
+from .metrics import timed
+from .rag import (
+    CHUNK_OVERLAP, CHUNK_SIZE, DATA_DIR, DB_PATH,
+    embedding_model_id, ingest_directory, list_source_files, open_vectorstore,
+)
+
+## bump when the layout of a built index changes, older indexes are then rebuilt from scratch
+## 3: csv rows are stored as one compact record each, with their columns as metadata
+## 4: chunks are tagged with the kind of their source and their city
+INDEX_FORMAT = 4
+## number of built versions kept on disk (the current one included)
+INDEX_KEEP_VERSIONS = 2
+CURRENT_FILE = "CURRENT"
+
+
+def index_config() -> Dict[str, Any]:
+    """Settings an index was built with; a change in any of them makes the index stale."""
+    return {
+        "format": INDEX_FORMAT,
+        "embedding_model": embedding_model_id(),
+        "vectorstore": VECTORSTORE_BACKEND,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        ## which chunks are stored depends on the near-duplicate detection
+        "dedup": DEDUP_ENABLED,
+        "dedup_threshold": DEDUP_THRESHOLD if DEDUP_ENABLED else None,
+    }
+
+
+def current_index_path(index_root: str = DB_PATH) -> Optional[str]:
+    """Returns the directory of the version pointed by CURRENT, or None if nothing was built yet."""
+    current_file = os.path.join(index_root, CURRENT_FILE)
+    if not os.path.exists(current_file):
+        return None
+    with open(current_file, "r", encoding="utf-8") as f:
+        version_dir = f.read().strip()
+    index_path = os.path.join(index_root, version_dir)
+    return index_path if os.path.isdir(index_path) else None
+
+
+def is_index_fresh(index_path: Optional[str], data_dir: str = DATA_DIR) -> bool:
+    """
+    Checks a built index against the data folder without parsing any file.
+    Files are compared on size and mtime, and only hashed when their mtime moved.
+    """
+    if index_path is None:
+        return False
+    manifest = load_manifest(index_path)
+    if manifest is None or manifest.get("config") != index_config():
+        return False
+
+    files = manifest.get("files", {})
+    sources = list_source_files(data_dir)
+    if set(sources) != set(files):
+        return False
+    for file_path in sources:
+        entry = files[file_path]
+        stat = os.stat(file_path)
+        if stat.st_size != entry.get("size"):
+            return False
+        if stat.st_mtime != entry.get("mtime") and hash_file(file_path) != entry.get("hash"):
+            return False
+    return True
+
+
+def build_index(index_root: str = DB_PATH, data_dir: str = DATA_DIR,
+                progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Builds a new version of the index next to the current one and switches CURRENT to it.
+    The new version starts as a copy of the current one so only changed chunks are embedded.
+    The older versions stay on disk until `prune_versions`, a runtime may still be serving them.
+    The source files are streamed in batches (see `ingest_directory`), `progress` receives the rates.
+
+    Returns:
+        (db, stats): the new vector store and the ingestion report, with the built version
+    """
+    os.makedirs(index_root, exist_ok=True)
+    versions = _list_versions(index_root)
+    version = (versions[-1] + 1) if versions else 1
+    index_path = os.path.join(index_root, _version_dir(version))
+
+    previous_path = current_index_path(index_root)
+    previous = load_manifest(previous_path) if previous_path else None
+    previous_config = previous.get("config", {}) if previous is not None else {}
+    if (previous_config.get("embedding_model") == embedding_model_id()
+            and previous_config.get("vectorstore", "chroma") == VECTORSTORE_BACKEND):
+        shutil.copytree(previous_path, index_path)
+    else:
+        os.makedirs(index_path)
+
+    entities = EntityIndex()
+    with timed("ingest"):
+        db, stats = ingest_directory(data_dir, index_path, on_documents=entities.add_documents, progress=progress)
+    documents = stats.pop("documents")
+    chunk_stats = stats.pop("chunks_by_type")
+    tags = stats.pop("tags")
+    entities.save(index_path)
+
+    manifest = load_manifest(index_path)
+    manifest["version"] = version
+    manifest["config"] = index_config()
+    manifest["documents"] = documents
+    manifest["chunks_by_type"] = chunk_stats
+    manifest["tags"] = tags
+    manifest["entities"] = len(entities)
+    save_manifest(index_path, manifest)
+
+    _set_current(index_root, _version_dir(version))
+    logging.info(f"Index version {version} built: {stats}")
+    return db, dict(stats, version=version)
+
+
+def load_index(index_root: str = DB_PATH, data_dir: str = DATA_DIR) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Opens the current index when it is fresh, without loading or splitting any document.
+    Falls back to a build when the index is missing or older than the data folder.
+    """
+    index_path = current_index_path(index_root)
+    if is_index_fresh(index_path, data_dir):
+        manifest = load_manifest(index_path)
+        logging.info(f"Opening prebuilt index version {manifest['version']}")
+        return open_vectorstore(index_path), {"added": 0, "skipped": 0, "deleted": 0, "version": manifest["version"]}
+    return build_index(index_root, data_dir)
+
+
+def load_entity_index(index_root: str = DB_PATH) -> EntityIndex:
+    """Loads the contact records of the current index (empty if nothing was built yet)."""
+    index_path = current_index_path(index_root)
+    return EntityIndex.load(index_path) if index_path else EntityIndex()
+
+
+def load_router(index_root: str = DB_PATH) -> QueryRouter:
+    """Builds the query router from the kinds and cities of the current index."""
+    index_path = current_index_path(index_root)
+    manifest = load_manifest(index_path) if index_path else None
+    return QueryRouter(manifest.get("tags") if manifest else None)
+
+
+def index_info(index_root: str = DB_PATH) -> Optional[Dict[str, Any]]:
+    """Returns the version and the document / chunk counts of the current index."""
+    index_path = current_index_path(index_root)
+    manifest = load_manifest(index_path) if index_path else None
+    if manifest is None:
+        return None
+    return {
+        "version": manifest.get("version"),
+        "files": len(manifest.get("files", {})),
+        "documents": manifest.get("documents", 0),
+        "entities": manifest.get("entities", 0),
+        ## a canonical chunk is listed under every file it has a duplicate in
+        "chunks": len({chunk_id for entry in manifest.get("files", {}).values() for chunk_id in entry["chunks"]}),
+        "chunks_by_type": manifest.get("chunks_by_type", {}),
+        "duplicates": sum(len(refs) for refs in manifest.get("duplicates", {}).values()),
+    }
+
+
+def _version_dir(version: int) -> str:
+    return f"v{version:04d}"
+
+
+def _list_versions(index_root: str) -> list:
+    versions = []
+    for name in os.listdir(index_root):
+        if name.startswith("v") and name[1:].isdigit() and os.path.isdir(os.path.join(index_root, name)):
+            versions.append(int(name[1:]))
+    return sorted(versions)
+
+
+def _set_current(index_root: str, version_dir: str) -> None:
+    current_file = os.path.join(index_root, CURRENT_FILE)
+    tmp_file = current_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(version_dir)
+    os.replace(tmp_file, current_file)
+
+
+def prune_versions(index_root: str = DB_PATH, in_use: Iterable[str] = ()) -> List[int]:
+    """
+    Deletes the versions older than the last INDEX_KEEP_VERSIONS ones, except the
+    current one and the directories in `in_use` (still opened by a runtime serving requests).
+
+    Returns:
+        the deleted versions
+    """
+    keep = {os.path.abspath(path) for path in [*in_use, current_index_path(index_root)] if path}
+    deleted = []
+    for version in _list_versions(index_root)[:-INDEX_KEEP_VERSIONS]:
+        version_path = os.path.join(index_root, _version_dir(version))
+        if os.path.abspath(version_path) in keep:
+            continue
+        shutil.rmtree(version_path, ignore_errors=True)
+        deleted.append(version)
+    return deleted
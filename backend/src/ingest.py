@@ -0,0 +1,148 @@
+import logging
+import multiprocessing
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import chardet
+from langchain_community.document_loaders import CSVLoader, Docx2txtLoader
+
+## queue shared with the parent, set in each worker process by `_init_worker`
+_worker_queue = None
+
+
+##  every file has a different encoding that is why i detect the encoding first
+def detect_encoding(file_path):
+    with open(file_path, 'rb') as f:
+        raw_data = f.read(10000)
+    result = chardet.detect(raw_data)
+    return result["encoding"]
+
+
+def iter_file(file_path: str):
+    """Yields the documents of one source file one by one (one per row for CSV files)."""
+    if file_path.endswith(".csv"):
+        loader = CSVLoader(file_path, encoding=detect_encoding(file_path))
+    elif file_path.endswith(".doc"):
+        loader = Docx2txtLoader(file_path)
+    else:
+        return
+    yield from loader.lazy_load()
+
+
+def iter_file_batches(file_path: str, batch_size: int):
+    batch = []
+    for doc in iter_file(file_path):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _init_worker(shared_queue) -> None:
+    global _worker_queue
+    _worker_queue = shared_queue
+
+
+def _load_file(file_path: str, batch_size: int) -> None:
+    """Worker task: streams the batches of a file to the parent, then an end marker (None or the error)."""
+    try:
+        for batch in iter_file_batches(file_path, batch_size):
+            _worker_queue.put((file_path, batch))
+    except Exception as e:
+        _worker_queue.put((file_path, e))
+        return
+    _worker_queue.put((file_path, None))
+
+
+class IngestProgress:
+    """Counts files, rows and chunks of an ingestion and reports their rates to a callback."""
+
+    def __init__(self, files: int, callback: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.files = files
+        self.callback = callback
+        self.files_done = 0
+        self.rows = 0
+        self.chunks = 0
+        self.started_at = time.perf_counter()
+
+    def add(self, rows: int = 0, chunks: int = 0, files: int = 0) -> None:
+        self.rows += rows
+        self.chunks += chunks
+        self.files_done += files
+        if self.callback is not None:
+            self.callback(self.snapshot())
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = max(time.perf_counter() - self.started_at, 1e-9)
+        return {
+            "files": self.files_done,
+            "total_files": self.files,
+            "rows": self.rows,
+            "chunks": self.chunks,
+            "elapsed": elapsed,
+            "files_per_s": self.files_done / elapsed,
+            "rows_per_s": self.rows / elapsed,
+            "chunks_per_s": self.chunks / elapsed,
+        }
+
+
+def iter_document_batches(files: List[str], batch_size: int, workers: int = 1,
+                          progress: Optional[IngestProgress] = None) -> Iterator[list]:
+    """
+    Yields the documents of the source files in batches of at most `batch_size`.
+    With several workers the files are parsed in a process pool; the workers
+    hand their batches over a bounded queue, so at most a few batches per
+    worker are in memory at any time, whatever the size of the corpus.
+    Batches of different files are interleaved, the batches of a file keep their order.
+    """
+    if workers <= 1 or len(files) <= 1:
+        for file_path in files:
+            for batch in iter_file_batches(file_path, batch_size):
+                if progress is not None:
+                    progress.add(rows=len(batch))
+                yield batch
+            if progress is not None:
+                progress.add(files=1)
+        return
+
+    # spawn: the parent may run threads (embedding batcher, API event loop) that fork would copy mid-state
+    context = multiprocessing.get_context("spawn")
+    shared_queue = context.Queue(maxsize=2 * workers)
+    with ProcessPoolExecutor(max_workers=min(workers, len(files)), mp_context=context,
+                             initializer=_init_worker, initargs=(shared_queue,)) as pool:
+        futures = [pool.submit(_load_file, file_path, batch_size) for file_path in files]
+        pending = len(files)
+        try:
+            while pending:
+                try:
+                    file_path, item = shared_queue.get(timeout=1)
+                except queue.Empty:
+                    # a worker killed without reaching its end marker would leave us waiting forever
+                    for future in futures:
+                        if future.done() and future.exception() is not None:
+                            raise future.exception()
+                    continue
+                if isinstance(item, Exception):
+                    logging.error(f"Error loading {file_path}: {str(item)}")
+                    raise item
+                if item is None:
+                    pending -= 1
+                    if progress is not None:
+                        progress.add(files=1)
+                    continue
+                if progress is not None:
+                    progress.add(rows=len(item))
+                yield item
+        finally:
+            if pending:
+                # stopped early: cancel the queued files and unblock the workers stuck on the full queue
+                for future in futures:
+                    future.cancel()
+                while not all(future.done() for future in futures):
+                    try:
+                        shared_queue.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Any, List, Optional
+
+MANIFEST_NAME = "manifest.json"
+
+## metadata keys that only describe the position of a chunk in its file;
+## they are left out of the chunk hash so inserting a row does not invalidate every following chunk
+POSITIONAL_KEYS = ("row", "start_index")
+
+
+def hash_file(file_path: str) -> str:
+    """Returns the sha256 of a source file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_chunk(doc) -> str:
+    """Returns the sha256 of a chunk: its source, its text and its non positional metadata."""
+    metadata = {k: v for k, v in doc.metadata.items() if k not in POSITIONAL_KEYS}
+    digest = hashlib.sha256()
+    digest.update(json.dumps(metadata, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(doc.page_content.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def chunk_ids(docs, seen: Optional[Dict[str, int]] = None) -> List[str]:
+    """
+    Computes a stable id for every chunk.
+    Identical chunks of the same file (duplicated rows...) get an occurrence suffix
+    so every id stays unique inside the collection. When chunks come in batches,
+    pass the same `seen` dict to every call so the suffixes continue across batches.
+    """
+    ids = []
+    seen = {} if seen is None else seen
+    for doc in docs:
+        chunk_hash = hash_chunk(doc)
+        occurrence = seen.get(chunk_hash, 0)
+        seen[chunk_hash] = occurrence + 1
+        ids.append(chunk_hash if occurrence == 0 else f"{chunk_hash}-{occurrence}")
+    return ids
+
+
+def describe_file(file_path: str) -> Dict[str, Any]:
+    """Returns the manifest entry of a source file (without its chunks)."""
+    stat = os.stat(file_path)
+    return {
+        "hash": hash_file(file_path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+    }
+
+
+def load_manifest(db_path: str) -> Dict[str, Any]:
+    """Loads the ingestion manifest stored next to the vector DB, or None if there is none."""
+    manifest_path = os.path.join(db_path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(db_path: str, manifest: Dict[str, Any]) -> None:
+    """Writes the manifest atomically so a crash never leaves a half written file."""
+    manifest["updated_at"] = time.time()
+    manifest_path = os.path.join(db_path, MANIFEST_NAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
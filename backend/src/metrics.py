@@ -0,0 +1,272 @@
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.callbacks import BaseCallbackHandler
+
+## latency buckets (seconds) shared by every stage histogram
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+TOKEN_BUCKETS = (0, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+## stages recorded during the current request when tracing is on (see `start_trace`)
+_trace: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar("tsaraia_trace", default=None)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+        pairs.append(f'{name}="{value}"')
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            series = self._values.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._values.items()):
+            labels = _format_labels(self.labels, key)
+            for bound, count in zip(self.buckets, series["counts"]):
+                bucket_labels = _format_labels(self.labels, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            bucket_labels = _format_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {series['count']}")
+            lines.append(f"{self.name}_sum{labels} {series['sum']}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class Gauge:
+    """Gauge read from a callable at scrape time (queue depth, cache size...)."""
+
+    def __init__(self, name: str, documentation: str, read):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            lines.append(f"{self.name} {float(self.read())}")
+        except Exception:
+            pass
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Renders every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "tsaraia_stage_seconds", "Latency of each stage of ingestion and of the chat pipeline", ("stage",)))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "tsaraia_llm_tokens_total", "Tokens sent to (in) and generated by (out) the LLM", ("direction", "stage")))
+TOOL_CALLS = REGISTRY.register(Counter(
+    "tsaraia_tool_calls_total", "Tool calls made by the agent", ("tool",)))
+PARSE_FAILURES = REGISTRY.register(Counter(
+    "tsaraia_parse_failures_total", "Answers the ResearchResponseParser could not read as JSON"))
+CHAT_FALLBACKS = REGISTRY.register(Counter(
+    "tsaraia_chat_fallbacks_total", "Direct mode answers that could not be parsed and were answered again by the agent"))
+CHAT_REQUESTS = REGISTRY.register(Counter(
+    "tsaraia_chat_requests_total", "Chat requests by endpoint and by the way they were answered", ("endpoint", "outcome")))
+CONTEXT_TOKENS = REGISTRY.register(Histogram(
+    "tsaraia_context_tokens", "Estimated tokens of the retrieved chunks, of the context sent to the LLM and saved, per request",
+    ("kind",), buckets=TOKEN_BUCKETS))
+CHAT_CANCELLED = REGISTRY.register(Counter(
+    "tsaraia_chat_cancelled_total", "Chat requests given up before their answer, by reason (deadline, disconnect)",
+    ("endpoint", "reason")))
+RETRIEVAL_ROUTES = REGISTRY.register(Counter(
+    "tsaraia_retrieval_routes_total", "Retrievals by metadata filter chosen by the router (none, kind, city...), or reused from a recent identical query", ("route",)))
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage: str):
+    """Records the duration of the enclosed block as `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def timed_function(stage: str):
+    """Decorator version of `timed`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_trace() -> contextvars.Token:
+    """Starts collecting the stages of the current request (see `server_timing`)."""
+    return _trace.set([])
+
+
+def end_trace(token: contextvars.Token) -> List[Tuple[str, float]]:
+    trace = _trace.get() or []
+    _trace.reset(token)
+    return trace
+
+
+def server_timing(trace: List[Tuple[str, float]]) -> str:
+    """Formats a trace as a Server-Timing header value (durations in ms)."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in trace)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback recording the stages of one chain / agent run:
+    retrieval, tool runs and LLM generations, with their token counts.
+    Generations are labelled `llm_tool_call` (the agent choosing a tool),
+    `llm_in_tool` (RetrievalQA inside the RAG tool) or `llm_answer` (the answer).
+    """
+
+    # run in the caller's context so the per request trace sees the stages
+    run_inline = True
+
+    def __init__(self):
+        self._starts: Dict[Any, float] = {}
+        self._parents: Dict[Any, Any] = {}
+        self._tools: Dict[Any, str] = {}
+        self._retrievers = set()
+
+    def _start(self, run_id, parent_run_id) -> None:
+        self._starts[run_id] = time.perf_counter()
+        self._parents[run_id] = parent_run_id
+
+    def _elapsed(self, run_id) -> Optional[float]:
+        start = self._starts.pop(run_id, None)
+        return None if start is None else time.perf_counter() - start
+
+    def _in_tool(self, run_id) -> bool:
+        parent = self._parents.get(run_id)
+        while parent is not None:
+            if parent in self._tools:
+                return True
+            parent = self._parents.get(parent)
+        return False
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs) -> None:
+        self._start(run_id, parent_run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs) -> None:
+        self._start(run_id, parent_run_id)
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        elapsed = self._elapsed(run_id)
+        tool_call = False
+        tokens_in = tokens_out = 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if message is None:
+                    continue
+                tool_call = tool_call or bool(getattr(message, "tool_calls", None))
+                usage = getattr(message, "usage_metadata", None) or {}
+                tokens_in += usage.get("input_tokens", 0)
+                tokens_out += usage.get("output_tokens", 0)
+        stage = "llm_in_tool" if self._in_tool(run_id) else ("llm_tool_call" if tool_call else "llm_answer")
+        if elapsed is not None:
+            observe_stage(stage, elapsed)
+        if tokens_in:
+            LLM_TOKENS.inc(tokens_in, direction="in", stage=stage)
+        if tokens_out:
+            LLM_TOKENS.inc(tokens_out, direction="out", stage=stage)
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._starts.pop(run_id, None)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs) -> None:
+        self._start(run_id, parent_run_id)
+        self._retrievers.add(run_id)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs) -> None:
+        elapsed = self._elapsed(run_id)
+        ## a retriever wrapped by another one (the routed retriever under the context budget)
+        ## is part of the outer retrieval, timing it too would count the stage twice
+        if elapsed is not None and self._parents.get(run_id) not in self._retrievers:
+            observe_stage("retrieval", elapsed)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs) -> None:
+        self._starts.pop(run_id, None)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs) -> None:
+        self._start(run_id, parent_run_id)
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._tools[run_id] = name
+        TOOL_CALLS.inc(tool=name)
+
+    def on_tool_end(self, output, *, run_id, **kwargs) -> None:
+        elapsed = self._elapsed(run_id)
+        if elapsed is not None:
+            observe_stage(f"tool:{self._tools.get(run_id, 'unknown')}", elapsed)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs) -> None:
+        self._parents[run_id] = parent_run_id
@@ -10,10 +10,22 @@ class EntityContact(BaseModel):
     website: Optional[str] = Field(None, description="The website URL of the entity")
     type: Optional[str] = Field(None, description="The type of entity, e.g., agency, hotel, restaurant, attraction")
     
+class SourceDocument(BaseModel):
+    file: str = Field(..., description="The data file the retrieved chunk comes from")
+    row: Optional[int] = Field(None, description="The row of the chunk in a csv file")
+    score: Optional[float] = Field(None, description="The relevance of the chunk to the query, higher is closer")
+
 class ResearchResponse(BaseModel):
     topic: str =Field(..., description="The main topic of the user's query")
     summary: str = Field(..., description="A concise summary of the answer to the user's query") 
-    sources: list[str] = Field(..., description="List of sources or documents referenced to generate the summary")
-    tools_used  : list[str] = Field(..., description="List of tools used to generate the response, if any")
+    sources: list[str] = Field([], description="List of sources or documents referenced to generate the summary")
+    tools_used  : list[str] = Field([], description="List of tools used to generate the response, if any")
+    entities: List[EntityContact] = Field([], description="List of entities with their contact information extracted from the documents")
+    source_documents: List[SourceDocument] = Field([], description="The retrieved chunks given to the model, most relevant first")
+
+# the part of the response the model generates: sources and tools are filled from the retrieval
+class GeneratedAnswer(BaseModel):
+    topic: str =Field(..., description="The main topic of the user's query")
+    summary: str = Field(..., description="A concise summary of the answer to the user's query") 
     entities: List[EntityContact] = Field([], description="List of entities with their contact information extracted from the documents")
     
@@ -0,0 +1,121 @@
+import logging
+import os
+from typing import List, Optional
+import numpy as np
+import onnxruntime as ort
+from langchain_core.embeddings import Embeddings
+from tokenizers import Tokenizer
+
+## where the exported models are stored, inside the sentence-transformers model folder (same layout as the hub repos)
+ONNX_DIR = "onnx"
+ONNX_MODEL = "model.onnx"
+ONNX_INT8_MODEL = "model_int8.onnx"
+
+
+def export_onnx(model_dir: str, output_path: str) -> None:
+    """Exports the transformer of a sentence-transformers model to ONNX (needs torch and transformers)."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    logging.info(f"Exporting {model_dir} to ONNX")
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    model = AutoModel.from_pretrained(model_dir).eval()
+    sample = tokenizer(["exporting the model"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            output_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    if not os.path.exists(os.path.join(model_dir, "tokenizer.json")):
+        tokenizer.save_pretrained(model_dir)
+
+
+def quantize_onnx(model_path: str, output_path: str) -> None:
+    """Dynamic int8 quantization of the weights (activations stay float, computed on the fly)."""
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError as e:
+        raise ImportError("int8 quantization needs the onnx package: pip install onnx") from e
+    logging.info(f"Quantizing {model_path} to int8")
+    quantize_dynamic(model_path, output_path, weight_type=QuantType.QInt8)
+
+
+def onnx_model_path(model_dir: str, quantize: bool = False) -> str:
+    """Returns the ONNX model of `model_dir`, exporting and quantizing it the first time."""
+    model_path = os.path.join(model_dir, ONNX_DIR, ONNX_MODEL)
+    if not os.path.exists(model_path):
+        export_onnx(model_dir, model_path)
+    if not quantize:
+        return model_path
+    int8_path = os.path.join(model_dir, ONNX_DIR, ONNX_INT8_MODEL)
+    if not os.path.exists(int8_path):
+        quantize_onnx(model_path, int8_path)
+    return int8_path
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence-transformers embeddings computed with ONNX Runtime on CPU.
+    Runs the same MiniLM model as HuggingFaceEmbeddings (mean pooling then L2
+    normalization), without torch at query time, and optionally with int8 weights.
+    Texts are sorted by length before batching so batches carry little padding.
+    """
+
+    def __init__(self, model_dir: str, quantize: bool = False, batch_size: int = 32,
+                 max_length: int = 256, threads: Optional[int] = None):
+        self.model_dir = model_dir
+        self.quantize = quantize
+        self.batch_size = batch_size
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(onnx_model_path(model_dir, quantize), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        pad_token = "[PAD]"
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id(pad_token) or 0, pad_token=pad_token)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            embedded = self._embed([texts[i] for i in batch])
+            if vectors.shape[1] == 0:
+                vectors = np.empty((len(texts), embedded.shape[1]), dtype=np.float32)
+            vectors[batch] = embedded
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: value for name, value in feeds.items() if name in self.input_names})[0]
+        # mean pooling over the real tokens, then L2 normalization (the Pooling and Normalize modules of the model)
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
@@ -1,7 +1,15 @@
 import json
 import re
 import logging
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Optional, Tuple
+from .metrics import PARSE_FAILURES
+
+RESPONSE_FIELDS = {"topic", "summary", "sources", "tools_used", "entities"}
+_DECODER = json.JSONDecoder()
+_STRING_SPECIAL = re.compile(r'["\\]')
+_NON_SPACE = re.compile(r'\S')
+_SCALAR_END = re.compile(r'[\s,}\]]')
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
 
 class ResearchResponseParser:
     """
@@ -34,68 +42,69 @@ class ResearchResponseParser:
             if isinstance(text, dict):
                 return ResearchResponseParser._validate_structure(text)
             
-            # Extract JSON structure from the response
-            json_part, text_content = ResearchResponseParser._extract_both_parts(text)
+            # Extract the first JSON object of the response in a single pass
+            parsed_data, text_content = ResearchResponseParser._extract_json(text)
             
-            parsed_data = {}
-            
-            # Parse JSON component if available
-            if json_part:
-                try:
-                    parsed_data = json.loads(json_part)
-                except json.JSONDecodeError as e:
-                    logging.warning(f"JSON parsing failed: {e}")
-                    # If JSON parsing fails, use text content as summary
-                    parsed_data = {"summary": text_content or text}
-            else:
-                # No JSON found, use entire text as summary
-                parsed_data = {"summary": text}
+            if parsed_data is None:
+                # No usable JSON found, use the text content (or entire text) as summary
+                PARSE_FAILURES.inc()
+                parsed_data = {"summary": text_content or text}
             
             # Validate and ensure all required fields are present
             return ResearchResponseParser._validate_structure(parsed_data)
             
         except Exception as e:
+            PARSE_FAILURES.inc()
             logging.error(f"Comprehensive parsing error: {e}")
             return ResearchResponseParser._create_error_response(str(e))
     
     @staticmethod
-    def _extract_both_parts(text: str) -> Tuple[str, str]:
+    def _extract_json(text: str) -> Tuple[Optional[Dict[str, Any]], str]:
         """
-        Extracts JSON structure and additional text content from mixed response.
+        Extracts the first JSON object of a mixed response in a single pass.
+        Well formed objects are read by the C decoder; balanced objects that are
+        not valid JSON are skipped and a truncated object at the end of the text
+        is repaired by the scanner before being decoded.
         
         Args:
             text (str): Raw response text that may contain JSON and free text
             
         Returns:
-            Tuple[str, str]: (json_part, text_content)
-                           - json_part: Extracted JSON string or empty string
+            Tuple[Optional[Dict[str, Any]], str]: (json_data, text_content)
+                           - json_data: Decoded JSON object or None
                            - text_content: Remaining text content after JSON
         """
-        json_part = ""
-        text_content = ""
-        
         if not text:
-            return json_part, text_content
-        
-        # Pattern 1: JSON with code block backticks (```json { ... } ```)
-        json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', text, re.DOTALL)
-        if json_match:
-            json_part = json_match.group(1).strip()
-            text_content = text[json_match.end():].strip()
-            return json_part, text_content
-        
-        # Pattern 2: Simple JSON object without backticks
-        json_match = re.search(r'(\{.*\})', text, re.DOTALL)
-        if json_match:
-            json_part = json_match.group(1).strip()
-            text_content = text[json_match.end():].strip()
-            return json_part, text_content
-        
-        # Pattern 3: No JSON found, entire text is content
-        text_content = text.strip()
-        return json_part, text_content
-    
-    
+            return None, ""
+        
+        offset = text.find("{")
+        while offset >= 0:
+            # fast path: the C decoder reads a well formed object and tells where it ends
+            try:
+                data, end = _DECODER.raw_decode(text, offset)
+            except json.JSONDecodeError:
+                # slow path: find the end of the object (or repair it) with the scanner
+                scanner = JsonObjectScanner(skip=offset)
+                scanner.feed(text)
+                if scanner.start is None:
+                    break
+                end = scanner.end if scanner.complete else len(text)
+                candidate = scanner.repaired()
+                try:
+                    data = json.loads(candidate)
+                except json.JSONDecodeError:
+                    # last chance: trailing commas are a frequent LLM mistake
+                    try:
+                        data = json.loads(_TRAILING_COMMA.sub(r"\1", candidate))
+                    except json.JSONDecodeError as e:
+                        logging.warning(f"JSON parsing failed: {e}")
+                        data = None
+            # tool call artifacts are JSON too: only an object with response fields is the answer
+            if isinstance(data, dict) and RESPONSE_FIELDS.intersection(data):
+                return data, text[end:].strip()
+            offset = text.find("{", end)
+        
+        return None, text.strip()
     
     @staticmethod
     def _clean_text_content(text: str) -> str:
@@ -141,8 +150,8 @@ class ResearchResponseParser:
         # Ensure all required fields are present with proper types
         # Entities are taken as-is from the BaseModel response
         validated = {
-            "topic": str(data.get("topic", "Unknown Topic")),
-            "summary": str(data.get("summary", "No summary available")),
+            "topic": str(data.get("topic") or "Unknown Topic"),
+            "summary": str(data.get("summary") or "No summary available"),
             "sources": ResearchResponseParser._ensure_list(data.get("sources")),
             "tools_used": ResearchResponseParser._ensure_list(data.get("tools_used")),
             "entities": ResearchResponseParser._ensure_list(data.get("entities", []))  # Use entities from BaseModel
@@ -187,4 +196,335 @@ class ResearchResponseParser:
             "sources": [],
             "tools_used": [],
             "entities": []
-        }
\ No newline at end of file
+        }
+
+
+class JsonObjectScanner:
+    """
+    Single pass, brace and string aware scanner for the first top-level JSON
+    object of a text. Text can be fed in chunks as it is generated; braces and
+    quotes inside JSON strings are ignored, and a brace of the prose that does
+    not open a valid object (e.g. "{name}") is dropped at its first syntax error
+    and the search goes on from the next brace.
+    When the text stops before the object is closed, `repaired` completes it
+    (open string, dangling key or comma, partial literal, open containers).
+    """
+
+    # subclasses that need every character of the strings through the hooks set this to True
+    _tracks_strings = False
+
+    def __init__(self, skip: int = 0):
+        """
+        Args:
+            skip (int): Number of leading characters to keep without scanning them,
+                        used to look for the next object after a rejected one
+        """
+        self.end = None
+        self._skip = skip
+        self._parts = []
+        self._length = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        """Forgets the current candidate object."""
+        self.start = None
+        self._failed = False
+        # open containers, each one is [bracket, state]; object states are
+        # key / colon / value / next, array states are value / next
+        self._stack = []
+        self._in_string = False
+        self._string_is_key = False
+        self._escape = False
+        self._unicode_left = 0
+        self._scalar_start = None
+
+    @property
+    def complete(self) -> bool:
+        return self.end is not None
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    def feed(self, chunk: str) -> None:
+        """
+        Consumes a chunk of text, stops scanning once the object is closed.
+        
+        Args:
+            chunk (str): Next piece of the text
+        """
+        offset = self._length
+        self._parts.append(chunk)
+        self._length += len(chunk)
+        if not self.complete:
+            self._scan(chunk, offset, max(self._skip - offset, 0))
+
+    def _scan(self, chunk: str, offset: int, index: int) -> None:
+        """Scans `chunk` (starting at absolute position `offset`) from `index`."""
+        while index < len(chunk):
+            # jump over the characters that can not change the state:
+            # everything before the first brace and the plain content of strings
+            if not self._stack:
+                index = chunk.find("{", index)
+                if index < 0:
+                    break
+            else:
+                if self._in_string:
+                    pattern = None if self._tracks_strings or self._escape or self._unicode_left else _STRING_SPECIAL
+                else:
+                    pattern = _NON_SPACE if self._scalar_start is None else _SCALAR_END
+                if pattern is not None:
+                    match = pattern.search(chunk, index)
+                    if match is None:
+                        break
+                    index = match.start()
+            self._step(chunk[index], offset + index)
+            if self._failed:
+                # not a JSON object: look for the next one right after its opening brace
+                restart = self.start + 1
+                self._reset()
+                if restart < offset:
+                    self._scan(self.text, 0, restart)
+                    return
+                index = restart - offset
+                continue
+            index += 1
+            if self.complete:
+                break
+
+    def repaired(self) -> Optional[str]:
+        """
+        Returns the JSON object text, closed if the input was truncated.
+        
+        Returns:
+            Optional[str]: JSON text of the object, or None if no object started
+        """
+        if self.start is None:
+            return None
+        if self.complete:
+            return self.text[self.start:self.end]
+
+        text = self.text[self.start:]
+        stack = [list(container) for container in self._stack]
+        top = stack[-1]
+        if self._in_string:
+            # drop a dangling escape or a partial \uXXXX before closing the string
+            if self._escape:
+                text = text[:-1]
+            elif self._unicode_left:
+                text = text[:-(6 - self._unicode_left)]
+            text += '"'
+            top[1] = "colon" if self._string_is_key else "next"
+        elif self._scalar_start is not None:
+            scalar = self.text[self._scalar_start:]
+            text = text[:len(text) - len(scalar)] + self._complete_scalar(scalar)
+            top[1] = "next"
+
+        text = text.rstrip()
+        if top[1] == "colon":
+            text += ":null"
+        elif text.endswith(","):
+            text = text[:-1]
+        elif top[0] == "{" and top[1] == "value":
+            text += "null"
+        return text + "".join("}" if bracket == "{" else "]" for bracket, _ in reversed(stack))
+
+    @staticmethod
+    def _complete_scalar(scalar: str) -> str:
+        for literal in ("true", "false", "null"):
+            if literal.startswith(scalar):
+                return literal
+        number = scalar.rstrip(".eE+-")
+        return number if number and number != "-" else "null"
+
+    def _step(self, char: str, position: int) -> None:
+        if not self._stack:
+            if char == "{":
+                self.start = position
+                self._stack.append(["{", "key"])
+            return
+
+        if self._in_string:
+            self._on_string_char(char)
+            if self._unicode_left:
+                self._unicode_left -= 1
+            elif self._escape:
+                self._escape = False
+                if char == "u":
+                    self._unicode_left = 4
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                self._stack[-1][1] = "colon" if self._string_is_key else "next"
+                self._on_string_end()
+            return
+
+        top = self._stack[-1]
+        if self._scalar_start is not None and (char.isspace() or char in ",}]"):
+            self._scalar_start = None
+            top[1] = "next"
+        if char.isspace() or self._scalar_start is not None:
+            return
+
+        bracket, state = top
+        if char == '"':
+            if state not in ("key", "value"):
+                self._failed = True
+                return
+            self._in_string = True
+            self._string_is_key = state == "key"
+            self._on_string_start()
+        elif char in "{[":
+            if state != "value":
+                self._failed = True
+                return
+            top[1] = "next"
+            self._stack.append(["{", "key"] if char == "{" else ["[", "value"])
+        elif char in "}]":
+            closes = "}" if bracket == "{" else "]"
+            can_close = state in ("key", "next") if bracket == "{" else state in ("value", "next")
+            if char != closes or not can_close:
+                self._failed = True
+                return
+            self._stack.pop()
+            if not self._stack:
+                self.end = position + 1
+        elif char == ":":
+            if state != "colon":
+                self._failed = True
+                return
+            top[1] = "value"
+        elif char == ",":
+            if state != "next":
+                self._failed = True
+                return
+            top[1] = "key" if bracket == "{" else "value"
+        elif state == "value":
+            self._scalar_start = position
+        else:
+            self._failed = True
+
+    # hooks for subclasses that look at string contents while scanning
+    def _on_string_start(self) -> None:
+        pass
+
+    def _on_string_char(self, char: str) -> None:
+        pass
+
+    def _on_string_end(self) -> None:
+        pass
+
+
+class ResearchResponseStreamParser(JsonObjectScanner):
+    """
+    Incremental parser for a ResearchResponse JSON generated token by token.
+    Chunks of text are fed as they arrive and the decoded characters of one
+    top-level string field (the summary by default) are returned as soon as
+    they are known, without waiting for the JSON to be complete.
+    """
+
+    _tracks_strings = True
+    _ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+    def __init__(self, field: str = "summary"):
+        self.field = field
+        self._out = []
+        super().__init__()
+
+    def _reset(self) -> None:
+        super()._reset()
+        self._key = []
+        self._current_key = None
+        self._raw_escape = None
+        # a \uD8xx escape waiting for the low surrogate that completes it
+        self._high_surrogate = None
+
+    @property
+    def done(self) -> bool:
+        return self.complete
+
+    def feed(self, chunk: str) -> str:
+        """
+        Consumes a chunk of generated text.
+
+        Args:
+            chunk (str): Next piece of the model output
+
+        Returns:
+            str: Newly decoded characters of the streamed field (may be empty)
+        """
+        self._out = []
+        super().feed(chunk)
+        return "".join(self._out)
+
+    def parse(self) -> Dict[str, Any]:
+        """Parses everything fed so far into a validated response structure."""
+        return ResearchResponseParser.parse(self.text)
+
+    def _on_string_start(self) -> None:
+        if self._string_is_key:
+            self._key = []
+
+    def _on_string_char(self, char: str) -> None:
+        decoded = self._decode(char)
+        if decoded is None:
+            return
+        if self._string_is_key:
+            self._key.append(decoded)
+        elif len(self._stack) == 1 and self._current_key == self.field:
+            self._out.append(decoded)
+
+    def _on_string_end(self) -> None:
+        if self._string_is_key:
+            self._current_key = "".join(self._key)
+        self._high_surrogate = None
+
+    def _decode(self, char: str) -> Optional[str]:
+        """Decodes one raw character of a JSON string, returns None while an escape is incomplete."""
+        if self._raw_escape is not None:
+            self._raw_escape += char
+            if self._raw_escape == "u" or (self._raw_escape.startswith("u") and len(self._raw_escape) < 5):
+                return None
+            escape, self._raw_escape = self._raw_escape, None
+            if escape.startswith("u"):
+                try:
+                    return self._decode_code_unit(int(escape[1:], 16))
+                except ValueError:
+                    return ""
+            return self._unpaired() + self._ESCAPES.get(escape, escape)
+        if self._high_surrogate is not None and char != "\\":
+            return self._unpaired() + (char if char != '"' else "")
+        if char == '"':
+            # closing quote, escaped quotes are handled above
+            return None
+        if char == "\\":
+            self._raw_escape = ""
+            return None
+        return char
+
+    def _decode_code_unit(self, code: int) -> Optional[str]:
+        """
+        Characters outside the BMP come as two escapes (a UTF-16 surrogate pair, e.g.
+        \\ud83d\\ude00 for an emoji): the high one is kept until the low one arrives.
+        A lone surrogate can not be encoded to UTF-8 and becomes U+FFFD.
+        """
+        if 0xD800 <= code < 0xDC00:
+            unpaired, self._high_surrogate = self._unpaired(), code
+            return unpaired or None
+        if 0xDC00 <= code < 0xE000:
+            if self._high_surrogate is None:
+                return "\ufffd"
+            high, self._high_surrogate = self._high_surrogate, None
+            return chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00))
+        return self._unpaired() + chr(code)
+
+    def _unpaired(self) -> str:
+        """U+FFFD for a high surrogate left without its low surrogate, "" if none is pending."""
+        if self._high_surrogate is None:
+            return ""
+        self._high_surrogate = None
+        return "\ufffd"
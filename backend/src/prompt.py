@@ -1,13 +1,12 @@
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from .models import ResearchResponse
+from .models import GeneratedAnswer, ResearchResponse
 
 parser = PydanticOutputParser(pydantic_object=ResearchResponse)
+# the model only writes the topic, the summary and the entities: sources and tools come from the retrieval
+answer_parser = PydanticOutputParser(pydantic_object=GeneratedAnswer)
 
-promptResponse = ChatPromptTemplate.from_messages([
-    (
-        "system",
-        """
+SYSTEM_PROMPT = """
         You are Tsara.IA, an intelligent and friendly tourism moroccan assistant.  
         Your mission is to provide clear, accurate, and engaging information about destinations, travel tips, local culture, attractions, accommodations, transportation and historic monuments ...  
         Answer with the user's language (French, English, etc.).
@@ -35,8 +34,27 @@ promptResponse = ChatPromptTemplate.from_messages([
         Wrap your answer strictly in JSON with this format:: \n{format_instructions}
         Do not include Thought, Action, or Final Answer sections.
         """
-    ),
+
+promptResponse = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_PROMPT),
     ("placeholder","{chat_history}"),
     ("human","{input}"),
     ("placeholder","{agent_scratchpad}")
-]).partial(format_instructions=parser.get_format_instructions())
\ No newline at end of file
+]).partial(format_instructions=answer_parser.get_format_instructions())
+
+## prompt of the direct mode: the retrieved documents are given in the prompt,
+## so the answer is generated in one call without going through the agent and its tool
+promptDirect = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_PROMPT),
+    (
+        "system",
+        """
+        Answer using the following documents retrieved from the Tsara.IA database (agencies, touristic guides, moroccan recipes).
+        If they do not contain the answer, say so instead of guessing.
+
+        {context}
+        """
+    ),
+    ("placeholder","{chat_history}"),
+    ("human","{input}"),
+]).partial(format_instructions=answer_parser.get_format_instructions())
@@ -1,71 +1,371 @@
-from langchain_community.document_loaders import CSVLoader
-from langchain_community.document_loaders import Docx2txtLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
 from langchain.chains import RetrievalQA
+from langchain.retrievers import ContextualCompressionRetriever
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_ollama import ChatOllama
 from langchain_openai import ChatOpenAI
 from langchain.tools import Tool
+from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+from functools import lru_cache
+import logging
 import os
 from dotenv import load_dotenv
-import chardet
+from .ingest import IngestProgress, iter_document_batches
+from .manifest import chunk_ids, describe_file, load_manifest, save_manifest
+from .prompt import promptDirect
+from .vectorstore import MmapVectorStore
+from .routing import RoutedRetriever, add_tag_stats, condense_question, tag_chunk
+from .sources import RETRIEVAL_TOOL
+from .context import ContextBudgeter
+from .dedup import NearDuplicateIndex, canonical_rank, dedup_text, duplicate_ref
+from .embeddings import BatchingEmbeddings, CachedEmbeddings, EmbeddingCache, HashingEmbeddings
+from .config import EMBED_BATCHING, EMBED_BATCH_MAX_SIZE, EMBED_BATCH_WINDOW_MS, EMBEDDING_BACKEND, OLLAMA_BASE_URL
+from .config import EMBED_ONNX_INT8, EMBED_ONNX_THREADS, VECTORSTORE_BACKEND
+from .config import RETRIEVAL_K, ROUTED_K, ROUTING_ENABLED
+from .config import CONTEXT_BUDGET_ENABLED, CONTEXT_MAX_TOKENS, CONTEXT_DUPLICATE_THRESHOLD
+from .config import DEDUP_ENABLED, DEDUP_THRESHOLD
+from .config import INGEST_WORKERS, EMBED_CACHE_ENABLED, EMBED_CACHE_PATH, EMBED_CACHE_DTYPE
+from .metrics import timed_function
 load_dotenv()
+logger = logging.getLogger(__name__)
 
-##  every file has a different encoding that is why i detect the encoding first 
-def detect_encoding(file_path):
-    with open(file_path, 'rb') as f:
-        raw_data = f.read(10000)
-    result = chardet.detect(raw_data)
-    return result["encoding"]
+DATA_DIR = "backend/data/"
+DB_PATH = "./backend/db"
+EMBEDDING_MODEL = "./backend/models/all-MiniLM-L6-v2"
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 100
+## csv values up to this length are also copied into the chunk metadata, longer ones (descriptions) stay in the text only
+ROW_METADATA_MAX_CHARS = 200
+
+## how many chunks are embedded and upserted per call to the vector DB
+INGEST_BATCH_SIZE = 256
 
 ## loading the data
 
-def load_documents():
+def list_source_files(data_dir=DATA_DIR):
+    return [
+        os.path.join(data_dir, file_name)
+        for file_name in sorted(os.listdir(data_dir))
+        if file_name.endswith((".csv", ".doc"))
+    ]
+
+@timed_function("load_documents")
+def load_documents(data_dir=DATA_DIR):
+    ## everything in memory, the index build streams the files instead (see `ingest_batches`)
     documents = []
-    folder_data = "backend/data/"
   
-    for file_name in os.listdir(folder_data):
-        
-        file_path = os.path.join(folder_data, file_name)
-        if file_name.endswith(".csv"):
-            encoding = detect_encoding(file_path)
-            loader = CSVLoader(file_path,encoding=encoding)
-            documents.extend(loader.load())
-        elif file_name.endswith(".doc"):
-            loader = Docx2txtLoader(file_path)
-            documents.extend(loader.load())
+    for batch in iter_document_batches(list_source_files(data_dir), INGEST_BATCH_SIZE):
+        documents.extend(batch)
     
     return documents
 
-## split documents into chunks
+## split documents into chunks: one compact record per csv row, the recursive splitter for prose;
+## every chunk is tagged with its kind and city for the query router
+@timed_function("split_documents")
 def split_documents(documents):
     text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=100
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP
     )
     
-    return text_splitter.split_documents(documents)
+    chunks = []
+    for doc in documents:
+        if not doc.metadata.get("source", "").endswith(".csv"):
+            chunks.extend(text_splitter.split_documents([doc]))
+            continue
+        record = row_record(doc)
+        if len(record.page_content) <= CHUNK_SIZE:
+            chunks.append(record)
+            continue
+        ## a long free text row: its long values are split and every piece keeps the short columns (name, city...)
+        lines = record.page_content.split("\n")
+        header = "\n".join(line for line in lines if len(line) <= ROW_METADATA_MAX_CHARS)
+        body = "\n".join(line for line in lines if len(line) > ROW_METADATA_MAX_CHARS)
+        for piece in text_splitter.split_text(body):
+            chunks.append(Document(page_content=f"{header}\n{piece}" if header else piece, metadata=dict(record.metadata)))
+    return [tag_chunk(chunk) for chunk in chunks]
+
+def row_record(doc):
+    """
+    Turns a CSVLoader row ("column: value" lines) into a compact record:
+    empty columns are dropped and the short values are kept as metadata.
+    """
+    fields = []
+    for line in doc.page_content.splitlines():
+        column, sep, value = line.partition(": ")
+        if sep and column.strip():
+            fields.append([column.strip(), value.strip()])
+        elif fields:
+            ## continuation of a multi line value
+            fields[-1][1] = (fields[-1][1] + "\n" + line).strip()
+        elif line.strip():
+            fields.append(["", line.strip()])
+
+    metadata = dict(doc.metadata)
+    for column, value in fields:
+        if column and value and len(value) <= ROW_METADATA_MAX_CHARS and column not in metadata:
+            metadata[column] = value
+    content = "\n".join(f"{column}: {value}" if column else value for column, value in fields if value)
+    return Document(page_content=content, metadata=metadata)
+
+def add_chunk_stats(stats, chunks):
+    """Adds the number and size of the chunks, per source type (csv, doc...), to `stats`."""
+    for chunk in chunks:
+        source_type = os.path.splitext(chunk.metadata.get("source", ""))[1].lstrip(".") or "other"
+        entry = stats.setdefault(source_type, {"chunks": 0, "chars": 0, "avg_chars": 0.0})
+        entry["chunks"] += 1
+        entry["chars"] += len(chunk.page_content)
+        entry["avg_chars"] = entry["chars"] / entry["chunks"]
+    return stats
+
+def embedding_model_id():
+    """Identifies the vectors made by `get_embeddings`, vectors of two different ids can not be mixed."""
+    if EMBEDDING_BACKEND == "hashing":
+        return f"hashing-{HashingEmbeddings().size}"
+    if EMBEDDING_BACKEND == "onnx" and EMBED_ONNX_INT8:
+        ## the fp32 ONNX model gives the same vectors as the torch one (within float error), the int8 one does not
+        return f"{EMBEDDING_MODEL}#int8"
+    return EMBEDDING_MODEL
+
+## one cache per process, shared by every vector store so the hit rate covers them all
+@lru_cache(maxsize=None)
+def get_embedding_cache():
+    return EmbeddingCache(EMBED_CACHE_PATH, embedding_model_id(), EMBED_CACHE_DTYPE)
+
+def get_embeddings():
+    if EMBEDDING_BACKEND == "hashing":
+        embeddings = HashingEmbeddings()
+    elif EMBEDDING_BACKEND == "onnx":
+        ## imported here so onnxruntime is only loaded when it is used
+        from .onnx_embeddings import OnnxEmbeddings
+        embeddings = OnnxEmbeddings(EMBEDDING_MODEL, quantize=EMBED_ONNX_INT8, threads=EMBED_ONNX_THREADS or None)
+    else:
+        embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL,cache_folder="./backend/models")
+    if EMBED_BATCHING:
+        ## concurrent queries share one forward pass
+        embeddings = BatchingEmbeddings(embeddings, max_batch_size=EMBED_BATCH_MAX_SIZE, window_ms=EMBED_BATCH_WINDOW_MS)
+    if EMBED_CACHE_ENABLED:
+        ## chunks already embedded by this model are read from disk instead,
+        ## outside the batcher so the queries it embeds never reach the cache
+        embeddings = CachedEmbeddings(embeddings, get_embedding_cache())
+    return embeddings
+
+## open an already built collection without touching the source files
+def open_vectorstore(db_path=DB_PATH, backend=None):
+    if (backend or VECTORSTORE_BACKEND) == "mmap":
+        return MmapVectorStore(db_path, get_embeddings())
+    return Chroma(collection_name="tsaraia",persist_directory=db_path,embedding_function=get_embeddings())
 
 ## create Vectorial DB with Hugging Face Embeddings
-def create_vectorstore(docs):
-    embeddings = HuggingFaceEmbeddings(model_name="./backend/models/all-MiniLM-L6-v2",cache_folder="./backend/models")
+@timed_function("create_vectorstore")
+def create_vectorstore(docs, db_path=DB_PATH):
+    """
+    Opens the persisted Chroma collection and synchronises it with the given chunks.
+    Only new or changed chunks are embedded, chunks of removed files are deleted.
+
+    Returns:
+        (db, stats): the vector store and the ingestion report {"added", "skipped", "deleted"}
+    """
+    return ingest_batches([docs], db_path)
+
+## streaming ingestion of a data folder: files are parsed in parallel and each batch is split then upserted
+def ingest_directory(data_dir=DATA_DIR, db_path=DB_PATH, on_documents=None, progress=None):
+    """
+    Loads, splits and upserts the source files batch by batch, so the peak memory
+    depends on INGEST_BATCH_SIZE and INGEST_WORKERS rather than on the size of the corpus.
+
+    Args:
+        on_documents: called with every batch of loaded documents, before splitting
+        progress: callback receiving the files / rows / chunks counts and rates
+
+    Returns:
+        (db, stats): the vector store and the ingestion report, with the number of documents,
+                     the chunk stats per source type and the chunk counts per kind and city
+    """
+    files = list_source_files(data_dir)
+    tracker = IngestProgress(len(files), progress)
+    documents = 0
+    chunk_stats = {}
+    tags = {}
+
+    def chunk_batches():
+        nonlocal documents
+        for docs in iter_document_batches(files, INGEST_BATCH_SIZE, INGEST_WORKERS, tracker):
+            documents += len(docs)
+            if on_documents is not None:
+                on_documents(docs)
+            chunks = split_documents(docs)
+            add_chunk_stats(chunk_stats, chunks)
+            add_tag_stats(tags, chunks)
+            yield chunks
+
+    db, stats = ingest_batches(chunk_batches(), db_path, tracker)
+    return db, dict(stats, documents=documents, chunks_by_type=chunk_stats, tags=tags)
+
+## same as create_vectorstore for chunks coming in batches: only one batch is in memory at a time
+def ingest_batches(batches, db_path=DB_PATH, tracker=None):
     ## stocke in a db in directory 
-    db_path = "./backend/db"
-    if not os.path.exists(db_path):
-        os.makedirs(db_path)
-        db = Chroma.from_documents(docs,embeddings,collection_name="tsaraia",persist_directory=db_path)
-        
+    os.makedirs(db_path, exist_ok=True)
+    db = open_vectorstore(db_path)
+    cache_before = get_embedding_cache().stats() if EMBED_CACHE_ENABLED else None
+    stats = sync_vectorstore(db, batches, db_path, tracker)
+    logger.info(f"Ingestion: {stats['added']} added, {stats['skipped']} skipped, {stats['deleted']} deleted")
+    if cache_before is not None:
+        cache_after = get_embedding_cache().stats()
+        hits = cache_after["hits"] - cache_before["hits"]
+        misses = cache_after["misses"] - cache_before["misses"]
+        stats["embedding_cache"] = {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else 0.0}
+        logger.info(f"Embedding cache: {hits} hits, {misses} misses")
+    return db, stats
+
+## incremental ingestion driven by the manifest stored next to the db, `batches` is an iterable of chunk lists
+def sync_vectorstore(db, batches, db_path, tracker=None):
+    manifest = load_manifest(db_path)
+    if manifest is None:
+        ## a db built before the manifest existed has random ids we can not match: start over
+        manifest = {"files": {}}
+        legacy_ids = db.ids() if isinstance(db, MmapVectorStore) else db.get(include=[])["ids"]
+        for start in range(0, len(legacy_ids), INGEST_BATCH_SIZE):
+            db.delete(ids=legacy_ids[start:start + INGEST_BATCH_SIZE])
+        deleted = len(legacy_ids)
     else:
-        db = Chroma(collection_name="tsaraia",persist_directory=db_path,embedding_function=embeddings)
-    return db
+        deleted = 0
+
+    old_ids = {chunk_id for entry in manifest["files"].values() for chunk_id in entry["chunks"]}
+    ## only the ids are kept across batches, the chunks themselves are dropped once upserted
+    new_ids = set()
+    by_source = {}
+    seen = {}
+    ## near duplicates of a chunk already seen are not stored, their file and row are listed on the canonical chunk:
+    ## the smallest chunk of the group (canonical_rank), whatever the order the workers read the files in
+    near_duplicates = NearDuplicateIndex(DEDUP_THRESHOLD) if DEDUP_ENABLED else None
+    duplicates = {}
+    ranks, refs = {}, {}
+    ## canonical chunk -> the smaller chunk of its group that replaced it
+    replaced = {}
+    ## a chunk that was a duplicate in the previous ingestion is only embedded at the end,
+    ## if it is still canonical: on a rebuild its group's canonical usually comes later
+    previous_refs = {ref for group in manifest.get("duplicates", {}).values() for ref in group}
+    deferred = {}
+    added_ids = set()
+    for docs in batches:
+        ids = chunk_ids(docs, seen)
+        to_add = []
+        for doc, chunk_id in zip(docs, ids):
+            canonical = near_duplicates.check(chunk_id, dedup_text(doc)) if near_duplicates is not None else None
+            if canonical is not None and canonical_rank(doc, chunk_id) > ranks[canonical]:
+                duplicates.setdefault(canonical, []).append(duplicate_ref(doc))
+                by_source.setdefault(doc.metadata.get("source", ""), []).append(canonical)
+                continue
+            if canonical is not None:
+                ## the new chunk comes first in the group: the previous canonical becomes one of its duplicates
+                near_duplicates.replace(canonical, chunk_id)
+                duplicates[chunk_id] = duplicates.pop(canonical, []) + [refs.pop(canonical)]
+                del ranks[canonical]
+                replaced[canonical] = chunk_id
+                new_ids.discard(canonical)
+                deferred.pop(canonical, None)
+            if near_duplicates is not None:
+                ranks[chunk_id], refs[chunk_id] = canonical_rank(doc, chunk_id), duplicate_ref(doc)
+            by_source.setdefault(doc.metadata.get("source", ""), []).append(chunk_id)
+            new_ids.add(chunk_id)
+            if chunk_id in old_ids:
+                continue
+            if duplicate_ref(doc) in previous_refs:
+                deferred[chunk_id] = doc
+            else:
+                to_add.append((doc, chunk_id))
+        ## chunks replaced within the batch are not embedded
+        to_add = [(doc, chunk_id) for doc, chunk_id in to_add if chunk_id in new_ids]
+        for start in range(0, len(to_add), INGEST_BATCH_SIZE):
+            batch = to_add[start:start + INGEST_BATCH_SIZE]
+            db.add_documents([doc for doc, _ in batch], ids=[chunk_id for _, chunk_id in batch])
+        added_ids.update(chunk_id for _, chunk_id in to_add)
+        if tracker is not None:
+            tracker.add(chunks=len(docs))
+
+    to_add = list(deferred.items())
+    for start in range(0, len(to_add), INGEST_BATCH_SIZE):
+        batch = to_add[start:start + INGEST_BATCH_SIZE]
+        db.add_documents([doc for _, doc in batch], ids=[chunk_id for chunk_id, _ in batch])
+    added_ids.update(deferred)
+
+    ## chunks of removed files, old versions of changed chunks and canonical chunks replaced during this ingestion
+    stale_ids = list((old_ids | (added_ids & set(replaced))) - new_ids)
+    for start in range(0, len(stale_ids), INGEST_BATCH_SIZE):
+        db.delete(ids=stale_ids[start:start + INGEST_BATCH_SIZE])
+    deleted += len(stale_ids)
+    ## sorted: with several workers the files are read in a different order on every run
+    duplicates = {chunk_id: sorted(refs) for chunk_id, refs in duplicates.items()}
+    merge_duplicates(db, duplicates, manifest.get("duplicates", {}), new_ids)
+    if isinstance(db, MmapVectorStore) and db.deleted_rows:
+        ## the rows are only masked until the files are rewritten
+        db.compact()
+
+    def resolve(chunk_id):
+        while chunk_id in replaced:
+            chunk_id = replaced[chunk_id]
+        return chunk_id
+
+    files = {}
+    for source, source_ids in by_source.items():
+        entry = describe_file(source) if os.path.exists(source) else {}
+        entry["chunks"] = [resolve(chunk_id) for chunk_id in source_ids]
+        files[source] = entry
+    manifest["files"] = files
+    manifest["duplicates"] = duplicates
+    save_manifest(db_path, manifest)
+
+    duplicate_count = sum(len(refs) for refs in duplicates.values())
+    return {
+        ## chunks embedded, including canonical chunks replaced later in the same ingestion
+        "added": len(added_ids),
+        "skipped": len(new_ids & old_ids),
+        "deleted": deleted,
+        "duplicates": duplicate_count,
+        "dedup_ratio": duplicate_count / (len(new_ids) + duplicate_count) if new_ids else 0.0,
+    }
+
+def merge_duplicates(db, duplicates, previous, live_ids):
+    """
+    Writes the files and rows of their duplicates on the canonical chunks, as the
+    "duplicate_sources" metadata. Only the chunks whose duplicates changed since the
+    previous ingestion are rewritten (their vector comes from the embedding cache when it is on).
+    """
+    changed = [chunk_id for chunk_id in live_ids if duplicates.get(chunk_id, []) != previous.get(chunk_id, [])]
+    for start in range(0, len(changed), INGEST_BATCH_SIZE):
+        docs = db.get_by_ids(changed[start:start + INGEST_BATCH_SIZE])
+        for doc in docs:
+            doc.metadata["duplicate_sources"] = "; ".join(dict.fromkeys(duplicates.get(doc.id, [])))
+        db.add_documents(docs, ids=[doc.id for doc in docs])
+
+## the retriever of the chains: filtered by the router when there is one,
+## its chunks deduplicated and fitted to the context budget before they are stuffed into the prompt
+def get_retriever(db, router=None):
+    # without router every question searches the whole collection, the chunks still get their score
+    retriever = RoutedRetriever(vectorstore=db, router=router if ROUTING_ENABLED else None, k=RETRIEVAL_K, routed_k=ROUTED_K)
+    budgeter = get_context_budgeter()
+    if budgeter is not None:
+        retriever = ContextualCompressionRetriever(base_compressor=budgeter, base_retriever=retriever)
+    return retriever
+
+def get_context_budgeter():
+    if not CONTEXT_BUDGET_ENABLED:
+        return None
+    return ContextBudgeter(max_tokens=CONTEXT_MAX_TOKENS, duplicate_threshold=CONTEXT_DUPLICATE_THRESHOLD)
+
+def format_docs(docs):
+    return "\n\n".join(doc.page_content for doc in docs)
 
 ## the rag chain
-def create_rag_chain(db):
+def create_rag_chain(db, router=None):
     try:
         api_key = os.getenv("OPENROUTER_API_KEY")
         #llm = ChatOpenAI(model="meta-llama/llama-4-scout:free", temperature=0.5,api_key=api_key,base_url="https://openrouter.ai/api/v1")
-        llm = ChatOllama(model="mistral:7b",temperature=0.7,base_url="http://localhost:11434",reasoning=False,validate_model_on_init=True)
+        llm = ChatOllama(model="mistral:7b",temperature=0.7,base_url=OLLAMA_BASE_URL,reasoning=False,validate_model_on_init=True)
         # Create the RetrievalQA chain
         #    - This connects the LLM with your retriever (vector database).
         #    - The retriever will fetch the most relevant documents (k=3).
@@ -73,20 +373,48 @@ def create_rag_chain(db):
         qa_chain = RetrievalQA.from_chain_type(
             llm=llm,
             chain_type="stuff",
-            retriever=db.as_retriever(search_kwargs={"k":5}),
+            retriever=get_retriever(db, router),
             return_source_documents=True
         )
         
         def rag_chain_func(query):
             result = qa_chain.invoke({"query": query})
-            print("result",result)
             return result["result"]
+
+        async def arag_chain_func(query):
+            result = await qa_chain.ainvoke({"query": query})
+            return result["result"]
+        # the retrieved documents reach the response through the retriever callbacks (see sources.SourceCollector)
         tool = Tool(
-            name="RAG_Chain",
+            name=RETRIEVAL_TOOL,
             func=rag_chain_func,
+            coroutine=arag_chain_func,
             description="useful for when you need to answer questions about agencies, touristic guides and moroccan recipies"
         )
         return tool,llm
     except Exception as e:
-        print(f"Error creating RAG chain: {e}")
-        return None,None
\ No newline at end of file
+        logger.error(f"Error creating RAG chain: {e}")
+        return None,None
+
+## the direct chain: one LLM call instead of agent -> tool -> RetrievalQA -> agent
+def create_direct_chain(db, llm, router=None):
+    """
+    Retrieves the documents of the question, stuffs them into the prompt and
+    generates the structured JSON answer in a single LLM call.
+    Takes the same input as the agent executor ({"input", "chat_history"})
+    and returns the same output ({"output": text}) so both can be swapped.
+    A follow-up question is retrieved with the previous question of the history (`condense_question`).
+    """
+    retriever = get_retriever(db, router)
+    question = RunnableLambda(lambda inputs: condense_question(inputs["input"], inputs.get("chat_history") or [], router))
+    return RunnablePassthrough.assign(documents=question | retriever) | create_answer_chain(llm)
+
+def create_answer_chain(llm):
+    """The generation part of the direct chain, for callers that retrieve the documents themselves ({"input", "chat_history", "documents"})."""
+    return (
+        RunnablePassthrough.assign(context=lambda inputs: format_docs(inputs["documents"]))
+        | promptDirect
+        | llm
+        | StrOutputParser()
+        | RunnableLambda(lambda text: {"output": text})
+    )
@@ -0,0 +1,213 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from pydantic import PrivateAttr
+from .entities import COLUMN_ALIASES, KIND_KEYWORDS, normalize, source_type
+from .metrics import RETRIEVAL_ROUTES
+from .vectorstore import MmapVectorStore
+
+## a question of at most this many words can be a follow-up of the previous one ("et à Fès ?")
+FOLLOWUP_MAX_WORDS = 6
+## first words of a follow-up question
+FOLLOWUP_WORDS = {"et", "aussi", "pareil", "meme", "and", "also", "what", "same"}
+
+
+def route_label(filter: Optional[Dict[str, Any]]) -> str:
+    """Name of a route in the metrics: "none", or the metadata keys of the filter ("city", "kind", "city_kind")."""
+    if filter is None:
+        return "none"
+    return "_".join(sorted(key for condition in filter.get("$and", [filter]) for key in condition))
+
+
+def relevance_score_fn(vectorstore: VectorStore) -> Callable[[float], float]:
+    """
+    Turns the scores of a store into cosine similarities, the same on both backends.
+    Chroma returns squared l2 distances, 2 - 2 * cosine for our normalized embeddings.
+    """
+    if isinstance(vectorstore, MmapVectorStore):
+        return lambda score: score
+    return lambda distance: 1.0 - distance / 2.0
+
+
+def search_with_scores(vectorstore: VectorStore, embedding: List[float], k: int,
+                       filter: Optional[Dict[str, Any]] = None) -> List[Document]:
+    """The k nearest chunks of `embedding`, each with its cosine similarity in metadata["score"]."""
+    if isinstance(vectorstore, MmapVectorStore):
+        pairs = vectorstore.similarity_search_with_score_by_vector(embedding, k, filter=filter)
+    else:
+        ## the scores of this Chroma method are distances despite its name
+        pairs = vectorstore.similarity_search_by_vector_with_relevance_scores(embedding, k, filter=filter)
+    relevance = relevance_score_fn(vectorstore)
+    for doc, score in pairs:
+        doc.metadata["score"] = relevance(score)
+    return [doc for doc, _ in pairs]
+
+
+def top_up(docs: List[Document], fallback: List[Document], size: int) -> List[Document]:
+    """Completes the chunks found with a filter with the best chunks of the whole collection, up to `size`."""
+    seen = {doc.page_content for doc in docs}
+    for doc in fallback:
+        if len(docs) >= size:
+            break
+        if doc.page_content not in seen:
+            docs.append(doc)
+    return docs
+
+
+def tag_chunk(doc: Document) -> Document:
+    """
+    Tags a chunk with the kind of its source (from the file name) and its city
+    (from the city column of csv rows, normalized), the metadata the router filters on.
+    """
+    kind = source_type(doc.metadata.get("source", ""))
+    if kind:
+        doc.metadata["kind"] = kind
+    columns = {normalize(key): value for key, value in doc.metadata.items() if isinstance(value, str)}
+    city = next((columns[alias] for alias in COLUMN_ALIASES["city"] if columns.get(alias)), None)
+    if city:
+        doc.metadata["city"] = normalize(city)
+    return doc
+
+
+def add_tag_stats(tags: Dict[str, Dict[str, int]], chunks: List[Document]) -> Dict[str, Dict[str, int]]:
+    """Counts the chunks of every kind and city ("" when untagged) into `tags`."""
+    for chunk in chunks:
+        cities = tags.setdefault(chunk.metadata.get("kind", ""), {})
+        city = chunk.metadata.get("city", "")
+        cities[city] = cities.get(city, 0) + 1
+    return tags
+
+
+class QueryRouter:
+    """
+    Chooses the metadata filter of a question before the vector search, with keyword
+    rules only (no LLM call): a kind when the question names exactly one kind of source,
+    a city when it names exactly one city of the index that has chunks of that kind.
+    """
+
+    def __init__(self, tags: Optional[Dict[str, Dict[str, int]]] = None):
+        ## kind -> city -> number of chunks, as counted at ingestion
+        self.tags = tags or {}
+        self.cities = {city for cities in self.tags.values() for city in cities if city}
+
+    def route(self, question: str) -> Optional[Dict[str, Any]]:
+        """Returns the filter of the question (Chroma syntax), or None to search everything."""
+        normalized = normalize(question)
+        kinds = self.kinds_in(normalized)
+        kind = kinds[0] if len(kinds) == 1 else None
+        cities = self.cities_in(normalized)
+        city = cities[0] if len(cities) == 1 else None
+        if city and not any(self.tags[candidate].get(city) for candidate in ([kind] if kind else self.tags)):
+            ## "tajine de Fès": the recipes have no city, filtering on it would leave nothing
+            city = None
+
+        conditions = []
+        if kind:
+            conditions.append({"kind": kind})
+        if city:
+            conditions.append({"city": city})
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    def kinds_in(self, normalized: str) -> List[str]:
+        words = set(normalized.split())
+        return [kind for kind, keywords in KIND_KEYWORDS.items() if kind in self.tags and words & keywords]
+
+    def cities_in(self, normalized: str) -> List[str]:
+        return [city for city in self.cities if f" {city} " in f" {normalized} "]
+
+    def follow_up(self, previous: str, question: str) -> str:
+        """
+        `previous` completed by the follow-up `question`, whose city and kind replace
+        the ones of `previous` ("agences à Marrakech" then "et à Fès ?" routes to Fès).
+        """
+        previous, normalized = normalize(previous), normalize(question)
+        if self.cities_in(normalized):
+            for city in self.cities_in(previous):
+                previous = f" {previous} ".replace(f" {city} ", " ").strip()
+        if self.kinds_in(normalized):
+            keywords = set().union(*KIND_KEYWORDS.values())
+            previous = " ".join(word for word in previous.split() if word not in keywords)
+        return f"{previous} {normalized}"
+
+
+def condense_question(question: str, history: Sequence[BaseMessage], router: Optional[QueryRouter] = None) -> str:
+    """
+    The question to retrieve with. A short follow-up ("et à Fès ?") does not say what it
+    is about on its own: it is completed with the previous question of the conversation,
+    itself condensed the same way. A follow-up naming no other city or kind ("et leurs prix ?")
+    stays on the same topic: it is retrieved with the previous query, whose chunks the
+    retriever still has. A short question naming a kind of source and not starting like
+    a follow-up stands alone. Keyword rules, no LLM call, like the routing and the session summary.
+    """
+    position = next((i for i in reversed(range(len(history))) if isinstance(history[i], HumanMessage)), None)
+    words = normalize(question).split()
+    if position is None or not words or len(words) > FOLLOWUP_MAX_WORDS:
+        return question
+    if words[0] not in FOLLOWUP_WORDS and set(words) & set().union(*KIND_KEYWORDS.values()):
+        return question
+    previous = condense_question(history[position].content, history[:position], router)
+    if router is None:
+        return f"{previous} {question}"
+    normalized = " ".join(words)
+    if not router.kinds_in(normalized) and not router.cities_in(normalized):
+        return previous
+    return router.follow_up(previous, question)
+
+
+class RoutedRetriever(BaseRetriever):
+    """
+    Retriever searching only the chunks selected by the router (everything without
+    router). A routed question retrieves `routed_k` chunks instead of `k`, the
+    candidates being more relevant; when the filter leaves too few chunks the best
+    chunks of the whole collection fill the gap. The chunks carry their score.
+    The chunks of the last `recent` queries are kept: a follow-up on the same topic
+    is retrieved with the query of the previous turn (`condense_question`) and reuses them.
+    """
+
+    vectorstore: VectorStore
+    router: Optional[QueryRouter] = None
+    k: int = 5
+    routed_k: int = 3
+    recent: int = 64
+
+    model_config = {"arbitrary_types_allowed": True}
+
+    _results: "OrderedDict[str, List[Document]]" = PrivateAttr(default_factory=OrderedDict)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with self._lock:
+            docs = self._results.get(query)
+            if docs is not None:
+                self._results.move_to_end(query)
+        if docs is not None:
+            RETRIEVAL_ROUTES.inc(route="reused")
+        else:
+            docs = self._search(query)
+            with self._lock:
+                self._results[query] = docs
+                while len(self._results) > self.recent:
+                    self._results.popitem(last=False)
+        # the chunks are handed out as copies, the context budget rewrites them
+        return [doc.model_copy(deep=True) for doc in docs]
+
+    def _search(self, query: str) -> List[Document]:
+        filter = self.router.route(query) if self.router is not None else None
+        embedding = self.vectorstore.embeddings.embed_query(query)
+        if filter is None:
+            RETRIEVAL_ROUTES.inc(route="none")
+            return search_with_scores(self.vectorstore, embedding, self.k)
+
+        docs = search_with_scores(self.vectorstore, embedding, self.routed_k, filter)
+        if len(docs) >= self.routed_k:
+            RETRIEVAL_ROUTES.inc(route=route_label(filter))
+            return docs
+        RETRIEVAL_ROUTES.inc(route="fallback")
+        return top_up(docs, search_with_scores(self.vectorstore, embedding, self.k), self.routed_k)
@@ -0,0 +1,196 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from .context import CHARS_PER_TOKEN, estimate_tokens
+from .config import HISTORY_MAX_TOKENS, SESSION_BACKEND, SESSION_DB_PATH, SESSION_MAX, SESSION_TTL
+
+## share of the history budget given to the summary of the older turns, the rest goes to the recent turns
+SUMMARY_SHARE = 1 / 3
+## longest digest of one folded turn in the summary (characters)
+DIGEST_MAX_CHARS = 200
+
+
+def _digest(question: str, answer: str) -> str:
+    """One summary line for a turn: the question and the first sentence of the answer."""
+    first_sentence = re.split(r"(?<=[.!?])\s", answer.strip(), maxsplit=1)[0]
+    line = f"{' '.join(question.split())} -> {' '.join(first_sentence.split())}"
+    return line if len(line) <= DIGEST_MAX_CHARS else line[:DIGEST_MAX_CHARS - 1] + "…"
+
+
+def fold(state: Dict[str, Any], max_tokens: int) -> Dict[str, Any]:
+    """
+    Keeps the history of a session within `max_tokens`: the oldest turns leave the
+    verbatim part and are folded into the summary as one line each, and the oldest
+    summary lines are dropped once the summary exceeds its share of the budget.
+    The summary is extractive (question and first sentence of the answer) so
+    folding costs no LLM call.
+    """
+    summary_budget = int(max_tokens * SUMMARY_SHARE)
+    turns_budget = max_tokens - summary_budget
+    turns = state["turns"]
+    summary = state["summary"].split("\n") if state["summary"] else []
+    while len(turns) > 1 and sum(estimate_tokens(q) + estimate_tokens(a) for q, a in turns) > turns_budget:
+        question, answer = turns.pop(0)
+        summary.append(_digest(question, answer))
+    if turns:
+        ## a single turn longer than the budget: its answer is cut
+        question, answer = turns[0]
+        room = (turns_budget - estimate_tokens(question)) * CHARS_PER_TOKEN
+        if len(answer) > room:
+            turns[0] = [question, answer[:max(room, 0)]]
+    while summary and estimate_tokens("\n".join(summary)) > summary_budget:
+        summary.pop(0)
+    state["summary"] = "\n".join(summary)
+    return state
+
+
+class SessionStore(ABC):
+    """
+    Conversation history of the chat sessions, kept on the server.
+    Each session is a rolling summary and the recent turns, bounded by `max_tokens`
+    (see `fold`); sessions idle for more than `ttl` seconds are dropped and at most
+    `max_sessions` are kept, the least recently used ones being evicted first.
+    Subclasses store the state of a session (a small JSON-able dict).
+    """
+
+    def __init__(self, max_tokens: int, max_sessions: int, ttl: float):
+        self.max_tokens = max_tokens
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def history(self, session_id: str) -> List[BaseMessage]:
+        """The messages to put in the `chat_history` placeholder of the prompts."""
+        with self._lock:
+            state = self._load(session_id)
+        if state is None:
+            return []
+        messages: List[BaseMessage] = []
+        if state["summary"]:
+            messages.append(SystemMessage(content=f"Earlier in this conversation:\n{state['summary']}"))
+        for question, answer in state["turns"]:
+            messages.append(HumanMessage(content=question))
+            messages.append(AIMessage(content=answer))
+        return messages
+
+    def add_turn(self, session_id: str, question: str, answer: str) -> None:
+        with self._lock:
+            state = self._load(session_id) or {"summary": "", "turns": []}
+            state["turns"].append([question, answer])
+            self._save(session_id, fold(state, self.max_tokens))
+            self._evict()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._delete(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"sessions": self._count(), "evictions": self.evictions, "max_tokens": self.max_tokens}
+
+    @abstractmethod
+    def _load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def _save(self, session_id: str, state: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def _delete(self, session_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def _evict(self) -> None:
+        ...
+
+    @abstractmethod
+    def _count(self) -> int:
+        ...
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions of this process only, lost on restart."""
+
+    def __init__(self, max_tokens: int, max_sessions: int, ttl: float):
+        super().__init__(max_tokens, max_sessions, ttl)
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def _load(self, session_id):
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        state, last_used = entry
+        if time.time() - last_used > self.ttl:
+            del self._sessions[session_id]
+            self.evictions += 1
+            return None
+        return json.loads(json.dumps(state))
+
+    def _save(self, session_id, state):
+        self._sessions[session_id] = (state, time.time())
+        self._sessions.move_to_end(session_id)
+
+    def _delete(self, session_id):
+        return self._sessions.pop(session_id, None) is not None
+
+    def _evict(self):
+        now = time.time()
+        while self._sessions:
+            session_id, (_, last_used) = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - last_used <= self.ttl:
+                break
+            del self._sessions[session_id]
+            self.evictions += 1
+
+    def _count(self):
+        return len(self._sessions)
+
+
+class SqliteSessionStore(SessionStore):
+    """Sessions in a local SQLite file: they survive restarts and are shared by the uvicorn workers."""
+
+    def __init__(self, path: str, max_tokens: int, max_sessions: int, ttl: float):
+        super().__init__(max_tokens, max_sessions, ttl)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+
+    def _load(self, session_id):
+        row = self._db.execute("SELECT state, updated_at FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def _save(self, session_id, state):
+        self._db.execute("INSERT OR REPLACE INTO sessions (id, state, updated_at) VALUES (?, ?, ?)",
+                         (session_id, json.dumps(state, ensure_ascii=False), time.time()))
+
+    def _delete(self, session_id):
+        return self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0
+
+    def _evict(self):
+        expired = self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl,)).rowcount
+        extra = self._db.execute(
+            "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)).rowcount
+        self.evictions += expired + extra
+
+    def _count(self):
+        return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def create_session_store() -> SessionStore:
+    if SESSION_BACKEND == "sqlite":
+        return SqliteSessionStore(SESSION_DB_PATH, HISTORY_MAX_TOKENS, SESSION_MAX, SESSION_TTL)
+    return MemorySessionStore(HISTORY_MAX_TOKENS, SESSION_MAX, SESSION_TTL)
@@ -0,0 +1,64 @@
+from typing import Any, Dict, List, Sequence
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+from .models import SourceDocument
+
+## name of the retrieval in `tools_used`, the RAG tool of the agent and the direct chain both retrieve with it
+RETRIEVAL_TOOL = "RAG_Chain"
+
+
+def source_documents(documents: Sequence[Document]) -> List[SourceDocument]:
+    """One entry per file and csv row, with its best score, most relevant first."""
+    best: Dict[tuple, SourceDocument] = {}
+    for doc in documents:
+        source = doc.metadata.get("source")
+        if not source:
+            continue
+        row, score = doc.metadata.get("row"), doc.metadata.get("score")
+        key = (source, row)
+        if key not in best or (score is not None and (best[key].score is None or score > best[key].score)):
+            best[key] = SourceDocument(file=source, row=row, score=None if score is None else round(float(score), 4))
+    return sorted(best.values(), key=lambda source: -source.score if source.score is not None else 0.0)
+
+
+def fill_sources(response: Dict[str, Any], documents: Sequence[Document], tools: Sequence[str] = ()) -> Dict[str, Any]:
+    """
+    Sets the sources of a parsed response from the documents given to the model,
+    whatever the model wrote: the files, the chunks (file, row, score) and the tools run.
+    """
+    chunks = source_documents(documents)
+    response["sources"] = list(dict.fromkeys(chunk.file for chunk in chunks))
+    response["source_documents"] = [chunk.model_dump() for chunk in chunks]
+    response["tools_used"] = list(tools) or ([RETRIEVAL_TOOL] if documents else [])
+    return response
+
+
+class SourceCollector(BaseCallbackHandler):
+    """
+    LangChain callback collecting what a chain / agent run retrieved: the documents
+    returned by the outermost retrievers (after the context budget, i.e. what the
+    model read) and the names of the tools the agent ran.
+    """
+
+    # run in the caller's context, the documents are read right after the run
+    run_inline = True
+
+    def __init__(self):
+        self.documents: List[Document] = []
+        self.tools: List[str] = []
+        self._retrievers = set()
+        self._parents: Dict[Any, Any] = {}
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs) -> None:
+        self._retrievers.add(run_id)
+        self._parents[run_id] = parent_run_id
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs) -> None:
+        ## the base retriever wrapped by the context budgeter returns the chunks before the budget
+        if self._parents.get(run_id) not in self._retrievers:
+            self.documents.extend(documents)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name")
+        if name and name not in self.tools:
+            self.tools.append(name)
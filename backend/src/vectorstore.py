@@ -0,0 +1,340 @@
+import json
+import os
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+## bump when the files of the store change
+STORE_FORMAT = 1
+META_FILE = "store.json"
+VECTORS_FILE = "vectors.f32"
+OFFSETS_FILE = "offsets.i64"
+RECORDS_FILE = "records.jsonl"
+IDS_FILE = "ids.txt"
+DELETED_FILE = "deleted.i64"
+## queries scored by one matrix product in batched searches, bounds the rows x queries score matrix
+QUERY_BLOCK = 64
+
+
+class MmapVectorStore(VectorStore):
+    """
+    Flat vector index over memory-mapped files, an in-process alternative to Chroma.
+
+    The normalized vectors are one float32 matrix in `vectors.f32`, the texts and
+    metadata one JSON record per line in `records.jsonl` (with their end offsets in
+    `offsets.i64`), the ids one per line in `ids.txt`. Every file is append-only;
+    `store.json` is rewritten last and holds the row counts, so rows written by an
+    interrupted batch are ignored and truncated by the next write.
+
+    Searching is an exact dot product over the mapped matrix: the files are read
+    through the page cache, so every worker process serving the same index
+    shares one copy of it instead of loading the collection at startup.
+    Deleted rows are masked until `compact` rewrites the files without them.
+    Scores are cosine similarities (higher is closer), not Chroma distances.
+    """
+
+    def __init__(self, path: str, embedding: Embeddings):
+        self.path = path
+        self.embedding = embedding
+        self._lock = threading.Lock()
+        meta = self._read_meta()
+        self.dim = meta["dim"]
+        self.rows = meta["rows"]
+        self.deleted_rows = meta["deleted"]
+        self._end = meta["bytes"]
+        self._writable = False
+        self._row_of = None
+        self._invalidate()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return self.rows - self.deleted_rows
+
+    ## reading
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None,
+                          **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter=filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, filter=filter)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter=filter)]
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vectors([embedding], k, filter=filter)[0]
+
+    def similarity_search_by_vectors(self, embeddings: Sequence[List[float]], k: int = 4,
+                                     filter: Optional[Dict[str, Any]] = None) -> List[List[Document]]:
+        return [[doc for doc, _ in found] for found in self.similarity_search_with_score_by_vectors(embeddings, k, filter)]
+
+    def similarity_search_with_score_by_vectors(self, embeddings: Sequence[List[float]], k: int = 4,
+                                                filter: Optional[Dict[str, Any]] = None
+                                                ) -> List[List[Tuple[Document, float]]]:
+        """The k nearest rows of every query vector, scored `QUERY_BLOCK` queries per pass over the matrix."""
+        vectors, offsets, records, live = self._mapped()
+        if not len(vectors) or k <= 0 or not len(embeddings):
+            return [[] for _ in embeddings]
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        mask = live if not filter else self._filter_mask(filter, live)
+        k = min(k, int(mask.sum()) if mask is not None else len(vectors))
+        if k == 0:
+            return [[] for _ in embeddings]
+
+        results = []
+        for start in range(0, len(queries), QUERY_BLOCK):
+            ## one column of scores per query
+            scores = vectors @ queries[start:start + QUERY_BLOCK].T
+            if mask is not None:
+                scores[~mask] = -np.inf
+            for column in scores.T:
+                top = np.argpartition(-column, k - 1)[:k]
+                top = top[np.argsort(-column[top])]
+                results.append([(self._document(row, offsets, records), float(column[row])) for row in top])
+        return results
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        with self._lock:
+            row_of = self._ids()
+        _, offsets, records, _ = self._mapped()
+        return [self._document(row_of[chunk_id], offsets, records) for chunk_id in ids if chunk_id in row_of]
+
+    def ids(self) -> List[str]:
+        """Ids of the live rows."""
+        with self._lock:
+            return list(self._ids())
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # the scores already are cosine similarities
+        return lambda score: score
+
+    def _mapped(self):
+        """The mapped files, opened on first use and after every write."""
+        mapped = self._mapping
+        if mapped is None:
+            with self._lock:
+                if self._mapping is None:
+                    self._mapping = self._open_mapping()
+                mapped = self._mapping
+        return mapped
+
+    def _open_mapping(self):
+        if not self.rows:
+            return np.empty((0, self.dim or 0), dtype=np.float32), None, None, None
+        vectors = np.memmap(self._file(VECTORS_FILE), dtype=np.float32, mode="r", shape=(self.rows, self.dim))
+        offsets = np.memmap(self._file(OFFSETS_FILE), dtype=np.int64, mode="r", shape=(self.rows,))
+        records = np.memmap(self._file(RECORDS_FILE), dtype=np.uint8, mode="r", shape=(self._end,))
+        live = None
+        if self.deleted_rows:
+            live = np.ones(self.rows, dtype=bool)
+            live[np.fromfile(self._file(DELETED_FILE), dtype=np.int64, count=self.deleted_rows)] = False
+        return vectors, offsets, records, live
+
+    def _document(self, row: int, offsets, records) -> Document:
+        start = int(offsets[row - 1]) if row else 0
+        record = json.loads(records[start:int(offsets[row])].tobytes())
+        return Document(id=record["id"], page_content=record["text"], metadata=record["metadata"])
+
+    def _filter_mask(self, filter: Dict[str, Any], live: Optional[np.ndarray]) -> np.ndarray:
+        """Rows whose metadata equals every value of `filter` (a dict, or {"$and": [dicts]} as with Chroma)."""
+        postings = self._metadata_postings()
+        mask = np.ones(self.rows, dtype=bool) if live is None else live.copy()
+        conditions = filter["$and"] if "$and" in filter else [filter]
+        for key, value in ((key, value) for condition in conditions for key, value in condition.items()):
+            rows = postings.get(key, {}).get(value)
+            selected = np.zeros(self.rows, dtype=bool)
+            if rows is not None:
+                selected[rows] = True
+            mask &= selected
+        return mask
+
+    def _metadata_postings(self) -> Dict[str, Dict[Any, np.ndarray]]:
+        """Rows of every metadata value, read once from the records on the first filtered search."""
+        postings = self._postings
+        if postings is None:
+            _, offsets, records, _ = self._mapped()
+            collected = {}
+            for row in range(self.rows):
+                for key, value in self._document(row, offsets, records).metadata.items():
+                    if isinstance(value, (str, int, float, bool)):
+                        collected.setdefault(key, {}).setdefault(value, []).append(row)
+            postings = {key: {value: np.asarray(rows) for value, rows in values.items()}
+                        for key, values in collected.items()}
+            self._postings = postings
+        return postings
+
+    ## writing
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, *,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+        vectors = np.asarray(self.embedding.embed_documents(texts), dtype=np.float32)
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        lines = [
+            json.dumps({"id": chunk_id, "text": text, "metadata": metadata}, ensure_ascii=False).encode("utf-8") + b"\n"
+            for chunk_id, text, metadata in zip(ids, texts, metadatas)
+        ]
+
+        with self._lock:
+            self._prepare_write(vectors.shape[1])
+            ## same as a Chroma upsert: an id written again replaces its previous row
+            self._delete_rows([self._row_of[chunk_id] for chunk_id in ids if chunk_id in self._row_of])
+            offsets = self._end + np.cumsum([len(line) for line in lines], dtype=np.int64)
+            with open(self._file(VECTORS_FILE), "ab") as f:
+                vectors.tofile(f)
+            with open(self._file(RECORDS_FILE), "ab") as f:
+                f.writelines(lines)
+            with open(self._file(OFFSETS_FILE), "ab") as f:
+                offsets.tofile(f)
+            with open(self._file(IDS_FILE), "a", encoding="utf-8") as f:
+                f.writelines(f"{chunk_id}\n" for chunk_id in ids)
+            for row, chunk_id in enumerate(ids, start=self.rows):
+                self._row_of[chunk_id] = row
+            self.rows += len(ids)
+            self._end = int(offsets[-1])
+            self._write_meta()
+            self._invalidate()
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids or not self.rows:
+            return False
+        with self._lock:
+            self._prepare_write(self.dim)
+            self._delete_rows([self._row_of.pop(chunk_id) for chunk_id in ids if chunk_id in self._row_of])
+            self._write_meta()
+            self._invalidate()
+        return True
+
+    def compact(self) -> None:
+        """Rewrites the files without the deleted rows."""
+        with self._lock:
+            if not self.deleted_rows:
+                return
+            self._prepare_write(self.dim)
+            vectors, offsets, records, live = self._open_mapping()
+            keep = np.flatnonzero(live)
+            starts = np.concatenate(([0], offsets[:-1]))
+            with open(self._file(VECTORS_FILE) + ".tmp", "wb") as f:
+                for start in range(0, len(keep), 4096):
+                    vectors[keep[start:start + 4096]].tofile(f)
+            end = 0
+            new_offsets = np.empty(len(keep), dtype=np.int64)
+            with open(self._file(RECORDS_FILE) + ".tmp", "wb") as f:
+                for i, row in enumerate(keep):
+                    record = records[starts[row]:offsets[row]].tobytes()
+                    f.write(record)
+                    end += len(record)
+                    new_offsets[i] = end
+            new_offsets.tofile(self._file(OFFSETS_FILE) + ".tmp")
+            ids = self._read_ids()
+            with open(self._file(IDS_FILE) + ".tmp", "w", encoding="utf-8") as f:
+                f.writelines(f"{ids[row]}\n" for row in keep)
+            del vectors, offsets, records
+            for name in (VECTORS_FILE, RECORDS_FILE, OFFSETS_FILE, IDS_FILE):
+                os.replace(self._file(name) + ".tmp", self._file(name))
+            if os.path.exists(self._file(DELETED_FILE)):
+                os.remove(self._file(DELETED_FILE))
+            self.rows, self.deleted_rows, self._end = len(keep), 0, end
+            self._row_of = {ids[row]: i for i, row in enumerate(keep)}
+            self._write_meta()
+            self._invalidate()
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, *,
+                   ids: Optional[List[str]] = None, path: Optional[str] = None, **kwargs: Any) -> "MmapVectorStore":
+        if path is None:
+            raise ValueError("MmapVectorStore.from_texts needs the `path` of the store")
+        os.makedirs(path, exist_ok=True)
+        store = cls(path, embedding)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+    def _prepare_write(self, dim: Optional[int]) -> None:
+        """First write of this instance: drops the rows of an interrupted write and loads the ids."""
+        if self.dim is None:
+            self.dim = dim
+        elif dim != self.dim:
+            raise ValueError(f"Vectors of size {dim} can not be added to a store of size {self.dim}")
+        if self._writable:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        sizes = {
+            VECTORS_FILE: self.rows * self.dim * 4,
+            OFFSETS_FILE: self.rows * 8,
+            RECORDS_FILE: self._end,
+            DELETED_FILE: self.deleted_rows * 8,
+        }
+        for name, size in sizes.items():
+            file_path = self._file(name)
+            if os.path.exists(file_path) and os.path.getsize(file_path) > size:
+                os.truncate(file_path, size)
+        ids = self._read_ids()
+        with open(self._file(IDS_FILE), "w", encoding="utf-8") as f:
+            f.writelines(f"{chunk_id}\n" for chunk_id in ids)
+        self._row_of = self._ids(ids)
+        self._writable = True
+
+    def _delete_rows(self, rows: List[int]) -> None:
+        if not rows:
+            return
+        with open(self._file(DELETED_FILE), "ab") as f:
+            np.asarray(rows, dtype=np.int64).tofile(f)
+        self.deleted_rows += len(rows)
+
+    def _ids(self, ids: Optional[List[str]] = None) -> Dict[str, int]:
+        """Row of every live id (called with the lock held)."""
+        if self._row_of is not None and ids is None:
+            return self._row_of
+        ids = self._read_ids() if ids is None else ids
+        deleted = set()
+        if self.deleted_rows:
+            deleted = set(np.fromfile(self._file(DELETED_FILE), dtype=np.int64, count=self.deleted_rows).tolist())
+        self._row_of = {chunk_id: row for row, chunk_id in enumerate(ids) if row not in deleted}
+        return self._row_of
+
+    def _read_ids(self) -> List[str]:
+        if not os.path.exists(self._file(IDS_FILE)):
+            return []
+        with open(self._file(IDS_FILE), "r", encoding="utf-8") as f:
+            return [line.rstrip("\n") for _, line in zip(range(self.rows), f)]
+
+    def _invalidate(self) -> None:
+        self._mapping = None
+        self._postings = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _read_meta(self) -> Dict[str, Any]:
+        meta_path = self._file(META_FILE)
+        if not os.path.exists(meta_path):
+            return {"format": STORE_FORMAT, "dim": None, "rows": 0, "deleted": 0, "bytes": 0}
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != STORE_FORMAT:
+            raise ValueError(f"Unsupported vector store format {meta.get('format')} in {self.path}")
+        return meta
+
+    def _write_meta(self) -> None:
+        meta_path = self._file(META_FILE)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"format": STORE_FORMAT, "dim": self.dim, "rows": self.rows,
+                       "deleted": self.deleted_rows, "bytes": self._end}, f)
+        os.replace(meta_path + ".tmp", meta_path)
@@ -0,0 +1,10 @@
+import os
+
+# offline settings, read by backend.src.config at import: no model, no real Ollama, nothing written under backend/
+os.environ["TSARAIA_EMBEDDING_BACKEND"] = "hashing"
+os.environ["TSARAIA_VECTORSTORE"] = "mmap"
+os.environ["TSARAIA_OLLAMA_BASE_URL"] = "http://127.0.0.1:11436"
+os.environ["TSARAIA_EMBED_CACHE"] = "false"
+os.environ["TSARAIA_CACHE_ENABLED"] = "false"
+os.environ["TSARAIA_SESSION_STORE"] = "memory"
+os.environ["TSARAIA_INGEST_WORKERS"] = "1"
@@ -0,0 +1,138 @@
+import asyncio
+import functools
+import json
+import os
+from urllib.parse import urlparse
+import httpx
+import pytest
+from backend.api import main as api
+from backend.api import runtime as runtime_module
+from backend.api.limiter import ConcurrencyLimiter
+from backend.bench.fake_ollama import FakeOllamaServer
+from backend.bench.suite import questions, write_corpus
+from backend.src.config import OLLAMA_BASE_URL
+from backend.src.sources import RETRIEVAL_TOOL
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="module")
+def ollama(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("chat")
+    write_corpus(str(workdir / "data"), 40)
+    build = functools.partial(runtime_module.build_runtime, index_root=str(workdir / "db"), data_dir=str(workdir / "data"))
+    url = urlparse(OLLAMA_BASE_URL)
+    with FakeOllamaServer(url.hostname, url.port, first_token_ms=0, token_ms=0) as server:
+        api._swap_runtime(build(rebuild=True))
+        server.build = build
+        yield server
+
+
+@pytest.fixture
+async def http(ollama):
+    # a runtime per test: its async clients are bound to the event loop they first ran in
+    api._swap_runtime(ollama.build())
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+        yield client
+
+
+def sse_events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+async def test_chat_direct_makes_one_llm_call(http, ollama):
+    before = ollama.requests
+    response = await http.post("/chat", json={"message": questions(1)[0], "mode": "direct"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["summary"].startswith("Here is what I found")
+    assert body["source_documents"] and body["tools_used"] == [RETRIEVAL_TOOL]
+    assert ollama.requests - before == 1
+
+
+async def test_chat_agent_goes_through_the_tool(http, ollama):
+    before = ollama.requests
+    response = await http.post("/chat", json={"message": questions(1, seed=1)[0], "mode": "agent"})
+    assert response.status_code == 200
+    assert response.json()["tools_used"] == [RETRIEVAL_TOOL]
+    assert ollama.requests - before == 3
+
+
+async def test_chat_stream_sends_tokens_then_the_response(http):
+    response = await http.post("/chat/stream", json={"message": questions(1, seed=2)[0]})
+    assert response.status_code == 200
+    events = sse_events(response.text)
+    assert [event for event, _ in events[:-1]] == ["token"] * (len(events) - 1) and len(events) > 2
+    event, data = events[-1]
+    assert event == "response"
+    assert "".join(token["text"] for _, token in events[:-1]) == data["summary"]
+
+
+async def test_chat_batch_answers_every_question(http, ollama):
+    before = ollama.requests
+    batch = questions(3, seed=3)
+    response = await http.post("/chat/batch", json={"questions": batch})
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["succeeded"], body["failed"]) == (3, 0)
+    assert [result["question"] for result in body["results"]] == batch
+    assert ollama.requests - before == 3
+
+
+async def test_chat_is_rejected_when_the_queue_is_full(http, monkeypatch):
+    limiter = ConcurrencyLimiter(max_concurrent=1, max_queue=0, queue_timeout=1)
+    monkeypatch.setattr(api, "_chat_limiter", limiter)
+    await limiter.acquire()
+    try:
+        for endpoint in ("/chat", "/chat/stream"):
+            response = await http.post(endpoint, json={"message": questions(1, seed=4)[0]})
+            assert response.status_code == 503
+            assert response.headers["Retry-After"]
+    finally:
+        limiter.release()
+    assert limiter.rejected == 2
+
+
+async def test_reload_swaps_in_a_new_index_version(http, ollama, monkeypatch):
+    monkeypatch.setattr(runtime_module, "build_runtime", ollama.build)
+    version = (await http.get("/health")).json()["index_version"]
+    response = await http.post("/reload")
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    for _ in range(200):
+        job = (await http.get(f"/reload/{job_id}")).json()
+        if job["status"] not in ("pending", "running"):
+            break
+        await asyncio.sleep(0.05)
+    assert job["status"] == "succeeded", job["error"]
+    assert (await http.get("/health")).json()["index_version"] == version + 1
+    assert (await http.post("/chat", json={"message": questions(1, seed=5)[0]})).status_code == 200
+
+
+async def test_metrics_before_the_runtime_is_built(http, monkeypatch):
+    monkeypatch.setattr(api, "_runtime", None)
+    response = await http.get("/metrics")
+    assert response.status_code == 200
+    assert "tsaraia_index_version 0.0" in response.text.splitlines()
+
+
+async def test_reloads_keep_the_version_of_a_runtime_still_in_use(ollama):
+    # a request that started before two reloads still reads its index
+    old = ollama.build(rebuild=True)
+    path = old.index_path
+    for _ in range(2):
+        ollama.build(rebuild=True)
+    assert os.path.isdir(path)
+    del old
+    ollama.build(rebuild=True)
+    assert not os.path.isdir(path)
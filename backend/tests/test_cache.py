@@ -0,0 +1,70 @@
+import types
+import pytest
+from backend.src import cache as cache_module
+from backend.src.cache import SemanticCache
+from backend.src.embeddings import HashingEmbeddings
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(cache_module, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def answer(text):
+    return {"topic": "Fès", "summary": text, "sources": [], "tools_used": []}
+
+
+def new_cache(ttl=60, max_entries=10, version=1):
+    cache = SemanticCache(threshold=0.9, ttl=ttl, max_entries=max_entries)
+    cache.reset(HashingEmbeddings(), version)
+    return cache
+
+
+def test_similar_question_hits():
+    cache = new_cache()
+    cache.store("Quels riads à Fès ?", answer("riads"))
+    assert cache.lookup("quels  riads à fès ?")[0] == answer("riads")
+    assert cache.lookup("Quelles recettes de tajine ?")[0] is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_entries_expire(clock):
+    cache = new_cache(ttl=10)
+    cache.store("Quels riads à Fès ?", answer("riads"))
+    clock[0] = 9
+    assert cache.lookup("Quels riads à Fès ?")[0] is not None
+    clock[0] = 11
+    assert cache.lookup("Quels riads à Fès ?")[0] is None
+    assert cache.stats()["entries"] == 0 and cache.evictions == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache = new_cache(max_entries=2)
+    cache.store("Quels riads à Fès ?", answer("riads"))
+    cache.store("Quelles agences à Rabat ?", answer("agences"))
+    cache.lookup("Quels riads à Fès ?")
+    cache.store("Quelles recettes de tajine ?", answer("tajine"))
+    assert cache.lookup("Quelles agences à Rabat ?")[0] is None
+    assert cache.lookup("Quels riads à Fès ?")[0] == answer("riads")
+    assert cache.evictions == 1
+
+
+def test_answers_of_another_index_version_are_dropped():
+    cache = new_cache(version=2)
+    cache.store("Quels riads à Fès ?", answer("riads"), version=1)
+    assert cache.stats()["entries"] == 0
+    cache.store("Quels riads à Fès ?", answer("riads"), version=2)
+    cache.reset(HashingEmbeddings(), 3)
+    assert cache.lookup("Quels riads à Fès ?")[0] is None
+
+
+def test_namespaces_keep_their_answers_apart():
+    cache = new_cache()
+    cache.store("Quels riads à Fès ?", answer("direct"), namespace="direct")
+    assert cache.lookup("Quels riads à Fès ?", "agent")[0] is None
+    assert cache.lookup("Quels riads à Fès ?", "direct")[0] == answer("direct")
+    cache.store("Quels riads à Fès ?", answer("agent"), namespace="agent")
+    assert cache.lookup("quels riads à fès", "agent")[0] == answer("agent")
+    assert cache.lookup("quels riads à fès", "direct")[0] == answer("direct")
@@ -0,0 +1,28 @@
+from backend.src.entities import EntityIndex
+
+
+def record(name, kind, city):
+    contact = {"name": name, "address": None, "phone": "0535000000", "email": None, "website": None, "type": None}
+    return {"contact": contact, "city": city, "kind": kind, "source": f"{kind}.csv", "row": 0}
+
+
+INDEX = EntityIndex([record("Atlas", "agency", "Fès"), record("Riad Dar Salam", "hotel", "Fès"),
+                     record("Atlas Voyages", "agency", "Rabat")])
+
+
+def names(question):
+    return [match["contact"]["name"] for match in INDEX.match_question(question)]
+
+
+def test_match_question_finds_named_entities():
+    assert names("téléphone de l'agence Atlas à Fès") == ["Atlas"]
+    assert names("numéro de Atlas") == ["Atlas"]
+    assert names("adresse du riad Dar Salam") == ["Riad Dar Salam"]
+
+
+def test_match_question_falls_through_to_the_llm():
+    # "atlas" is a region here, and the question asks for a hotel
+    assert names("Quelle est l'adresse d'un hôtel dans l'Atlas ?") == []
+    assert names("téléphone de l'hôtel Atlas") == []
+    assert names("adresse de Atlas pour une randonnée") == []
+    assert names("quel site visiter à Fès ?") == []
@@ -0,0 +1,11 @@
+from backend.src.index import CURRENT_FILE, INDEX_KEEP_VERSIONS, prune_versions
+
+
+def test_prune_keeps_the_current_and_the_served_versions(tmp_path):
+    for version in range(1, 6):
+        (tmp_path / f"v{version:04d}").mkdir()
+    (tmp_path / CURRENT_FILE).write_text("v0005")
+    assert INDEX_KEEP_VERSIONS == 2
+    assert prune_versions(str(tmp_path), in_use=[str(tmp_path / "v0002")]) == [1, 3]
+    assert sorted(path.name for path in tmp_path.iterdir() if path.is_dir()) == ["v0002", "v0004", "v0005"]
+    assert prune_versions(str(tmp_path)) == [2]
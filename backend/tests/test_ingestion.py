@@ -0,0 +1,76 @@
+from langchain_core.documents import Document
+from backend.src.embeddings import HashingEmbeddings
+from backend.src.manifest import load_manifest
+from backend.src.rag import sync_vectorstore
+from backend.src.vectorstore import MmapVectorStore
+
+RIAD = "nom: Riad Dar Salam\nville: Fès\nadresse: 12 Derb Sidi Ahmed, Fès Médina\ntelephone: 0535 63 00 00"
+HOTEL = "nom: Hôtel Les Mérinides\nville: Fès\nadresse: Borj Nord, Fès\ntelephone: 0535 64 52 26"
+AGENCY = "nom: Atlas Voyages\nville: Rabat\nadresse: 4 avenue Mohammed V, Rabat\ntelephone: 0537 70 00 00"
+
+
+class CountingEmbeddings(HashingEmbeddings):
+    def __init__(self):
+        super().__init__()
+        self.texts = 0
+
+    def embed_documents(self, texts):
+        self.texts += len(texts)
+        return super().embed_documents(texts)
+
+
+def row(source, number, text):
+    return Document(page_content=text, metadata={"source": source, "row": number})
+
+
+# the riad is in both files, a.csv holds the canonical copy
+A = [row("a.csv", 0, RIAD), row("a.csv", 1, HOTEL)]
+B = [row("b.csv", 0, AGENCY), row("b.csv", 1, RIAD)]
+
+
+def ingest(path, batches):
+    db = MmapVectorStore(str(path), CountingEmbeddings())
+    stats = sync_vectorstore(db, batches, str(path))
+    return db, stats
+
+
+def stored(db):
+    return {doc.id: (doc.metadata["source"], doc.metadata.get("duplicate_sources", ""))
+            for doc in db.get_by_ids(db.ids())}
+
+
+def test_canonical_replaced_in_a_later_batch(tmp_path):
+    db, stats = ingest(tmp_path, [B, A])
+    assert sorted(source for source, _ in stored(db).values()) == ["a.csv", "a.csv", "b.csv"]
+    riad = next(chunk_id for chunk_id, (source, duplicates) in stored(db).items() if duplicates)
+    assert stored(db)[riad] == ("a.csv", "b.csv#1")
+    assert stats["duplicates"] == 1
+    # the copy of b.csv was embedded with the first batch, then deleted
+    assert stats["added"] == 4 and stats["deleted"] == 1
+    assert load_manifest(str(tmp_path))["files"]["b.csv"]["chunks"][1] == riad
+
+
+def test_rebuild_in_another_order_gives_the_same_index(tmp_path):
+    first, _ = ingest(tmp_path / "first", [A, B])
+    second, _ = ingest(tmp_path / "second", [B, A])
+    assert stored(first) == stored(second)
+    assert load_manifest(str(tmp_path / "first"))["duplicates"] == load_manifest(str(tmp_path / "second"))["duplicates"]
+
+
+def test_rerun_adds_nothing(tmp_path):
+    ingest(tmp_path, [A, B])
+    for batches in ([A, B], [B, A]):
+        db, stats = ingest(tmp_path, batches)
+        assert (stats["added"], stats["deleted"], stats["skipped"]) == (0, 0, 3)
+        assert db.embeddings.texts == 0
+
+
+def test_deleting_the_file_of_a_canonical_chunk(tmp_path):
+    before, _ = ingest(tmp_path, [A, B])
+    removed = {chunk_id for chunk_id, (source, _) in stored(before).items() if source == "a.csv"}
+    db, stats = ingest(tmp_path, [B])
+    # the copy of b.csv becomes canonical, without duplicates
+    assert sorted(stored(db).values()) == [("b.csv", ""), ("b.csv", "")]
+    assert stats["added"] == 1 and stats["deleted"] == 2
+    assert not set(stored(db)) & removed
+    assert load_manifest(str(tmp_path))["duplicates"] == {}
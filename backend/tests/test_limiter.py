@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+from backend.api.limiter import ConcurrencyLimiter, QueueFullError
+
+
+def test_requests_beyond_the_queue_are_rejected():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_concurrent=1, max_queue=1, queue_timeout=5)
+        await limiter.acquire()
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await limiter.acquire()
+        limiter.release()
+        await waiting
+        assert limiter.stats()["in_flight"] == 1 and limiter.rejected == 1
+        limiter.release()
+
+    asyncio.run(scenario())
+
+
+def test_wait_times_out():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_concurrent=1, max_queue=4, queue_timeout=0.01)
+        await limiter.acquire()
+        with pytest.raises(QueueFullError):
+            await limiter.acquire()
+        assert limiter.waiting == 0 and limiter.rejected == 1
+
+    asyncio.run(scenario())
+
+
+def test_background_work_waits_outside_the_queue():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_concurrent=1, max_queue=0, queue_timeout=0.01)
+        await limiter.acquire()
+        background = asyncio.create_task(limiter.acquire(reject=False))
+        await asyncio.sleep(0.05)
+        assert limiter.waiting_background == 1 and not background.done()
+        limiter.release()
+        await background
+        assert limiter.in_flight == 1 and limiter.rejected == 0
+
+    asyncio.run(scenario())
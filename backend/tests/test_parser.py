@@ -0,0 +1,22 @@
+import json
+from backend.src.parser import ResearchResponseStreamParser
+
+
+def stream(text, size):
+    parser = ResearchResponseStreamParser()
+    return "".join(parser.feed(text[i:i + size]) for i in range(0, len(text), size))
+
+
+def test_stream_parser_joins_surrogate_pairs():
+    summary = "Bienvenue à Fès 😀 🕌"
+    text = json.dumps({"topic": "Fès", "summary": summary, "entities": []})
+    assert "\\ud83d\\ude00" in text
+    for size in (1, 3, 7, len(text)):
+        decoded = stream(text, size)
+        assert decoded == summary
+        decoded.encode("utf-8")
+
+
+def test_stream_parser_replaces_lone_surrogates():
+    text = '{"summary": "a\\ud83d b \\ude00c\\ud83d"}'
+    assert stream(text, 1) == "a� b �c�"
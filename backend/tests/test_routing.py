@@ -0,0 +1,41 @@
+from langchain_core.messages import AIMessage, HumanMessage
+from backend.src.embeddings import HashingEmbeddings
+from backend.src.metrics import RETRIEVAL_ROUTES
+from backend.src.routing import QueryRouter, RoutedRetriever, condense_question
+from backend.src.vectorstore import MmapVectorStore
+
+ROUTER = QueryRouter({"agency": {"marrakech": 10, "fes": 10}, "hotel": {"fes": 10}})
+
+
+def conversation(*questions):
+    history = []
+    for question in questions:
+        history += [HumanMessage(question), AIMessage("...")]
+    return history
+
+
+def test_follow_up_changing_the_city_is_condensed():
+    history = conversation("Quelles agences à Marrakech proposent des circuits ?")
+    condensed = condense_question("Et à Fès ?", history, ROUTER)
+    assert "fes" in condensed.split() and "marrakech" not in condensed.split() and "agences" in condensed.split()
+
+
+def test_follow_up_on_the_same_topic_reuses_the_previous_query():
+    history = conversation("Quelles agences à Marrakech proposent des circuits ?", "Et à Fès ?")
+    previous = condense_question("Et à Fès ?", history[:2], ROUTER)
+    assert condense_question("Et leurs prix ?", history, ROUTER) == previous
+    assert condense_question("Quels hôtels ?", history, ROUTER) == "Quels hôtels ?"
+
+
+def test_retriever_reuses_the_chunks_of_a_recent_query(tmp_path):
+    store = MmapVectorStore(str(tmp_path), HashingEmbeddings())
+    store.add_texts(["Atlas Voyages, circuits à Fès", "Riad Dar Salam à Fès"], [{}, {}], ids=["agency", "riad"])
+    retriever = RoutedRetriever(vectorstore=store, k=2, recent=1)
+    reused = RETRIEVAL_ROUTES.value(route="reused")
+    first = retriever.invoke("circuits à Fès")
+    first[0].page_content = "rewritten by the context budget"
+    assert retriever.invoke("circuits à Fès")[0].page_content == "Atlas Voyages, circuits à Fès"
+    assert RETRIEVAL_ROUTES.value(route="reused") == reused + 1
+    retriever.invoke("riad")
+    retriever.invoke("circuits à Fès")
+    assert RETRIEVAL_ROUTES.value(route="reused") == reused + 1
@@ -0,0 +1,46 @@
+import asyncio
+from backend.api.singleflight import SingleFlight
+
+
+def test_identical_requests_share_one_execution():
+    runs = []
+
+    async def producer():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        yield "token"
+        yield "answer"
+
+    async def scenario():
+        flights = SingleFlight()
+        first, leader = flights.join("key", producer)
+        second, follower_leads = flights.join("key", producer)
+        results = await asyncio.gather(first.result(), second.result())
+        assert first is second and leader and not follower_leads
+        assert results == ["answer", "answer"]
+        assert flights.stats() == {"in_flight": 0, "started": 1, "merged": 1, "cancelled": 0}
+
+    asyncio.run(scenario())
+    assert len(runs) == 1
+
+
+def test_execution_is_cancelled_when_its_last_subscriber_leaves():
+    async def producer():
+        yield "token"
+        await asyncio.sleep(10)
+        yield "answer"
+
+    async def scenario():
+        flights = SingleFlight()
+        flight = flights.start("key", producer)
+        waiters = [asyncio.create_task(flight.result()) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        waiters[0].cancel()
+        await asyncio.sleep(0.01)
+        assert not flight.task.done()
+        waiters[1].cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.gather(flight.task, return_exceptions=True)
+        assert flights.cancelled == 1 and flights.in_flight == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,41 @@
+from backend.src.embeddings import HashingEmbeddings
+from backend.src.vectorstore import MmapVectorStore
+
+TEXTS = {
+    "riad": "Riad Dar Salam, maison d'hôtes dans la médina de Fès",
+    "agency": "Atlas Voyages, circuits dans le désert depuis Rabat",
+    "recipe": "Tajine de poulet aux citrons confits et aux olives",
+}
+
+
+def new_store(path):
+    store = MmapVectorStore(str(path), HashingEmbeddings())
+    store.add_texts(list(TEXTS.values()), [{"kind": kind} for kind in TEXTS], ids=list(TEXTS))
+    return store
+
+
+def test_upsert_replaces_the_row_of_an_id(tmp_path):
+    store = new_store(tmp_path)
+    store.add_texts(["Riad Dar Salam, chambres avec terrasse à Fès"], [{"kind": "hotel"}], ids=["riad"])
+    assert len(store) == 3 and store.deleted_rows == 1
+    assert store.get_by_ids(["riad"])[0].metadata == {"kind": "hotel"}
+    assert sorted(store.ids()) == sorted(TEXTS)
+
+
+def test_deleted_rows_are_not_searched(tmp_path):
+    store = new_store(tmp_path)
+    store.delete(ids=["riad"])
+    assert len(store) == 2 and store.get_by_ids(["riad"]) == []
+    assert "riad" not in [doc.id for doc in store.similarity_search("riad à Fès", k=3)]
+
+
+def test_compact_keeps_the_live_rows(tmp_path):
+    store = new_store(tmp_path)
+    store.delete(ids=["agency"])
+    store.add_texts(["Tajine de poulet au citron"], ids=["recipe"])
+    store.compact()
+    assert (store.rows, store.deleted_rows) == (2, 0)
+    reopened = MmapVectorStore(str(tmp_path), HashingEmbeddings())
+    assert sorted(reopened.ids()) == ["recipe", "riad"]
+    assert reopened.get_by_ids(["recipe"])[0].page_content == "Tajine de poulet au citron"
+    assert reopened.similarity_search("maison d'hôtes dans la médina de Fès", k=1)[0].id == "riad"
@@ -8,6 +8,8 @@ const ChatbotInterface = () => {
   const [isLoading, setIsLoading] = useState(false);
   const messagesEndRef = useRef(null);
   const chatSectionRef = useRef(null);
+  // identifiant de la conversation : le backend garde l'historique de la session
+  const sessionIdRef = useRef(crypto.randomUUID());
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -44,7 +46,7 @@ const ChatbotInterface = () => {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ message: messageToSend }),
+        body: JSON.stringify({ message: messageToSend, session_id: sessionIdRef.current }),
       });
 
       if (!response.ok) {